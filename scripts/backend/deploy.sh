@@ -1 +1 @@
-sam.cmd deploy --parameter-overrides Name=SyncMaster --stack-name SyncMaster-Backend --resolve-s3 --profile SyncMaster --capabilities CAPABILITY_NAMED_IAM
+sam.cmd deploy --parameter-overrides Name=SyncMaster DatabaseIndexStage=${DATABASE_INDEX_STAGE:-2} --stack-name SyncMaster-Backend --resolve-s3 --profile SyncMaster --capabilities CAPABILITY_NAMED_IAM
@@ -2,27 +2,98 @@
 Module allowing interaction with a DynamoDB table, for getting, updating, and deleting items
 """
 
+import random
+import re
+import time
+from copy import copy
 from datetime import datetime
 from enum import Enum, auto
-from typing import Any, Optional, Type, TypedDict
+from typing import Any, Iterable, Iterator, Optional, Type, TypedDict, overload
 
 from aws_lambda_powertools.logging import Logger
-from boto3.dynamodb.conditions import ConditionBase
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
 from botocore.exceptions import ClientError
 
-from ..environment import TABLE_NAME, TABLE_READ_ROLE, TABLE_WRITE_ROLE
+from ..environment import DATABASE_INDEX_STAGE, TABLE_NAME, TABLE_READ_ROLE, TABLE_WRITE_ROLE
 from ..exceptions import (
     ConditionCheckFailed,
     ConditionValidationError,
+    ConflictException,
     ExternalServiceException,
+    HTTPError,
+    IndexUnavailableException,
     PermissionException,
     ResourceNotFound,
 )
+from ..models.custom_base_model import CustomBaseModel
 from ..models.db.db_base import DBItemModel
-from ..util import AWSAccessLevel, create_resource_with_role
+from ..util import (
+    AWSAccessLevel,
+    create_resource_with_role,
+    decode_db_key,
+    encode_db_key,
+    get_role_session,
+)
 
 logger = Logger()
 
+BATCH_GET_LIMIT = 100
+# Maximum number of keys DynamoDB accepts in a single BatchGetItem call
+
+BATCH_WRITE_LIMIT = 25
+# Maximum number of put/delete requests DynamoDB accepts in a single BatchWriteItem call
+
+BATCH_MAX_ATTEMPTS = 8
+# Number of attempts made at processing a batch before giving up on unprocessed items
+
+BATCH_BACKOFF_BASE_SECONDS = 0.05
+# Base delay used for exponential backoff when retrying unprocessed items
+
+BATCH_BACKOFF_MAX_SECONDS = 2.0
+# Upper bound on the delay between retries of unprocessed items
+
+TRANSACTION_MAX_ATTEMPTS = 4
+# Number of attempts made at a transaction cancelled by conflicting with other writes
+
+
+def _chunk[V](values: list[V], size: int) -> list[list[V]]:
+    """
+    Splits a list into consecutive chunks of at most the given size
+
+    :param values: The values to split into chunks
+    :param size: The maximum size of each chunk
+    :return: The list of chunks, in the original order
+    """
+    return [values[i : i + size] for i in range(0, len(values), size)]
+
+
+def _backoff(attempt: int) -> None:
+    """
+    Sleeps for a random ("full jitter") duration, growing exponentially with the attempt
+
+    :param attempt: The number of attempts that have been made so far, starting from 1
+    """
+    delay = min(BATCH_BACKOFF_MAX_SECONDS, BATCH_BACKOFF_BASE_SECONDS * 2**attempt)
+    time.sleep(random.uniform(0, delay))  # nosec B311
+
+
+def _projection_kwargs(
+    projection: Type[CustomBaseModel], key_attributes: tuple[str, ...] = ()
+) -> dict:
+    """
+    Builds the arguments needed to only retrieve the attributes of the given partial model.
+    Attribute names are always aliased, as many common names (e.g. "name", "type") are
+    reserved words in DynamoDB.
+
+    :param projection: The partial model containing only the attributes to retrieve
+    :param key_attributes: Key attributes that must be retrieved along with the partial model
+    :return: The ProjectionExpression and ExpressionAttributeNames for a request
+    """
+    attributes = [field.alias or name for name, field in projection.model_fields.items()]
+    attributes.extend(attr for attr in key_attributes if attr not in attributes)
+    names = {f"#proj{i}": attr for i, attr in enumerate(attributes)}
+    return {"ProjectionExpression": ", ".join(names), "ExpressionAttributeNames": names}
+
 
 class GSI(Enum):
     """
@@ -31,6 +102,149 @@ class GSI(Enum):
 
     GSI1 = auto()
     GSI2 = auto()
+    GSI3 = auto()
+    GSI4 = auto()
+    GSI5 = auto()
+
+
+GSI_KEY_ATTRIBUTES: dict[GSI, tuple[str, str]] = {
+    GSI.GSI1: ("type", "last_modified_time"),
+    GSI.GSI2: ("type", "expiry_date"),
+    GSI.GSI3: ("visit_site_id", "entry_time"),
+    GSI.GSI4: ("visit_user_id", "entry_time"),
+    GSI.GSI5: ("type", "entry_time"),
+}
+# The hash and range key attributes of each GSI, needed to build a key to resume a query from
+
+
+def _index_keys(gsi: Optional[GSI]) -> tuple[str, ...]:
+    """
+    Gives the key attributes of the given index, in addition to the keys of the table
+
+    :param gsi: The index being queried, if any
+    :return: The hash and range key attributes of the index, empty when no index is used
+    """
+    return GSI_KEY_ATTRIBUTES[gsi] if gsi else ()
+
+
+def _condition_kwargs(
+    condition_expression: ConditionBase,
+    expression_attribute_names: Optional[dict[str, str]] = None,
+) -> dict:
+    """
+    Builds a condition into its expression, names and values. boto3 gives every part of an
+    attribute path its own name placeholder, so an alias such as "#key" in
+    Attr("attachments.#key") would be read as the literal name "#key". Parts of the path
+    which are given aliases are put back into the expression, so conditions can address
+    attributes whose names contain "." the same way updates do.
+
+    :param condition_expression: The condition to build
+    :param expression_attribute_names: Aliases which can be used in the attribute paths of
+        the condition, mapped to the names they stand for
+    :return: The condition parameters of the request
+    """
+    built = ConditionExpressionBuilder().build_expression(condition_expression)
+    aliases = expression_attribute_names or {}
+    names = {}
+    restored = {}
+    for placeholder, name in built.attribute_name_placeholders.items():
+        if name in aliases:
+            restored[placeholder] = name
+        else:
+            names[placeholder] = name
+    expression = re.sub(
+        r"#n\d+",
+        lambda match: restored.get(match.group(0), match.group(0)),
+        built.condition_expression,
+    )
+
+    kwargs: dict = {"ConditionExpression": expression}
+    if names:
+        kwargs["ExpressionAttributeNames"] = names
+    if built.attribute_value_placeholders:
+        kwargs["ExpressionAttributeValues"] = built.attribute_value_placeholders
+    return kwargs
+
+
+def _add_condition(
+    request: dict,
+    condition_expression: ConditionBase,
+    expression_attribute_names: Optional[dict[str, str]] = None,
+) -> dict:
+    """
+    Adds a condition to the parameters of a write, alongside any names and values the
+    write already uses
+
+    :param request: The parameters of the write, updated in place
+    :param condition_expression: The condition to add
+    :param expression_attribute_names: Aliases which can be used in the condition
+    :return: The parameters of the write, including the condition
+    """
+    condition = _condition_kwargs(condition_expression, expression_attribute_names)
+    request["ConditionExpression"] = condition["ConditionExpression"]
+    for attribute in ["ExpressionAttributeNames", "ExpressionAttributeValues"]:
+        if attribute in condition:
+            request[attribute] = {**request.get(attribute, {}), **condition[attribute]}
+    return request
+
+
+def _update_kwargs(
+    update_attributes: dict[str, Any],
+    last_modified_time: datetime,
+    last_modified_by: str,
+    expression_attribute_names: Optional[dict[str, str]],
+    increment_attributes: Optional[dict[str, int]] = None,
+) -> dict:
+    """
+    Builds the update expression of an item, which also records who last modified the item
+
+    :param update_attributes: The attributes to update, mapped to their new values. If the value
+        is None, then the attribute is removed.
+    :param last_modified_time: The time to update the last_modified_time to
+    :param last_modified_by: The user to update the last_modified_by to
+    :param expression_attribute_names: Aliases used in the names of the updated attributes
+    :param increment_attributes: Numeric attributes to add to, mapped to the amount to add.
+        Missing attributes are treated as 0.
+    :return: The update parameters of the item
+    """
+    expression_attribute_values: dict[str, Any] = {
+        ":last_modified_by": last_modified_by,
+        ":last_modified_time": last_modified_time.isoformat(),
+    }
+    set_attributes: list[str] = [
+        "last_modified_by = :last_modified_by",
+        "last_modified_time = :last_modified_time",
+    ]
+    delete_attributes: list[str] = []
+
+    for k, v in update_attributes.items():
+        if v is not None:
+            expression_attribute = k.replace(".", "_").replace("#", "_")
+            expression_attribute_values[f":{expression_attribute}"] = v
+            set_attributes.append(f"{k} = :{expression_attribute}")
+        else:
+            delete_attributes.append(k)
+
+    add_attributes: list[str] = []
+    for k, v in (increment_attributes or {}).items():
+        expression_attribute = f"inc_{k.replace('.', '_').replace('#', '_')}"
+        expression_attribute_values[f":{expression_attribute}"] = v
+        add_attributes.append(f"{k} :{expression_attribute}")
+
+    update_expression = f"SET {', '.join(set_attributes)}"
+    if delete_attributes:
+        update_expression += f" REMOVE {', '.join(delete_attributes)}"
+    if add_attributes:
+        # ADD is applied atomically, so concurrent increments of a counter are not lost
+        update_expression += f" ADD {', '.join(add_attributes)}"
+
+    kwargs: dict = {
+        "UpdateExpression": update_expression,
+        "ExpressionAttributeValues": expression_attribute_values,
+    }
+    if expression_attribute_names:
+        kwargs["ExpressionAttributeNames"] = expression_attribute_names
+    return kwargs
 
 
 class KeySchema(TypedDict):
@@ -42,6 +256,251 @@ class KeySchema(TypedDict):
     sk: str
 
 
+def _query_kwargs(
+    gsi: Optional[GSI],
+    key_condition_expression: Optional[ConditionBase],
+    filter_expression: Optional[ConditionBase],
+    scan_reverse: bool,
+    projection: Optional[Type[CustomBaseModel]],
+) -> dict:
+    """
+    Builds the arguments common to every query request
+
+    :param gsi: The index being used to query the database
+    :param key_condition_expression: A condition placed on the key attributes
+    :param filter_expression: A condition placed on any attributes
+    :param scan_reverse: if true, items are returned in descending order
+    :param projection: A partial model containing only the attributes to retrieve
+    :raises IndexUnavailableException: If the index is above the deployed index stage
+    :return: The keyword arguments for a query request
+    """
+    kwargs: dict = {"ScanIndexForward": not scan_reverse}
+    if gsi:
+        if gsi.value > DATABASE_INDEX_STAGE:
+            raise IndexUnavailableException(gsi.name)
+        kwargs["IndexName"] = gsi.name
+    if key_condition_expression:
+        kwargs["KeyConditionExpression"] = key_condition_expression
+    if filter_expression:
+        kwargs["FilterExpression"] = filter_expression
+    if projection:
+        # Key attributes are always needed to continue a query from the last item
+        kwargs.update(_projection_kwargs(projection, ("pk", "sk") + _index_keys(gsi)))
+    return kwargs
+
+
+class QueryCursor:
+    """
+    Tracks the position of a streaming query, so that it can be resumed from the last item
+    that was consumed, possibly in a later invocation
+    """
+
+    def __init__(self, last_key: Optional[dict] = None):
+        """
+        Create a cursor, optionally positioned after a previously consumed item
+
+        :param last_key: The key of the last item consumed, received from a previous cursor
+        """
+        self.last_key = last_key
+        self.exhausted = False
+
+    @classmethod
+    def from_token(cls, token: str) -> "QueryCursor":
+        """
+        Recreate a cursor from a token, produced by a previous cursor
+
+        :param token: The encoded token of a previous cursor
+        :return: A cursor positioned after the last item consumed by the previous cursor
+        """
+        return cls(last_key=decode_db_key(token))
+
+    def to_token(self) -> Optional[str]:
+        """
+        Encode the position of the cursor, so that it can be returned in an API
+
+        :return: The encoded position of the cursor, or None if there is nothing left to read
+        """
+        return encode_db_key(self.last_key) if self.last_key else None
+
+
+class DBTransaction:
+    """
+    Builds a set of writes to the table that are made in a single request, either every
+    write succeeds, or none of them are made. Writes may be of items of any schema, as all
+    items share the table. No two writes may be to the same item.
+    """
+
+    def __init__(self, table_name: str, client: Any):
+        """
+        Create an empty transaction on a table
+
+        :param table_name: The name of the underlying DynamoDB Table in AWS
+        :param client: The DynamoDB client used to execute the transaction
+        """
+        self._table_name = table_name
+        self._client = client
+        self._transact_items: list[dict] = []
+        self._condition_errors: list[Optional[HTTPError]] = []
+
+    def _add(
+        self,
+        action: str,
+        request: dict,
+        condition_expression: Optional[ConditionBase],
+        condition_error: Optional[HTTPError],
+    ) -> "DBTransaction":
+        """
+        Adds a write to the transaction
+
+        :param action: The type of the write in the TransactItems of the request
+        :param request: The parameters of the write, excluding the condition
+        :param condition_expression: The condition that must be met for the transaction to succeed
+        :param condition_error: The error raised when the condition is not met
+        :return: The transaction, so that writes may be chained
+        """
+        request["TableName"] = self._table_name
+        if condition_expression:
+            _add_condition(request, condition_expression, request.get("ExpressionAttributeNames"))
+        self._transact_items.append({action: request})
+        self._condition_errors.append(condition_error)
+        return self
+
+    def put(
+        self,
+        item: DBItemModel,
+        condition_expression: Optional[ConditionBase] = None,
+        condition_error: Optional[HTTPError] = None,
+    ) -> "DBTransaction":
+        """
+        Puts the given item into the table as part of the transaction
+
+        :param item: The item to put into the table
+        :param condition_expression: The condition that must be met before the item can be put
+        :param condition_error: The error raised when the condition is not met, defaults to
+            ConditionCheckFailed
+        :return: The transaction, so that writes may be chained
+        """
+        return self._add("Put", {"Item": item.model_dump()}, condition_expression, condition_error)
+
+    def update(
+        self,
+        key: KeySchema,
+        update_attributes: dict[str, Any],
+        last_modified_time: datetime,
+        last_modified_by: str,
+        condition_expression: Optional[ConditionBase] = None,
+        condition_error: Optional[HTTPError] = None,
+        expression_attribute_names: Optional[dict[str, str]] = None,
+        increment_attributes: Optional[dict[str, int]] = None,
+    ) -> "DBTransaction":
+        """
+        Updates the given item in the table as part of the transaction
+
+        :param key: The key of the item in the database to modify
+        :param update_attributes: A dictionary where the keys represent the name of the attribute to
+            update, and the values represent the value to update the attribute to. If the value is
+            None, then the attribute is removed.
+        :param last_modified_time: The time to update the last_modified_time to
+        :param last_modified_by: The user to update the last_modified_by to
+        :param condition_expression: A condition that must be met for the update to succeed
+        :param condition_error: The error raised when the condition is not met, defaults to
+            ConditionCheckFailed
+        :param expression_attribute_names: Aliases which can be used in the update attr's to address
+            names containing special characters (i.e., containing ".")
+        :param increment_attributes: Numeric attributes to add to, mapped to the amount to add.
+            Missing attributes are treated as 0.
+        :return: The transaction, so that writes may be chained
+        """
+        request = _update_kwargs(
+            update_attributes,
+            last_modified_time,
+            last_modified_by,
+            expression_attribute_names,
+            increment_attributes,
+        )
+        request["Key"] = key
+        return self._add("Update", request, condition_expression, condition_error)
+
+    def delete(
+        self,
+        key: KeySchema,
+        condition_expression: Optional[ConditionBase] = None,
+        condition_error: Optional[HTTPError] = None,
+    ) -> "DBTransaction":
+        """
+        Deletes the given item from the table as part of the transaction
+
+        :param key: The key of the item to delete in the database
+        :param condition_expression: The condition that must be met before the item can be deleted
+        :param condition_error: The error raised when the condition is not met, defaults to
+            ConditionCheckFailed
+        :return: The transaction, so that writes may be chained
+        """
+        return self._add("Delete", {"Key": key}, condition_expression, condition_error)
+
+    def condition_check(
+        self,
+        key: KeySchema,
+        condition_expression: ConditionBase,
+        condition_error: Optional[HTTPError] = None,
+    ) -> "DBTransaction":
+        """
+        Checks a condition on an item that is not written, as part of the transaction
+
+        :param key: The key of the item to check
+        :param condition_expression: The condition that must be met for the transaction to succeed
+        :param condition_error: The error raised when the condition is not met, defaults to
+            ConditionCheckFailed
+        :return: The transaction, so that writes may be chained
+        """
+        return self._add("ConditionCheck", {"Key": key}, condition_expression, condition_error)
+
+    def execute(self) -> None:
+        """
+        Makes every write in the transaction, in a single request. A transaction cancelled
+        only because it conflicted with other writes to the same items is retried with a
+        jittered exponential backoff.
+
+        :raises ConditionCheckFailed: The condition of a write was not met, and it was not given
+            its own error, so no writes were made
+        :raises HTTPError: The error given to a write whose condition was not met
+        :raises ConflictException: The transaction kept conflicting with other writes to the
+            same items after several attempts
+        :raises ExternalServiceException: Unexpected error occurs in AWS
+        :raises PermissionException: Assumed role does not have permission to write items,
+            likely due to the table being initialized with only read permissions
+        """
+        if not self._transact_items:
+            return
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                self._client.transact_write_items(TransactItems=self._transact_items)
+                return
+            except ClientError as err:
+                logger.exception(err)
+                if err.response["Error"]["Code"] == "AccessDeniedException":
+                    raise PermissionException(
+                        "Insufficient permissions to perform transact write on the table"
+                    ) from err
+                # Cancellation reasons are given in the same order as the writes of the
+                # transaction, writes which did not cause the cancellation have the code "None"
+                reasons = err.response.get("CancellationReasons", [])
+                for reason, condition_error in zip(reasons, self._condition_errors):
+                    if reason.get("Code") == "ConditionalCheckFailed":
+                        raise condition_error or ConditionCheckFailed() from err
+                codes = {reason.get("Code", "None") for reason in reasons}
+                if "TransactionConflict" not in codes or codes - {"TransactionConflict", "None"}:
+                    raise ExternalServiceException("Unknown Error from AWS") from err
+                if attempt >= TRANSACTION_MAX_ATTEMPTS:
+                    raise ConflictException(
+                        "Transaction conflicted with other writes to the same items"
+                    ) from err
+            _backoff(attempt)
+
+
 class DBTable[T: DBItemModel]:
     """
     Abstraction around an DynamoDB Table providing a limited selection of operations on
@@ -65,24 +524,51 @@ class DBTable[T: DBItemModel]:
         if access == AWSAccessLevel.WRITE:
             role = TABLE_WRITE_ROLE
 
+        self._role = role
         self._resource = create_resource_with_role(service_name="dynamodb", role=role)
         self._table = self._resource.Table(self.name)
 
+    def new_connection(self) -> "DBTable[T]":
+        """
+        A new connection to the same table, with its own boto3 resource. Resources are not
+        thread safe, so each thread using the table concurrently needs its own connection.
+
+        :return: The new connection to the table
+        :raises ExternalServiceException: Unable to connect to the DynamoDB Service
+        """
+        table = copy(self)
+        table._resource = get_role_session(self._role).resource("dynamodb")
+        table._table = table._resource.Table(self.name)
+        return table
+
+    @overload
+    def get(self, key: KeySchema, projection: None = None) -> T: ...
+
+    @overload
+    def get[P: CustomBaseModel](self, key: KeySchema, projection: Type[P]) -> P: ...
+
     def get(
         self,
         key: KeySchema,
-    ) -> T:
+        projection: Optional[Type[CustomBaseModel]] = None,
+    ) -> CustomBaseModel:
         """
         get an item from the database with the given key
 
         :param key: The key of the item in the database
+        :param projection: A partial model of the item, if given only the attributes of this
+            model are read from the database, and the item is returned as this model
         :return: The item with the given key stored in the database
         :raises ExternalServiceException: Unexpected error occurs in AWS
         :raises ValidationError: The returned item did not match the provided schema for the table
         :raises ResourceNotFound: The item with the given key could not be found in the database
         """
+        kwargs: dict = {"Key": key}
+        if projection:
+            kwargs.update(_projection_kwargs(projection))
+
         try:
-            response: dict = self._table.get_item(Key=key)
+            response: dict = self._table.get_item(**kwargs)
             print(response)
             if not response.get("Item"):
                 raise ResourceNotFound(
@@ -91,7 +577,7 @@ class DBTable[T: DBItemModel]:
         except ClientError as err:
             logger.exception(err)
             raise ExternalServiceException("Unknown Error from AWS") from err
-        return self.item_schema.model_validate(response["Item"])
+        return (projection or self.item_schema).model_validate(response["Item"])
 
     def put(self, item: T, condition_expression: Optional[ConditionBase] = None) -> T:
         """
@@ -131,6 +617,8 @@ class DBTable[T: DBItemModel]:
         last_modified_by: str,
         condition_expression: Optional[ConditionBase] = None,
         expression_attribute_names: Optional[dict[str, str]] = None,
+        increment_attributes: Optional[dict[str, int]] = None,
+        return_old: bool = False,
     ) -> T:
         """
         Updates the given item in the db table. Be careful about modifying attributes that
@@ -145,6 +633,10 @@ class DBTable[T: DBItemModel]:
         :param condition_expression: A condition that must be met for the update to succeed
         :param expression_attribute_names: Aliases which can be used in the update attr's to address
             names containing special characters (i.e., containing ".")
+        :param increment_attributes: Numeric attributes to add to, mapped to the amount to add.
+            Missing attributes are treated as 0.
+        :param return_old: If true, the item as it was before the update is returned instead,
+            for callers that need to know what the update changed
         :return: The full updated item
         :raises ConditionCheckFailed: The provided condition was not met
         :raises ExternalServiceException: Unexpected error occurs in AWS
@@ -152,44 +644,20 @@ class DBTable[T: DBItemModel]:
         :raises PermissionException: Assumed role does not have permission update an item
             in the DB, likely due to table being initialized with only read permissions
         """
-        expression_attribute_values: dict[str, Any] = {
-            ":last_modified_by": last_modified_by,
-            ":last_modified_time": last_modified_time.isoformat(),
-        }
-        set_attributes: list[str] = [
-            "last_modified_by = :last_modified_by",
-            "last_modified_time = :last_modified_time",
-        ]
-        delete_attributes: list[str] = []
-
-        if not expression_attribute_names:
-            expression_attribute_names = {}
-
-        for k, v in update_attributes.items():
-            if v is not None:
-                expression_attribute = k.replace(".", "_").replace("#", "_")
-                expression_attribute_values[f":{expression_attribute}"] = v
-                set_attributes.append(f"{k} = :{expression_attribute}")
-            else:
-                delete_attributes.append(k)
-
-        update_expression = f"SET {', '.join(set_attributes)}"
-        if delete_attributes:
-            update_expression += f" REMOVE {', '.join(delete_attributes)}"
-
-        kwargs = {}
+        kwargs = _update_kwargs(
+            update_attributes,
+            last_modified_time,
+            last_modified_by,
+            expression_attribute_names,
+            increment_attributes,
+        )
+        kwargs["ExpressionAttributeNames"] = expression_attribute_names or {}
         if condition_expression:
-            kwargs["ConditionExpression"] = condition_expression
+            _add_condition(kwargs, condition_expression, expression_attribute_names)
+        return_values = "ALL_OLD" if return_old else "ALL_NEW"
 
         try:
-            response = self._table.update_item(
-                Key=key,
-                UpdateExpression=update_expression,
-                ExpressionAttributeValues=expression_attribute_values,
-                ExpressionAttributeNames=expression_attribute_names,
-                ReturnValues="ALL_NEW",
-                **kwargs,
-            )
+            response = self._table.update_item(Key=key, ReturnValues=return_values, **kwargs)
         except ClientError as err:
             logger.exception(err)
             if err.response["Error"]["Code"] == "AccessDeniedException":
@@ -228,6 +696,53 @@ class DBTable[T: DBItemModel]:
                 raise ConditionCheckFailed() from err
             raise ExternalServiceException("Unknown Error from AWS") from err
 
+    def transaction(self) -> DBTransaction:
+        """
+        Starts a transaction on the table, writes are added to the transaction, then made
+        together with DBTransaction.execute
+
+        :return: An empty transaction on the table
+        """
+        return DBTransaction(self.name, self._resource.meta.client)
+
+    def transact_get(self, keys: Iterable[KeySchema]) -> list[T]:
+        """
+        Gets all items with the given keys from the database in a single request, reading
+        every item as it was at the same point in time
+
+        :param keys: The keys of the items to get from the database
+        :return: The items with the given keys, in the same order as the keys
+        :raises ExternalServiceException: Unexpected error occurs in AWS
+        :raises PermissionException: Assumed role does not have permission to get items
+        :raises ResourceNotFound: An item with one of the given keys could not be found
+        :raises ValidationError: The returned items did not match the provided schema for the table
+        """
+        keys = list(keys)
+        if not keys:
+            return []
+
+        try:
+            response: dict = self._resource.meta.client.transact_get_items(
+                TransactItems=[{"Get": {"TableName": self.name, "Key": key}} for key in keys]
+            )
+        except ClientError as err:
+            logger.exception(err)
+            if err.response["Error"]["Code"] == "AccessDeniedException":
+                raise PermissionException(
+                    "Insufficient permissions to perform transact get on the table"
+                ) from err
+            raise ExternalServiceException("Unknown Error from AWS") from err
+
+        items: list[T] = []
+        for key, item_response in zip(keys, response["Responses"]):
+            if not item_response.get("Item"):
+                raise ResourceNotFound(
+                    resource_type=self.item_schema.item_type().value, resource_id=str(key)
+                )
+            items.append(self.item_schema.model_validate(item_response["Item"]))
+        return items
+
+    @overload
     def query(
         self,
         gsi: Optional[GSI] = None,
@@ -236,7 +751,32 @@ class DBTable[T: DBItemModel]:
         limit: Optional[int] = None,
         scan_reverse: bool = False,
         start_key: Optional[dict] = None,
-    ) -> tuple[list[T], Optional[dict]]:
+        projection: None = None,
+    ) -> tuple[list[T], Optional[dict]]: ...
+
+    @overload
+    def query[P: CustomBaseModel](
+        self,
+        gsi: Optional[GSI] = None,
+        key_condition_expression: Optional[ConditionBase] = None,
+        filter_expression: Optional[ConditionBase] = None,
+        limit: Optional[int] = None,
+        scan_reverse: bool = False,
+        start_key: Optional[dict] = None,
+        *,
+        projection: Type[P],
+    ) -> tuple[list[P], Optional[dict]]: ...
+
+    def query(
+        self,
+        gsi: Optional[GSI] = None,
+        key_condition_expression: Optional[ConditionBase] = None,
+        filter_expression: Optional[ConditionBase] = None,
+        limit: Optional[int] = None,
+        scan_reverse: bool = False,
+        start_key: Optional[dict] = None,
+        projection: Optional[Type[CustomBaseModel]] = None,
+    ) -> tuple[list[Any], Optional[dict]]:
         """
         Queries the database based on the given list of criterion
 
@@ -251,21 +791,17 @@ class DBTable[T: DBItemModel]:
             reverses the order of the items received from the query. By default items come
             in ascending order, so making this true puts them in descending order.
         :param start_key: The key to start after, received from a previous query
+        :param projection: A partial model of the items, if given only the attributes of this
+            model are read from the database, and the items are returned as this model
         :return: The list of items matching the requested query and the last evaluated key
         :raises ConditionValidationError: The key condition is not valid, this usually happens
             when using a condition other than `.eq` on a hash key
         :raises ValidationError: The returned items did not match the provided schema for the table
         :raises ExternalServiceException: Unexpected error occurs in S3
         """
-        kwargs: dict = {}
-        if gsi:
-            kwargs["IndexName"] = gsi.name
-        if key_condition_expression:
-            kwargs["KeyConditionExpression"] = key_condition_expression
-        if filter_expression:
-            kwargs["FilterExpression"] = filter_expression
-        if scan_reverse is not None:
-            kwargs["ScanIndexForward"] = not scan_reverse
+        kwargs = _query_kwargs(
+            gsi, key_condition_expression, filter_expression, scan_reverse, projection
+        )
         if start_key:
             kwargs["ExclusiveStartKey"] = start_key
 
@@ -293,4 +829,186 @@ class DBTable[T: DBItemModel]:
             if err.response["Error"]["Code"] == "ValidationException":
                 raise ConditionValidationError() from err
             raise ExternalServiceException("Unknown Error from AWS") from err
-        return [self.item_schema.model_validate(item) for item in items], last_eval_key
+        schema = projection or self.item_schema
+        return [schema.model_validate(item) for item in items], last_eval_key
+
+    @overload
+    def iter_query(
+        self,
+        gsi: Optional[GSI] = None,
+        key_condition_expression: Optional[ConditionBase] = None,
+        filter_expression: Optional[ConditionBase] = None,
+        page_size: Optional[int] = None,
+        scan_reverse: bool = False,
+        cursor: Optional[QueryCursor] = None,
+        projection: None = None,
+    ) -> Iterator[T]: ...
+
+    @overload
+    def iter_query[P: CustomBaseModel](
+        self,
+        gsi: Optional[GSI] = None,
+        key_condition_expression: Optional[ConditionBase] = None,
+        filter_expression: Optional[ConditionBase] = None,
+        page_size: Optional[int] = None,
+        scan_reverse: bool = False,
+        cursor: Optional[QueryCursor] = None,
+        *,
+        projection: Type[P],
+    ) -> Iterator[P]: ...
+
+    def iter_query(
+        self,
+        gsi: Optional[GSI] = None,
+        key_condition_expression: Optional[ConditionBase] = None,
+        filter_expression: Optional[ConditionBase] = None,
+        page_size: Optional[int] = None,
+        scan_reverse: bool = False,
+        cursor: Optional[QueryCursor] = None,
+        projection: Optional[Type[CustomBaseModel]] = None,
+    ) -> Iterator[Any]:
+        """
+        Queries the database based on the given list of criterion, yielding items as each page
+        arrives rather than once all pages have been read. Pages are only requested as the
+        returned iterator is consumed, so stopping iteration early skips reading later pages.
+
+        :param gsi: The index being used to query the database, the key attributes of the items
+            change depending on GSI
+        :param key_condition_expression: A condition placed on the key attributes, only items
+            meeting this condition are returned
+        :param filter_expression: A condition placed on any attributes, only items meeting this
+            condition are returned
+        :param page_size: The maximum number of items to evaluate per request to the database
+        :param scan_reverse: if true reverse the order that table items are scanned in, this
+            reverses the order of the items received from the query. By default items come
+            in ascending order, so making this true puts them in descending order.
+        :param cursor: A cursor to resume the query from, it is updated with the key of every
+            item yielded, and marked exhausted once there are no more items
+        :param projection: A partial model of the items, if given only the attributes of this
+            model are read from the database, and the items are yielded as this model
+        :return: An iterator over the items matching the requested query
+        :raises ConditionValidationError: The key condition is not valid, this usually happens
+            when using a condition other than `.eq` on a hash key
+        :raises ValidationError: The returned items did not match the provided schema for the table
+        :raises ExternalServiceException: Unexpected error occurs in AWS
+        """
+        kwargs = _query_kwargs(
+            gsi, key_condition_expression, filter_expression, scan_reverse, projection
+        )
+        if page_size:
+            kwargs["Limit"] = page_size
+        if cursor and cursor.last_key:
+            kwargs["ExclusiveStartKey"] = cursor.last_key
+
+        key_attributes = ("pk", "sk") + _index_keys(gsi)
+        schema = projection or self.item_schema
+
+        while True:
+            try:
+                response: dict = self._table.query(**kwargs)
+            except ClientError as err:
+                if err.response["Error"]["Code"] == "ValidationException":
+                    raise ConditionValidationError() from err
+                raise ExternalServiceException("Unknown Error from AWS") from err
+
+            for item in response.get("Items", []):
+                validated_item = schema.model_validate(item)
+                if cursor:
+                    cursor.last_key = {attr: item[attr] for attr in key_attributes}
+                yield validated_item
+
+            if not (last_eval_key := response.get("LastEvaluatedKey")):
+                break
+            kwargs["ExclusiveStartKey"] = last_eval_key
+
+        if cursor:
+            cursor.last_key = None
+            cursor.exhausted = True
+
+    def batch_get(self, keys: Iterable[KeySchema]) -> list[T]:
+        """
+        Gets all items with the given keys from the database, using as few requests as possible.
+        Keys are split into chunks of at most 100, and any keys left unprocessed by DynamoDB
+        are retried with a jittered exponential backoff. Keys that do not exist in the
+        database are ignored.
+
+        :param keys: The keys of the items to get from the database
+        :return: The items found in the database, in no particular order
+        :raises ExternalServiceException: Unexpected error occurs in AWS, or DynamoDB was unable
+            to process all keys after several attempts
+        :raises PermissionException: Assumed role does not have permission to get items
+        :raises ValidationError: The returned items did not match the provided schema for the table
+        """
+        # BatchGetItem rejects requests containing duplicate keys
+        unique_keys = list({(key["pk"], key["sk"]): key for key in keys}.values())
+        items: list[dict] = []
+
+        for chunk in _chunk(unique_keys, BATCH_GET_LIMIT):
+            request_items: dict = {self.name: {"Keys": chunk}}
+            attempt = 0
+            while request_items:
+                if attempt >= BATCH_MAX_ATTEMPTS:
+                    raise ExternalServiceException("Unable to process all keys in batch get")
+                if attempt:
+                    _backoff(attempt)
+                attempt += 1
+
+                try:
+                    response: dict = self._resource.batch_get_item(RequestItems=request_items)
+                except ClientError as err:
+                    logger.exception(err)
+                    if err.response["Error"]["Code"] == "AccessDeniedException":
+                        raise PermissionException(
+                            "Insufficient permissions to perform batch get on the table"
+                        ) from err
+                    raise ExternalServiceException("Unknown Error from AWS") from err
+
+                items.extend(response.get("Responses", {}).get(self.name, []))
+                request_items = response.get("UnprocessedKeys") or {}
+
+        return [self.item_schema.model_validate(item) for item in items]
+
+    def batch_write(
+        self,
+        puts: Optional[Iterable[T]] = None,
+        deletes: Optional[Iterable[KeySchema]] = None,
+    ) -> None:
+        """
+        Puts and deletes the given items in the database, using as few requests as possible.
+        Requests are split into chunks of at most 25, and any requests left unprocessed by
+        DynamoDB are retried with a jittered exponential backoff. Batch writes do not support
+        conditions, and an item must not be both put and deleted in the same call.
+
+        :param puts: The items to put into the database
+        :param deletes: The keys of the items to delete from the database
+        :raises ExternalServiceException: Unexpected error occurs in AWS, or DynamoDB was unable
+            to process all requests after several attempts
+        :raises PermissionException: Assumed role does not have permission to write items,
+            likely due to the table being initialized with only read permissions
+        """
+        write_requests: list[dict] = [
+            {"PutRequest": {"Item": item.model_dump()}} for item in puts or []
+        ]
+        write_requests.extend({"DeleteRequest": {"Key": key}} for key in deletes or [])
+
+        for chunk in _chunk(write_requests, BATCH_WRITE_LIMIT):
+            request_items: dict = {self.name: chunk}
+            attempt = 0
+            while request_items:
+                if attempt >= BATCH_MAX_ATTEMPTS:
+                    raise ExternalServiceException("Unable to process all items in batch write")
+                if attempt:
+                    _backoff(attempt)
+                attempt += 1
+
+                try:
+                    response: dict = self._resource.batch_write_item(RequestItems=request_items)
+                except ClientError as err:
+                    logger.exception(err)
+                    if err.response["Error"]["Code"] == "AccessDeniedException":
+                        raise PermissionException(
+                            "Insufficient permissions to perform batch write on the table"
+                        ) from err
+                    raise ExternalServiceException("Unknown Error from AWS") from err
+
+                request_items = response.get("UnprocessedItems") or {}
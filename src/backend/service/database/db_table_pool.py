@@ -0,0 +1,75 @@
+"""
+Module providing a process-wide pool of DynamoDB table connections, so that warm invocations
+of the lambda can reuse connections instead of setting them up on every request
+"""
+
+from threading import Lock
+from time import monotonic
+from typing import Optional, Type
+
+from aws_lambda_powertools.logging import Logger
+
+from ..models.db.db_base import DBItemModel
+from ..util import AWSAccessLevel
+from .db_table import DBTable
+
+logger = Logger()
+
+
+class DBTablePool:
+    """
+    A pool of DBTable's, keyed by the access level and item schema of the table. Tables are
+    created on first use and reused by all later requests. The credentials of a table refresh
+    themselves ahead of expiry, so tables never need replacing unless a maximum age is given.
+    """
+
+    def __init__(self, max_age_seconds: Optional[float] = None):
+        """
+        Initialize an empty pool of tables
+
+        :param max_age_seconds: The age after which a pooled table is replaced with a new one,
+            if not given pooled tables are never replaced
+        """
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._tables: dict[tuple[AWSAccessLevel, type], tuple[DBTable, float]] = {}
+        self._lock = Lock()
+
+    def get[T: DBItemModel](self, access: AWSAccessLevel, item_schema: Type[T]) -> DBTable[T]:
+        """
+        Get a table from the pool with the given access level and item schema, creating
+        one if none exists, or the existing table has reached its maximum age
+
+        :param access: The level of permission desired for the table
+        :param item_schema: The schema of the items in the table
+        :return: A table with the requested access level and item schema
+        :raises ExternalServiceException: Unable to connect to the DynamoDB Service
+        :raises PermissionException: Unable to assume IAM role for required access level
+        """
+        key = (access, item_schema)
+        now = monotonic()
+        with self._lock:
+            pooled = self._tables.get(key)
+            if pooled and (self.max_age_seconds is None or now - pooled[1] < self.max_age_seconds):
+                self.hits += 1
+                return pooled[0]
+
+            self.misses += 1
+            table = DBTable(access=access, item_schema=item_schema)
+            self._tables[key] = (table, now)
+            logger.debug(f"Created pooled table for [{access.value}, {item_schema.__name__}]")
+            return table
+
+    def clear(self) -> None:
+        """
+        Remove all tables from the pool, and reset the hit and miss counters
+        """
+        with self._lock:
+            self._tables.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+table_pool = DBTablePool()
+# The pool shared by all requests handled by this process
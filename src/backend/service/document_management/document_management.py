@@ -2,25 +2,34 @@
 Module for document management operations
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Optional
+from threading import Lock, local
+from time import monotonic
+from typing import Any, List, Optional, Type
 from uuid import uuid4
 
 from aws_lambda_powertools.logging import Logger
-from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.conditions import Attr, Key
 
 from ..database.db_table import GSI, DBTable, KeySchema
 from ..environment import DOCUMENT_STORAGE_BUCKET_NAME
 from ..exceptions import (
+    BadRequestException,
+    ExternalServiceException,
     ResourceConflict,
+    ResourceNotFound,
 )
-from ..file_storage.s3_bucket import S3Bucket
-from ..models.api.document import APIDocumentResponse
-from ..models.db.document import DBDocument
-from ..util import FileType, ItemType
+from ..file_storage.s3_bucket import DELETE_OBJECTS_LIMIT, S3Bucket
+from ..models.custom_base_model import CustomBaseModel
+from ..models.db.document import DBDocument, DBDocumentName, DBDocumentTreeNode, TreeIndex
+from ..util import FileType, ItemType, decode_db_key, encode_db_key
 
 logger = Logger()
 
+FOLDER_DELETE_WORKERS = 8
+# Maximum number of threads used to list and delete the contents of a folder
+
 
 def get_presigned_url(s3_key: str, bucket: S3Bucket) -> dict:
     """
@@ -37,16 +46,103 @@ def get_presigned_url(s3_key: str, bucket: S3Bucket) -> dict:
     return upload_url
 
 
+def _tree_name(document_name: str) -> str:
+    """
+    Escapes the name of a document, so it can be used as part of a path in the document tree
+
+    :param document_name: The name of the document
+    :return: The name, with any "/" in it escaped
+    """
+    return document_name.replace("%", "%25").replace("/", "%2F")
+
+
+def _tree_nodes(document: DBDocument, tree_path: str) -> list[DBDocumentTreeNode]:
+    """
+    Creates the nodes of a document in the document tree
+
+    :param document: The document to create the nodes for
+    :param tree_path: The path of the document in the document tree
+    :return: The node indexed by path, and the node indexed by id
+    """
+    return [
+        DBDocumentTreeNode(
+            site_id=document.site_id,
+            document_id=document.document_id,
+            document_name=document.document_name,
+            document_type=document.document_type,
+            parent_folder_id=document.parent_folder_id,
+            tree_path=tree_path,
+            indexed_by=indexed_by,
+            last_modified_by=document.last_modified_by,
+            last_modified_time=document.last_modified_time,
+        )
+        for indexed_by in TreeIndex
+    ]
+
+
+def _tree_keys(document: DBDocument, tree_path: str) -> list[KeySchema]:
+    """
+    Gives the keys of the nodes of a document in the document tree
+
+    :param document: The document to get the keys for
+    :param tree_path: The path of the document in the document tree
+    :return: The keys of the node indexed by path, and the node indexed by id
+    """
+    return [KeySchema(pk=node.pk, sk=node.sk) for node in _tree_nodes(document, tree_path)]
+
+
+def _folder_tree_node(
+    tree_table: DBTable[DBDocumentTreeNode], site_id: str, folder_id: str
+) -> Optional[DBDocumentTreeNode]:
+    """
+    Gets the node of a folder in the document tree, indexed by its id
+
+    :param tree_table: The DB table object to use for this operation
+    :param site_id: The site containing the folder
+    :param folder_id: The folder to get the node of
+    :return: The node of the folder, or None if the folder is not in the tree
+    """
+    try:
+        return tree_table.get(
+            KeySchema(
+                pk=f"{ItemType.DOCUMENT_TREE.value}#{site_id}",
+                sk=f"{TreeIndex.ID.value}#{folder_id}",
+            )
+        )
+    except ResourceNotFound:
+        return None
+
+
+def _folder_tree_path(tree_table: DBTable[DBDocumentTreeNode], site_id: str, folder_id: str) -> str:
+    """
+    Gets the path of a folder in the document tree. Folders that are not in the tree are
+    the top level folders of the site, such as "root", and are their own path
+
+    :param tree_table: The DB table object to use for this operation
+    :param site_id: The site containing the folder
+    :param folder_id: The folder to get the path of
+    :return: The path of the folder in the document tree
+    """
+    node = _folder_tree_node(tree_table, site_id, folder_id)
+    return node.tree_path if node else _tree_name(folder_id)
+
+
 def get_all_files(
-    table: DBTable[DBDocument], bucket: S3Bucket, site_id: str, parent_folder_id: str
-) -> List[APIDocumentResponse]:
+    table: DBTable[DBDocument],
+    bucket: Optional[S3Bucket],
+    site_id: str,
+    parent_folder_id: str,
+    fields: Optional[set[str]] = None,
+) -> List[CustomBaseModel]:
     """
     Function to get all documents for a given site, contains both files and
     folders under the given parent folder
     :param table: The DB table object to use for this operation
-    :param bucket: The S3Bucket containing the files
+    :param bucket: The S3Bucket containing the files, if not given no urls are signed
     :param site_id: The site id to get files for
     :param parent_folder_id: folder to get documents for
+    :param fields: The fields of each document to give, if given only the attributes
+        needed for them are read, and urls are only signed when selected
     :return: A list of documents in the given folder
     """
     logger.info(site_id)
@@ -54,18 +150,39 @@ def get_all_files(
         f"{ItemType.DOCUMENT.value}#{site_id}#{parent_folder_id}"
     )
 
-    site_specific_documents, _ = table.query(key_condition_expression=key_expression_specific)
-    logger.info(site_specific_documents)
-
     # split for now, not necessary but the response may change in the future for
     # flexibility
-    returned_documents = []
+    documents: list[Any] = list(
+        table.iter_query(
+            key_condition_expression=key_expression_specific,
+            projection=DBDocument.api_projection(fields) if fields else None,
+        )
+    )
+    if fields and "s3_presigned_get" not in fields:
+        bucket = None
+    # sign the urls for every file in the folder at once
+    presigned_get_urls = iter(
+        bucket.create_get_urls(
+            [
+                (document.s3_key, document.document_name)
+                for document in documents
+                if document.document_type == FileType.FILE.value
+            ]
+        )
+        if bucket
+        else []
+    )
+
+    returned_documents: List[CustomBaseModel] = []
     # returned_site_wide_documents = []
-    for document in site_specific_documents:
+    for document in documents:
         presigned_get_url = None
-        if document.document_type == FileType.FILE.value:
-            presigned_get_url = bucket.create_get_url(document.s3_key, document.document_name)
-        api_document = document.to_api_model(presigned_get_url)
+        if bucket and document.document_type == FileType.FILE.value:
+            presigned_get_url = next(presigned_get_urls)
+        if fields:
+            api_document = DBDocument.to_partial_api_model(document, fields, presigned_get_url)
+        else:
+            api_document = document.to_api_model(presigned_get_url)
         returned_documents.append(api_document)
 
     return returned_documents
@@ -73,6 +190,7 @@ def get_all_files(
 
 def upload_file(
     table: DBTable[DBDocument],
+    tree_table: DBTable[DBDocumentTreeNode],
     document_name: str,
     document_type: FileType,
     parent_folder_id: str,
@@ -91,6 +209,7 @@ def upload_file(
     between folder and file. The distinction will be a property in the document
     itself
     :param table: The DB table object to use for this operation
+    :param tree_table: The DB table object to use to update the document tree
     :param document_name: The canonical name of the file.
     :param document_type: The type of the file
     :param parent_folder_id: The DB table object to use for this operation
@@ -121,59 +240,227 @@ def upload_file(
         requires_ack=requires_ack,
         site_id=site_id,
     )
-    # Query to check if a document with the same name already exists in the folder,
-    # since SK is the unique document ID, we need to query to to see if a document
-    # with the same name exists in the parent folder.
-    key_expression = Key("pk").eq(f"{ItemType.DOCUMENT.value}#{site_id}#{parent_folder_id}")
-    existing_docs, _ = table.query(key_condition_expression=key_expression)
-
-    for doc in existing_docs:
-        if doc.document_name == document_name:
-            raise ResourceConflict(
-                resource_type=document.type.value,
-                resource_id=str(KeySchema(pk=document.pk, sk=document.document_name)),
-            )
+    conflict = ResourceConflict(
+        resource_type=document.type.value,
+        resource_id=str(KeySchema(pk=document.pk, sk=document.document_name)),
+    )
+    folder_node = _folder_tree_node(tree_table, site_id, parent_folder_id)
+    if folder_node is None:
+        # Top level folders, and folders not yet added to the tree by index_document_tree,
+        # may hold documents uploaded before the tree was kept, which have no tree nodes.
+        # Their names are checked by streaming the names of the documents in the folder.
+        key_expression = Key("pk").eq(f"{ItemType.DOCUMENT.value}#{site_id}#{parent_folder_id}")
+        for doc in table.iter_query(
+            key_condition_expression=key_expression, projection=DBDocumentName
+        ):
+            if doc.document_name == document_name:
+                raise conflict
 
-    return table.put(item=document)
+    # The path of the document in the document tree reserves its name in the folder,
+    # so the document and its tree nodes are only put if no other document has the name
+    tree_path = f"{folder_node.tree_path if folder_node else _tree_name(parent_folder_id)}/"
+    tree_path += _tree_name(document_name)
+    transaction = table.transaction().put(document, Attr("pk").not_exists())
+    for node in _tree_nodes(document, tree_path):
+        transaction.put(node, Attr("pk").not_exists(), condition_error=conflict)
+    transaction.execute()
+    return document
 
 
-def delete(
+def _delete_files(
     table: DBTable[DBDocument],
+    tree_table: DBTable[DBDocumentTreeNode],
+    s3_bucket: S3Bucket,
+    files: list[tuple[DBDocument, str]],
+) -> dict[str, str]:
+    """
+    Deletes a batch of files from S3, then removes the files that were deleted from the database
+
+    :param table: The DB table object to use for this operation
+    :param tree_table: The DB table object to use to update the document tree
+    :param s3_bucket: The S3Bucket containing the files
+    :param files: The files to delete, with their path in the document tree
+    :return: The S3 error code for each key that could not be deleted
+    """
+    failures = s3_bucket.delete_many([(item.s3_key, item.s3_e_tag) for item, _ in files])
+    deleted = [(item, tree_path) for item, tree_path in files if item.s3_key not in failures]
+    table.batch_write(deletes=[KeySchema(pk=item.pk, sk=item.sk) for item, _ in deleted])
+    tree_table.batch_write(
+        deletes=[key for item, tree_path in deleted for key in _tree_keys(item, tree_path)]
+    )
+    return failures
+
+
+def _delete_folder(
+    table: DBTable[DBDocument],
+    tree_table: DBTable[DBDocumentTreeNode],
+    s3_bucket: S3Bucket,
+    folder: tuple[DBDocument, str],
+    deadline: Optional[float],
+) -> tuple[int, bool]:
+    """
+    Deletes a folder and everything in it. The folder tree is walked breadth first, with the
+    folders of each level queried concurrently, and the files found deleted in concurrent
+    batches. The folders themselves are deleted last, from the deepest level up, so a
+    delete that is stopped early can always be continued by deleting the folder again.
+    The deadline is checked after every round of concurrent work, so a wide level cannot
+    run far past it.
+
+    :param table: The DB table object to use for this operation
+    :param tree_table: The DB table object to use to update the document tree
+    :param s3_bucket: The S3Bucket containing the files
+    :param folder: The folder to delete, with its path in the document tree
+    :param deadline: The monotonic time after which no new work is started
+    :return: The number of documents deleted, and whether the folder was completely deleted
+    :raises ResourceNotFound: A file exists in S3, but with a different ETag than expected
+    :raises ExternalServiceException: Unexpected error occurs in AWS
+    """
+    workers = local()
+    connection_lock = Lock()
+
+    def worker_tables() -> tuple[DBTable[DBDocument], DBTable[DBDocumentTreeNode]]:
+        # boto3 resources are not thread safe, so each worker has its own connections. They
+        # are created one at a time, as the session they are created from is shared
+        if not hasattr(workers, "tables"):
+            with connection_lock:
+                workers.tables = (table.new_connection(), tree_table.new_connection())
+        return workers.tables
+
+    def list_folder(parent: tuple[DBDocument, str]) -> list[tuple[DBDocument, str]]:
+        parent_folder, parent_path = parent
+        key_expression = Key("pk").eq(
+            f"{ItemType.DOCUMENT.value}#{parent_folder.site_id}#{parent_folder.document_id}"
+        )
+        return [
+            (item, f"{parent_path}/{_tree_name(item.document_name)}")
+            for item in worker_tables()[0].iter_query(key_condition_expression=key_expression)
+        ]
+
+    def delete_files(batch: list[tuple[DBDocument, str]]) -> dict[str, str]:
+        return _delete_files(*worker_tables(), s3_bucket, batch)
+
+    def out_of_time() -> bool:
+        # Always make some progress, so resuming the delete eventually finishes it
+        return deleted > 0 and deadline is not None and monotonic() > deadline
+
+    deleted = 0
+    failures: dict[str, str] = {}
+    levels: list[list[tuple[DBDocument, str]]] = []
+    level = [folder]
+    with ThreadPoolExecutor(max_workers=FOLDER_DELETE_WORKERS) as executor:
+        while level:
+            levels.append(level)
+            files: list[tuple[DBDocument, str]] = []
+            next_level: list[tuple[DBDocument, str]] = []
+            for start in range(0, len(level), FOLDER_DELETE_WORKERS):
+                folders = level[start : start + FOLDER_DELETE_WORKERS]
+                for items in executor.map(list_folder, folders):
+                    for item, tree_path in items:
+                        if item.document_type == FileType.FOLDER.value:
+                            next_level.append((item, tree_path))
+                        else:
+                            files.append((item, tree_path))
+                if out_of_time():
+                    return deleted, False
+
+            batches = [
+                files[start : start + DELETE_OBJECTS_LIMIT]
+                for start in range(0, len(files), DELETE_OBJECTS_LIMIT)
+            ]
+            for start in range(0, len(batches), FOLDER_DELETE_WORKERS):
+                batch_round = batches[start : start + FOLDER_DELETE_WORKERS]
+                for batch, batch_failures in zip(
+                    batch_round, executor.map(delete_files, batch_round)
+                ):
+                    failures.update(batch_failures)
+                    deleted += len(batch) - len(batch_failures)
+                if out_of_time():
+                    return deleted, False
+            level = next_level
+
+    if failures:
+        # Keep the folders, and the files that are still in S3, so the delete can be retried
+        if "PreconditionFailed" in failures.values():
+            raise ResourceNotFound(resource_type="file", resource_id=str(list(failures)))
+        raise ExternalServiceException("Unable to delete all files in the folder from S3")
+
+    for level in reversed(levels):
+        table.batch_write(deletes=[KeySchema(pk=item.pk, sk=item.sk) for item, _ in level])
+        tree_table.batch_write(
+            deletes=[key for item, tree_path in level for key in _tree_keys(item, tree_path)]
+        )
+        deleted += len(level)
+        if level is not levels[0] and out_of_time():
+            return deleted, False
+    return deleted, True
+
+
+def delete(  # pylint: disable=too-many-arguments
+    table: DBTable[DBDocument],
+    tree_table: DBTable[DBDocumentTreeNode],
     s3_bucket: S3Bucket,
     site_id: str,
     parent_folder_id: str,
     document_id: str,
-) -> None:
+    time_budget_seconds: Optional[float] = None,
+    resume_token: Optional[str] = None,
+) -> tuple[int, Optional[str]]:
     """
     Function to delete a document from the virtual file system. If the provided
     document is a file, it is deleted. If the provided document is a folder, the
-    a recursive delete is run through all the files in the folder before
-    deleting the folder itself
+    folder and everything in it is deleted. Large folders may not be deleted within
+    the time budget, in which case a resume token is given to continue the delete
     :param table: The DB table object to use for this operation
+    :param tree_table: The DB table object to use to update the document tree
     :param s3_bucket: The S3Bucket containing this file
     :param site_id: The site id to delete from
     :param parent_folder_id: The parent folder that contains the file to be deleted
     :param document_id: The document id to be deleted
+    :param time_budget_seconds: The time after which no new work is started when deleting
+        a folder, if not given the folder is always completely deleted
+    :param resume_token: The token given by a previous delete of the same folder that
+        ran out of time
+    :return: The total number of documents deleted, and a token to resume the delete with
+        if the folder could not be completely deleted
+    :raises BadRequestException: The resume token is invalid, or for a different document
+    :raises ResourceNotFound: A file exists in S3, but with a different ETag than expected
+    :raises ExternalServiceException: Unexpected error occurs in AWS
     """
-    document = table.get(
-        {"pk": f"{ItemType.DOCUMENT.value}#{site_id}#{parent_folder_id}", "sk": f"{document_id}"}
-    )
+    deadline = None
+    if time_budget_seconds is not None:
+        deadline = monotonic() + time_budget_seconds
+
+    key = KeySchema(pk=f"{ItemType.DOCUMENT.value}#{site_id}#{parent_folder_id}", sk=document_id)
+    previously_deleted = 0
+    if resume_token:
+        try:
+            progress = decode_db_key(resume_token)
+            previously_deleted = int(progress["deleted"])
+            valid = progress["pk"] == key["pk"] and progress["sk"] == key["sk"]
+        except (ValueError, KeyError, TypeError) as err:
+            raise BadRequestException("Invalid resume token") from err
+        if not valid:
+            raise BadRequestException("Resume token is for a different document")
+
+    document = table.get(key)
+    tree_path = f"{_folder_tree_path(tree_table, site_id, parent_folder_id)}/"
+    tree_path += _tree_name(document.document_name)
     # If the document is a file, delete it
     if document.document_type == FileType.FILE.value:
         s3_bucket.delete(key=document.s3_key, e_tag=document.s3_e_tag)
         table.delete({"pk": document.pk, "sk": document.sk})
-    # If the document is a folder, recursively clear the folder, then delete it.
-    elif document.document_type == FileType.FOLDER.value:
-        key_expression = Key("pk").eq(f"{ItemType.DOCUMENT.value}#{site_id}#{document.document_id}")
-        items, _ = table.query(key_condition_expression=key_expression)
-        for item in items:
-            if item.document_type == FileType.FOLDER.value:
-                # recursively delete subfolders
-                delete(table, s3_bucket, site_id, document.document_id, item.document_id)
-            else:
-                s3_bucket.delete(key=item.s3_key, e_tag=item.s3_e_tag)
-                table.delete({"pk": item.pk, "sk": item.sk})
-        table.delete({"pk": document.pk, "sk": document.sk})
+        tree_table.batch_write(deletes=_tree_keys(document, tree_path))
+        return previously_deleted + 1, None
+
+    # If the document is a folder, clear the folder, then delete it.
+    deleted, complete = _delete_folder(
+        table, tree_table, s3_bucket, (document, tree_path), deadline
+    )
+    deleted += previously_deleted
+    if complete:
+        return deleted, None
+    logger.info(f"Deleted {deleted} documents from [{key}], stopping to resume later")
+    return deleted, encode_db_key({"pk": key["pk"], "sk": key["sk"], "deleted": deleted})
 
 
 def list_expiring_documents(
@@ -182,7 +469,8 @@ def list_expiring_documents(
     days: Optional[int] = None,
     limit: Optional[int] = None,
     start_key: Optional[dict] = None,
-) -> tuple[list[DBDocument], Optional[dict]]:
+    projection: Optional[Type[CustomBaseModel]] = None,
+) -> tuple[list[Any], Optional[dict]]:
     """
     Function to get all documents that are expiring within a given time range, if no days
     are provided, will return the documents that are expiring before the from_time
@@ -192,6 +480,7 @@ def list_expiring_documents(
     :param days: The number of days from the from_time to look for expiring documents
     :param limit: Maximum number of documents to retrieve from the database
     :param start_key: The key to start getting new documents from
+    :param projection: A partial model of the documents, if given only its attributes are read
     :return: The list of documents expiring
     :raises ExternalServiceException: An unexpected error occurs in AWS
     """
@@ -209,4 +498,94 @@ def list_expiring_documents(
         limit=limit,
         scan_reverse=True,
         start_key=start_key,
+        projection=projection,
+    )
+
+
+def get_document_tree(
+    tree_table: DBTable[DBDocumentTreeNode], site_id: str, folder_id: str
+) -> list[DBDocumentTreeNode]:
+    """
+    Function to get every document under a folder, at any depth, with a single query
+    of the document tree
+
+    :param tree_table: The DB table object to use for this operation
+    :param site_id: The site containing the folder
+    :param folder_id: The folder to get the documents under, can be a top level folder
+    :return: The documents under the folder, ordered by their path
+    :raises ExternalServiceException: An unexpected error occurs in AWS
+    """
+    folder_path = _folder_tree_path(tree_table, site_id, folder_id)
+    key_expression = Key("pk").eq(f"{ItemType.DOCUMENT_TREE.value}#{site_id}") & Key(
+        "sk"
+    ).begins_with(f"{TreeIndex.PATH.value}#{folder_path}/")
+    return list(tree_table.iter_query(key_condition_expression=key_expression))
+
+
+def resolve_document_path(
+    tree_table: DBTable[DBDocumentTreeNode], site_id: str, document_path: list[str]
+) -> DBDocumentTreeNode:
+    """
+    Function to find a document by the names of the folders leading to it
+
+    :param tree_table: The DB table object to use for this operation
+    :param site_id: The site containing the document
+    :param document_path: The top level folder, the names of the folders inside it, and the
+        name of the document, e.g. ["root", "Safety", "plan.pdf"]
+    :return: The document tree node of the document, identifying the document
+    :raises ResourceNotFound: No document exists at the given path
+    :raises ExternalServiceException: An unexpected error occurs in AWS
+    """
+    tree_path = "/".join(_tree_name(name) for name in document_path)
+    return tree_table.get(
+        KeySchema(
+            pk=f"{ItemType.DOCUMENT_TREE.value}#{site_id}",
+            sk=f"{TreeIndex.PATH.value}#{tree_path}",
+        )
     )
+
+
+def index_document_tree(
+    table: DBTable[DBDocument],
+    tree_table: DBTable[DBDocumentTreeNode],
+    site_id: str,
+    folder_id: str,
+) -> int:
+    """
+    Function to add every document under a folder to the document tree, used to build the
+    tree for documents uploaded before the tree was maintained. Documents uploaded into
+    folders that were not yet in the tree were given the path of the folder as if it were
+    a top level folder, and the nodes at those paths are removed.
+
+    :param table: The DB table object to use to read the documents
+    :param tree_table: The DB table object to use to update the document tree
+    :param site_id: The site containing the folder
+    :param folder_id: The folder to index the documents under, can be a top level folder
+    :return: The number of documents indexed
+    :raises ExternalServiceException: An unexpected error occurs in AWS
+    """
+    indexed = 0
+    folders = [(folder_id, _folder_tree_path(tree_table, site_id, folder_id))]
+    while folders:
+        parent_id, parent_path = folders.pop()
+        key_expression = Key("pk").eq(f"{ItemType.DOCUMENT.value}#{site_id}#{parent_id}")
+        nodes: list[DBDocumentTreeNode] = []
+        for document in table.iter_query(key_condition_expression=key_expression):
+            tree_path = f"{parent_path}/{_tree_name(document.document_name)}"
+            nodes.extend(_tree_nodes(document, tree_path))
+            if document.document_type == FileType.FOLDER.value:
+                folders.append((document.document_id, tree_path))
+        tree_paths = {node.document_id: node.tree_path for node in nodes}
+        existing = tree_table.batch_get(
+            KeySchema(pk=node.pk, sk=node.sk)
+            for node in nodes
+            if node.indexed_by == TreeIndex.ID.value
+        )
+        stale = [
+            KeySchema(pk=node.pk, sk=f"{TreeIndex.PATH.value}#{node.tree_path}")
+            for node in existing
+            if node.tree_path != tree_paths[node.document_id]
+        ]
+        tree_table.batch_write(puts=nodes, deletes=stale)
+        indexed += len(nodes) // len(TreeIndex)
+    return indexed
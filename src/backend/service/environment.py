@@ -25,6 +25,9 @@ COGNITO_ACCESS_ROLE = getenv("COGNITO_ACCESS_ROLE", "")
 TABLE_NAME = getenv("TABLE_NAME", "")
 # Name of the DB table used store all items
 
+DATABASE_INDEX_STAGE = int(getenv("DATABASE_INDEX_STAGE", "2"))
+# Highest global secondary index created on the DB table, see DatabaseIndexStage in backend.yaml
+
 TABLE_READ_ROLE = getenv("TABLE_READ_ROLE", "")
 # Role used for reading from the DB table
 
@@ -152,3 +152,14 @@ class ConflictException(HTTPError):
 
     def __init__(self, msg: str = "Conflict exists when making this request"):
         super().__init__(msg)
+
+
+class IndexUnavailableException(HTTPError):
+    """
+    Errors relating to a database index that has not been created yet
+    """
+
+    http_code = HTTPStatus.SERVICE_UNAVAILABLE
+
+    def __init__(self, index_name: str):
+        super().__init__(f"Database index [{index_name}] is not available yet")
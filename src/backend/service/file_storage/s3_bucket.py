@@ -2,17 +2,49 @@
 Module allowing interaction with S3 Buckets for file uploads, deletion, and reading
 """
 
-from typing import Optional
+from datetime import UTC, datetime, timedelta
+from threading import Lock
+from typing import NoReturn, Optional
 
 from aws_lambda_powertools.logging import Logger
 from botocore.exceptions import ClientError
+from cachetools import LRUCache
 
 from ..environment import DOCUMENT_STORAGE_BUCKET_READ_ROLE, DOCUMENT_STORAGE_BUCKET_WRITE_ROLE
 from ..exceptions import ExternalServiceException, PermissionException, ResourceNotFound
-from ..util import AWSAccessLevel, create_client_with_role
+from ..util import AWSAccessLevel, create_client_with_role, get_role_session
+from .presigned_url import presign_get_url
 
 logger = Logger()
 
+PRESIGNED_URL_EXPIRY_SECONDS = 3600
+# Number of seconds a presigned get url is valid for, the same as the botocore default
+
+PRESIGNED_URL_CACHE_FRACTION = 0.5
+# Fraction of the validity of a presigned get url during which it is reused from the cache
+
+PRESIGNED_URL_CACHE_SIZE = 4096
+# Maximum number of presigned get urls kept in the cache
+
+DELETE_OBJECTS_LIMIT = 1000
+# Maximum number of objects S3 can delete in a single DeleteObjects request
+
+MULTIPART_MIN_PART_SIZE = 5 * 1024 * 1024
+# Minimum size in bytes of every part of a multipart upload except the last
+
+_url_cache: LRUCache[tuple[str, str, str, str], tuple[str, datetime]] = LRUCache(
+    maxsize=PRESIGNED_URL_CACHE_SIZE
+)
+_url_cache_lock = Lock()
+
+
+def clear_url_cache() -> None:
+    """
+    Remove all presigned get urls from the cache
+    """
+    with _url_cache_lock:
+        _url_cache.clear()
+
 
 class S3Bucket:
     """
@@ -37,6 +69,7 @@ class S3Bucket:
             role_to_assume = DOCUMENT_STORAGE_BUCKET_WRITE_ROLE
 
         self._client = create_client_with_role(service_name="s3", role=role_to_assume)
+        self._credentials = get_role_session(role_to_assume).get_credentials()
 
     def create_upload_url(self, key: str) -> dict:
         """
@@ -55,21 +88,54 @@ class S3Bucket:
 
     def create_get_url(self, key: str, original_filename: str) -> str:
         """
-        Creates a presigned get url to get an object from S3
+        Creates a presigned get url to get an object from S3. Urls are signed locally,
+        and reused for part of their validity
 
         :param key: The key of the object to get from S3
         :param original_filename: The name of the file to be downloaded
         :return: The get object presigned url
         """
-        return self._client.generate_presigned_url(
-            ClientMethod="get_object",
-            Params={
-                "Bucket": self.name,
-                "Key": key,
-                "ResponseContentDisposition": f'attachment; filename="{original_filename}"',
-            },
+        return self.create_get_urls([(key, original_filename)])[0]
+
+    def create_get_urls(self, objects: list[tuple[str, str]]) -> list[str]:
+        """
+        Creates presigned get urls for many objects in S3, signed with the same credentials
+        and time. Urls are signed locally, and reused for part of their validity
+
+        :param objects: The key of each object to get from S3, with the name of the file
+            to be downloaded
+        :return: The get object presigned urls, in the same order as the given objects
+        """
+        credentials = self._credentials.get_frozen_credentials()
+        signed_at = datetime.now(UTC).replace(microsecond=0)
+        cache_until = signed_at + timedelta(
+            seconds=PRESIGNED_URL_EXPIRY_SECONDS * PRESIGNED_URL_CACHE_FRACTION
         )
 
+        urls = []
+        for key, original_filename in objects:
+            cache_key = (self.name, credentials.access_key, key, original_filename)
+            with _url_cache_lock:
+                cached = _url_cache.get(cache_key)
+            if cached is not None and cached[1] > signed_at:
+                urls.append(cached[0])
+                continue
+
+            url = presign_get_url(
+                credentials,
+                bucket=self.name,
+                key=key,
+                region=self._client.meta.region_name,
+                endpoint_url=self._client.meta.endpoint_url,
+                signed_at=signed_at,
+                expires_in=PRESIGNED_URL_EXPIRY_SECONDS,
+                content_disposition=f'attachment; filename="{original_filename}"',
+            )
+            with _url_cache_lock:
+                _url_cache[cache_key] = (url, cache_until)
+            urls.append(url)
+        return urls
+
     def delete(self, key: str, e_tag: Optional[str] = None) -> None:
         """
         Delete an object from S3
@@ -83,8 +149,9 @@ class S3Bucket:
             to delete a file, due to bucket being
             initialized with only read permissions
         """
+        conditions = {"IfMatch": e_tag} if e_tag else {}
         try:
-            self._client.delete_object(Bucket=self.name, Key=key)
+            self._client.delete_object(Bucket=self.name, Key=key, **conditions)
         except ClientError as err:
             logger.exception(err)
             if err.response["Error"]["Code"] == "AccessDenied":
@@ -96,3 +163,177 @@ class S3Bucket:
                     resource_type="file", resource_id=str({"Key": key, "ETag": e_tag})
                 ) from err
             raise ExternalServiceException("Unknown Error from AWS") from err
+
+    def delete_many(self, objects: list[tuple[str, Optional[str]]]) -> dict[str, str]:
+        """
+        Delete many objects from S3, in as few requests as possible. Objects that could not be
+        deleted are reported rather than raised, so the caller can decide how to handle them
+
+        :param objects: The key of each S3 Object to delete, with the ETag to match against
+            the object, or None to delete the object regardless of its ETag
+        :return: The error code from S3 for each key that could not be deleted, a
+            PreconditionFailed error means that the object exists, but with a different ETag
+        :raises ExternalServiceException: Unexpected error occurs in S3
+        :raises PermissionException: Assumed role does not have permission
+            to delete files, due to bucket being
+            initialized with only read permissions
+        """
+        failures: dict[str, str] = {}
+        for start in range(0, len(objects), DELETE_OBJECTS_LIMIT):
+            identifiers = [
+                {"Key": key, "ETag": e_tag} if e_tag else {"Key": key}
+                for key, e_tag in objects[start : start + DELETE_OBJECTS_LIMIT]
+            ]
+            try:
+                response = self._client.delete_objects(
+                    Bucket=self.name, Delete={"Objects": identifiers, "Quiet": True}
+                )
+            except ClientError as err:
+                logger.exception(err)
+                if err.response["Error"]["Code"] == "AccessDenied":
+                    raise PermissionException(
+                        "Insufficient permissions to perform delete on the S3 Bucket"
+                    ) from err
+                raise ExternalServiceException("Unknown Error from AWS") from err
+
+            for error in response.get("Errors", []):
+                logger.warning(f"Unable to delete [{error['Key']}]: {error.get('Message')}")
+                failures[error["Key"]] = error["Code"]
+        return failures
+
+    @staticmethod
+    def _raise_client_error(err: ClientError, operation: str, resource_id: str) -> NoReturn:
+        """
+        Raises the exception of this module matching an error from S3
+
+        :param err: The error from S3
+        :param operation: The operation that failed, used in the error message
+        :param resource_id: The key and upload id of the upload, used in the error message
+        :raises PermissionException: S3 denied access to the operation
+        :raises ResourceNotFound: The multipart upload does not exist
+        :raises ExternalServiceException: Any other error from S3
+        """
+        logger.exception(err)
+        if err.response["Error"]["Code"] == "AccessDenied":
+            raise PermissionException(
+                f"Insufficient permissions to perform {operation} on the S3 Bucket"
+            ) from err
+        if err.response["Error"]["Code"] == "NoSuchUpload":
+            raise ResourceNotFound(resource_type="upload", resource_id=resource_id) from err
+        raise ExternalServiceException("Unknown Error from AWS") from err
+
+    def start_multipart_upload(self, key: str, content_type: str) -> str:
+        """
+        Starts an upload of an object in parts, so that the object can be written as it is
+        produced without holding all of it in memory
+
+        :param key: The key of the object to upload
+        :param content_type: The content type of the object
+        :return: The id of the upload, needed to upload parts and complete the upload
+        :raises ExternalServiceException: Unexpected error occurs in S3
+        :raises PermissionException: Assumed role does not have permission to upload files,
+            due to bucket being initialized with only read permissions
+        """
+        try:
+            response = self._client.create_multipart_upload(
+                Bucket=self.name, Key=key, ContentType=content_type
+            )
+        except ClientError as err:
+            self._raise_client_error(err, "multipart upload", str({"Key": key}))
+        return response["UploadId"]
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, body: bytes) -> str:
+        """
+        Uploads a part of a multipart upload. Every part except the last must be at least
+        MULTIPART_MIN_PART_SIZE bytes. Uploading a part number again replaces the part.
+
+        :param key: The key of the object being uploaded
+        :param upload_id: The id of the upload
+        :param part_number: The position of the part in the object, starting from 1
+        :param body: The contents of the part
+        :return: The ETag of the part, needed to complete the upload
+        :raises ResourceNotFound: The upload does not exist, or was completed or aborted
+        :raises ExternalServiceException: Unexpected error occurs in S3
+        :raises PermissionException: Assumed role does not have permission to upload files
+        """
+        try:
+            response = self._client.upload_part(
+                Bucket=self.name, Key=key, UploadId=upload_id, PartNumber=part_number, Body=body
+            )
+        except ClientError as err:
+            self._raise_client_error(err, "upload part", str({"Key": key, "UploadId": upload_id}))
+        return response["ETag"]
+
+    def complete_multipart_upload(self, key: str, upload_id: str, e_tags: list[str]) -> None:
+        """
+        Completes a multipart upload, creating the object from its parts
+
+        :param key: The key of the object being uploaded
+        :param upload_id: The id of the upload
+        :param e_tags: The ETag of each part, in order of part number starting from 1
+        :raises ResourceNotFound: The upload does not exist, or was completed or aborted
+        :raises ExternalServiceException: Unexpected error occurs in S3
+        :raises PermissionException: Assumed role does not have permission to upload files
+        """
+        parts = [
+            {"PartNumber": number, "ETag": e_tag} for number, e_tag in enumerate(e_tags, start=1)
+        ]
+        try:
+            self._client.complete_multipart_upload(
+                Bucket=self.name, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+            )
+        except ClientError as err:
+            self._raise_client_error(
+                err, "complete multipart upload", str({"Key": key, "UploadId": upload_id})
+            )
+
+    def abort_multipart_upload(self, key: str, upload_id: str) -> None:
+        """
+        Aborts a multipart upload, removing any parts that were uploaded
+
+        :param key: The key of the object being uploaded
+        :param upload_id: The id of the upload
+        :raises ResourceNotFound: The upload does not exist, or was completed or aborted
+        :raises ExternalServiceException: Unexpected error occurs in S3
+        :raises PermissionException: Assumed role does not have permission to upload files
+        """
+        try:
+            self._client.abort_multipart_upload(Bucket=self.name, Key=key, UploadId=upload_id)
+        except ClientError as err:
+            self._raise_client_error(
+                err, "abort multipart upload", str({"Key": key, "UploadId": upload_id})
+            )
+
+    def put_object(self, key: str, body: bytes) -> None:
+        """
+        Uploads an object directly, replacing any object with the same key. Only suitable
+        for small objects, which are written by the service rather than uploaded by users
+
+        :param key: The key of the object to upload
+        :param body: The contents of the object
+        :raises ExternalServiceException: Unexpected error occurs in S3
+        :raises PermissionException: Assumed role does not have permission to upload files
+        """
+        try:
+            self._client.put_object(Bucket=self.name, Key=key, Body=body)
+        except ClientError as err:
+            self._raise_client_error(err, "put", str({"Key": key}))
+
+    def get_object(self, key: str) -> bytes:
+        """
+        Downloads the contents of an object
+
+        :param key: The key of the object to download
+        :return: The contents of the object
+        :raises ResourceNotFound: The object does not exist
+        :raises ExternalServiceException: Unexpected error occurs in S3
+        :raises PermissionException: Assumed role does not have permission to read files
+        """
+        try:
+            response = self._client.get_object(Bucket=self.name, Key=key)
+        except ClientError as err:
+            if err.response["Error"]["Code"] == "NoSuchKey":
+                logger.exception(err)
+                raise ResourceNotFound(resource_type="file", resource_id=key) from err
+            self._raise_client_error(err, "get", str({"Key": key}))
+        return response["Body"].read()
@@ -3,6 +3,8 @@ Main lambda handler for all API Gateway events
 """
 
 from http import HTTPStatus
+from importlib import import_module
+from time import perf_counter
 
 from aws_lambda_powertools import Logger
 from aws_lambda_powertools.event_handler import APIGatewayRestResolver, Response, content_types
@@ -16,23 +18,62 @@ from aws_lambda_powertools.utilities.typing import LambdaContext
 from pydantic import ValidationError
 
 from .exceptions import HTTPError
-from .routes.protected import documents, site, site_visits, user_requests, users
-from .routes.unprotected import auth
 from .util import CORS_HEADERS
 
+SWAGGER_PATH = "/unprotected/swagger"
+
+ROUTERS: dict[str, str] = {
+    "/protected/site": ".routes.protected.site_visits",
+    "/protected/site-management": ".routes.protected.site",
+    "/protected/users": ".routes.protected.users",
+    "/protected/documents": ".routes.protected.documents",
+    "/protected/user-requests": ".routes.protected.user_requests",
+    "/unprotected/auth": ".routes.unprotected.auth",
+}
+# Maps the prefix of each router to the module defining it. Routers (along with the services
+# and models they depend on) are only imported once a request for their prefix comes in, so
+# a lambda only pays for importing the routes it actually serves.
+
+STARTUP_REPORT: dict[str, float] = {}
+# Time taken in seconds to import and include each router that has been loaded (and to set up
+# the swagger docs), used to track cold start regressions
+
 logger = Logger()
 app = APIGatewayRestResolver(enable_validation=True)
-app.enable_swagger(
-    path="/unprotected/swagger",
-    title="SyncMaster API Docs",
-    security_schemes={"bearer": HTTPBearer(bearerFormat="JWT")},
-)
-app.include_router(router=site_visits.router, prefix="/protected/site")
-app.include_router(router=site.router, prefix="/protected/site-management")
-app.include_router(router=users.router, prefix="/protected/users")
-app.include_router(router=documents.router, prefix="/protected/documents")
-app.include_router(router=user_requests.router, prefix="/protected/user-requests")
-app.include_router(router=auth.router, prefix="/unprotected/auth")
+
+
+def load_routers(path: str) -> None:
+    """
+    Includes the routers needed to serve the given path in the app, if they have not
+    already been included. Requests for the swagger docs include every router, as well as
+    the swagger route itself.
+
+    :param path: The path of the incoming request
+    """
+    is_swagger = path == SWAGGER_PATH
+    for prefix, module_name in ROUTERS.items():
+        if module_name in STARTUP_REPORT:
+            continue
+        if not (is_swagger or path == prefix or path.startswith(f"{prefix}/")):
+            continue
+
+        start = perf_counter()
+        module = import_module(module_name, package=__package__)
+        app.include_router(router=module.router, prefix=prefix)
+        STARTUP_REPORT[module_name] = perf_counter() - start
+        logger.info(
+            f"Loaded router [{module_name}] for prefix [{prefix}]",
+            extra={"startup_report": STARTUP_REPORT},
+        )
+
+    if is_swagger and SWAGGER_PATH not in STARTUP_REPORT:
+        start = perf_counter()
+        app.enable_swagger(
+            path=SWAGGER_PATH,
+            title="SyncMaster API Docs",
+            security_schemes={"bearer": HTTPBearer(bearerFormat="JWT")},
+        )
+        STARTUP_REPORT[SWAGGER_PATH] = perf_counter() - start
 
 
 @app.exception_handler(Exception)
@@ -70,4 +111,5 @@ def lambda_handler(event: dict, context: LambdaContext) -> dict:
     :param context: The lambda context coming from AWS.
     :return: The response determined be the application.
     """
+    load_routers(event.get("path", ""))
     return app.resolve(event, context)
@@ -0,0 +1,58 @@
+"""
+Module for calculating distances between positions on the Earth, used to check positions
+against the geofences of sites
+"""
+
+from math import asin, cos, radians, sin, sqrt
+from typing import Sequence
+
+EARTH_RADIUS_METERS = 6371000
+# Mean radius of the Earth, used to convert between angles and distances
+
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Calculate the great circle distance between two points on Earth in meters.
+
+    :param lat1: latitude for location 1
+    :param lon1: longitude for location 1
+    :param lat2: latititude for location 2
+    :param lon2: longitude for location 2
+    :return: the distance between two locations in meters
+    """
+    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
+    c = 2 * asin(sqrt(a))
+    distance = EARTH_RADIUS_METERS * c
+    return distance
+
+
+def haversine_many(
+    positions: Sequence[tuple[float, float]], centres: Sequence[tuple[float, float]]
+) -> list[list[float]]:
+    """
+    Calculate the great circle distances between each of a batch of positions and each of a
+    set of centres in one pass. The trigonometry of each position and each centre is worked
+    out once, rather than once for every pair as with haversine.
+
+    :param positions: the latitude and longitude of each position in degrees
+    :param centres: the latitude and longitude of each centre in degrees
+    :return: for each position, the distance in meters to each centre, in the given orders
+    """
+    centre_terms = [
+        (radians(latitude), radians(longitude), cos(radians(latitude)))
+        for latitude, longitude in centres
+    ]
+    distances = []
+    for latitude, longitude in positions:
+        lat, lon = radians(latitude), radians(longitude)
+        cos_lat = cos(lat)
+        terms = (
+            sin((centre_lat - lat) / 2) ** 2
+            + cos_lat * cos_centre_lat * sin((centre_lon - lon) / 2) ** 2
+            for centre_lat, centre_lon, cos_centre_lat in centre_terms
+        )
+        distances.append([2 * EARTH_RADIUS_METERS * asin(sqrt(min(term, 1.0))) for term in terms])
+    return distances
@@ -0,0 +1,364 @@
+"""
+Module providing a spatial index of sites, so that the sites near a position can be found
+without checking every site
+"""
+
+from math import cos, floor, pi, radians
+from threading import Lock
+from time import monotonic
+from typing import Iterable, Optional, Sequence
+
+from boto3.dynamodb.conditions import Key
+
+from ..database.db_table import DBTable
+from ..models.db.site import DBSite
+from ..util import ItemType
+from .geofence import EARTH_RADIUS_METERS, haversine, haversine_many
+
+SITE_INDEX_CELL_DEGREES = 0.1
+# Size of each cell of the index in degrees, roughly 11km of latitude
+
+SITE_INDEX_TTL_SECONDS = 300
+# Time the index is used before it is rebuilt, to pick up changes made by other processes
+
+METERS_PER_DEGREE = EARTH_RADIUS_METERS * pi / 180
+# Distance covered by one degree of latitude, or of longitude at the equator
+
+type Cell = tuple[int, int]
+
+
+def _centres(sites: Iterable[DBSite]) -> list[tuple[float, float]]:
+    """
+    The centres of sites, as used to calculate distances
+
+    :param sites: The sites to get the centres of
+    :return: the latitude and longitude of the centre of each site in degrees, in order
+    """
+    return [(float(site.latitude), float(site.longitude)) for site in sites]
+
+
+class SiteIndex:
+    """
+    A grid over the surface of the Earth, with each site placed in the cell containing its
+    centre. Queries only check the sites in the cells overlapping the area of interest.
+    """
+
+    def __init__(
+        self, sites: Iterable[DBSite] = (), cell_degrees: float = SITE_INDEX_CELL_DEGREES
+    ):
+        """
+        Build an index of the given sites
+
+        :param sites: The sites to index
+        :param cell_degrees: The size of each cell of the index in degrees
+        """
+        self.cell_degrees = cell_degrees
+        self._lon_cells = round(360 / cell_degrees)
+        self._cells: dict[Cell, dict[str, DBSite]] = {}
+        self._sites: dict[str, DBSite] = {}
+        self._max_range = 0.0
+        self._lock = Lock()
+        for site in sites:
+            self.add(site)
+
+    def __len__(self) -> int:
+        return len(self._sites)
+
+    def _cell(self, latitude: float, longitude: float) -> Cell:
+        """
+        Find the cell containing a position
+
+        :param latitude: latitude of the position in degrees
+        :param longitude: longitude of the position in degrees
+        :return: the row and column of the cell
+        """
+        return (
+            floor(latitude / self.cell_degrees),
+            floor((longitude + 180) / self.cell_degrees) % self._lon_cells,
+        )
+
+    def add(self, site: DBSite) -> None:
+        """
+        Add a site to the index, replacing any previous version of the site
+
+        :param site: The site to add
+        """
+        with self._lock:
+            self._remove(site.site_id)
+            cell = self._cell(float(site.latitude), float(site.longitude))
+            self._cells.setdefault(cell, {})[site.site_id] = site
+            self._sites[site.site_id] = site
+            self._max_range = max(self._max_range, float(site.acceptable_range))
+
+    def remove(self, site_id: str) -> None:
+        """
+        Remove a site from the index, if it is in the index
+
+        :param site_id: The unique identifier of the site to remove
+        """
+        with self._lock:
+            self._remove(site_id)
+
+    def _remove(self, site_id: str) -> None:
+        """
+        Remove a site from the index, the lock must be held by the caller
+
+        :param site_id: The unique identifier of the site to remove
+        """
+        site = self._sites.pop(site_id, None)
+        if site is None:
+            return
+        cell = self._cell(float(site.latitude), float(site.longitude))
+        self._cells[cell].pop(site_id)
+        if not self._cells[cell]:
+            del self._cells[cell]
+        if float(site.acceptable_range) >= self._max_range:
+            self._max_range = max(
+                (float(other.acceptable_range) for other in self._sites.values()), default=0.0
+            )
+
+    def _candidates(self, latitude: float, longitude: float, radius: float) -> list[DBSite]:
+        """
+        Get the sites in every cell overlapping a circle around a position
+
+        :param latitude: latitude of the centre of the circle in degrees
+        :param longitude: longitude of the centre of the circle in degrees
+        :param radius: radius of the circle in meters
+        :return: the sites that may be within the circle
+        """
+        lat_span = radius / METERS_PER_DEGREE
+        min_row = floor(max(latitude - lat_span, -90) / self.cell_degrees)
+        max_row = floor(min(latitude + lat_span, 90) / self.cell_degrees)
+
+        # Cells get narrower towards the poles, so the widest row of the circle is used
+        min_cos = cos(radians(min(abs(latitude) + lat_span, 90)))
+        lon_span = radius / (METERS_PER_DEGREE * min_cos) if min_cos > 0 else 360
+        if lon_span >= 180:
+            columns = range(self._lon_cells)
+        else:
+            first = floor((longitude - lon_span + 180) / self.cell_degrees)
+            last = floor((longitude + lon_span + 180) / self.cell_degrees)
+            columns = range(first, min(last, first + self._lon_cells - 1) + 1)
+
+        rows = range(min_row, max_row + 1)
+        with self._lock:
+            if len(rows) * len(columns) >= len(self._cells):
+                # Looking up every cell in the area would take longer than checking every site
+                return list(self._sites.values())
+            return [
+                site
+                for row in rows
+                for column in columns
+                for site in self._cells.get((row, column % self._lon_cells), {}).values()
+            ]
+
+    def near(self, latitude: float, longitude: float, radius: float) -> list[tuple[DBSite, float]]:
+        """
+        Find the sites whose centre is within a distance of a position
+
+        :param latitude: latitude of the position in degrees
+        :param longitude: longitude of the position in degrees
+        :param radius: the distance from the position in meters
+        :return: the sites and their distance from the position in meters, nearest first
+        """
+        sites = []
+        for site in self._candidates(latitude, longitude, radius):
+            distance = haversine(latitude, longitude, float(site.latitude), float(site.longitude))
+            if distance <= radius:
+                sites.append((site, distance))
+        return sorted(sites, key=lambda site: site[1])
+
+    def within_range(self, latitude: float, longitude: float, accuracy: float) -> list[DBSite]:
+        """
+        Find every site that a position is within range of
+
+        :param latitude: latitude of the position in degrees
+        :param longitude: longitude of the position in degrees
+        :param accuracy: accuracy of the position in meters
+        :return: the sites in range of the position, nearest first
+        """
+        return [
+            site
+            for site, distance in self.near(latitude, longitude, self._max_range + accuracy)
+            if distance <= float(site.acceptable_range) + accuracy
+        ]
+
+    def nearest(self, latitude: float, longitude: float) -> Optional[tuple[DBSite, float]]:
+        """
+        Find the site whose centre is closest to a position, searching outwards from the
+        cell containing the position until a site is found
+
+        :param latitude: latitude of the position in degrees
+        :param longitude: longitude of the position in degrees
+        :return: the nearest site and its distance in meters, or None if there are no sites
+        """
+        if not self._sites:
+            return None
+
+        found = self._ring_sites(self._cell(latitude, longitude))
+        # A site in a later ring may still be closer than the sites found, so every
+        # site within the distance of the closest found site is checked
+        closest = min(
+            (
+                (site, haversine(latitude, longitude, float(site.latitude), float(site.longitude)))
+                for site in found
+            ),
+            key=lambda site: site[1],
+        )
+        nearer = self.near(latitude, longitude, closest[1])
+        return nearer[0] if nearer else closest
+
+    def _ring_sites(self, cell: Cell) -> list[DBSite]:
+        """
+        Find the sites in the nearest ring of cells around a cell that contains any sites.
+        The index must not be empty.
+
+        :param cell: the cell to search outwards from
+        :return: the sites in the first ring of cells with sites, or every site if the ring
+            is larger than the index
+        """
+        row, column = cell
+        found: list[DBSite] = []
+        ring = 0
+        with self._lock:
+            while not found:
+                if (2 * ring + 1) ** 2 >= len(self._cells):
+                    # Searching the ring would take longer than checking every site
+                    return list(self._sites.values())
+                found = [
+                    site
+                    for ring_row in range(row - ring, row + ring + 1)
+                    for ring_column in range(column - ring, column + ring + 1)
+                    if max(abs(ring_row - row), abs(ring_column - column)) == ring
+                    for site in self._cells.get(
+                        (ring_row, ring_column % self._lon_cells), {}
+                    ).values()
+                ]
+                ring += 1
+        return found
+
+    def _group_by_cell(self, positions: Sequence[tuple[float, ...]]) -> dict[Cell, list[int]]:
+        """
+        Group a batch of positions by the cell containing them
+
+        :param positions: the latitude and longitude of each position in degrees, followed by
+            any other values of the position
+        :return: the indices of the positions in each cell
+        """
+        cells: dict[Cell, list[int]] = {}
+        for i, (latitude, longitude, *_) in enumerate(positions):
+            cells.setdefault(self._cell(latitude, longitude), []).append(i)
+        return cells
+
+    def within_range_many(
+        self, positions: Iterable[tuple[float, float, float]]
+    ) -> list[list[DBSite]]:
+        """
+        Find every site in range of each of a batch of positions. Positions in the same cell
+        share their candidate sites, and the distances between them are calculated in a
+        single pass.
+
+        :param positions: the latitude, longitude and accuracy of each position
+        :return: the sites in range of each position, nearest first, in the order of the
+            positions
+        """
+        batch = list(positions)
+        results: list[list[DBSite]] = [[] for _ in batch]
+        for indices in self._group_by_cell(batch).values():
+            candidates: dict[str, DBSite] = {}
+            for i in indices:
+                latitude, longitude, accuracy = batch[i]
+                for site in self._candidates(latitude, longitude, self._max_range + accuracy):
+                    candidates[site.site_id] = site
+            sites = list(candidates.values())
+            group = [batch[i][:2] for i in indices]
+            for i, distances in zip(indices, haversine_many(group, _centres(sites))):
+                accuracy = batch[i][2]
+                in_range = [
+                    (site, distance)
+                    for site, distance in zip(sites, distances)
+                    if distance <= float(site.acceptable_range) + accuracy
+                ]
+                results[i] = [site for site, _ in sorted(in_range, key=lambda site: site[1])]
+        return results
+
+    def nearest_many(
+        self, positions: Iterable[tuple[float, float]]
+    ) -> list[Optional[tuple[DBSite, float]]]:
+        """
+        Find the site whose centre is closest to each of a batch of positions. Positions in
+        the same cell share the search outwards from the cell, and their distances to the
+        sites it finds are calculated in a single pass.
+
+        :param positions: the latitude and longitude of each position in degrees
+        :return: the nearest site and its distance in meters for each position, or None if
+            there are no sites, in the order of the positions
+        """
+        batch = list(positions)
+        results: list[Optional[tuple[DBSite, float]]] = [None for _ in batch]
+        if not self._sites:
+            return results
+
+        for cell, indices in self._group_by_cell(batch).items():
+            found = self._ring_sites(cell)
+            group = [batch[i] for i in indices]
+            for i, distances in zip(indices, haversine_many(group, _centres(found))):
+                closest = min(zip(found, distances), key=lambda site: site[1])
+                # A site in a later ring may still be closer than the sites found
+                nearer = self.near(*batch[i], closest[1])
+                results[i] = nearer[0] if nearer else closest
+        return results
+
+
+_site_index: Optional[SiteIndex] = None
+_site_index_built_at = 0.0
+_site_index_lock = Lock()
+
+
+def get_site_index(table: DBTable[DBSite]) -> SiteIndex:
+    """
+    Get the index of every site, building it from the database if it has not been built by
+    this process, or was built too long ago to include changes made by other processes
+
+    :param table: The table to read the sites from
+    :return: The index of every site
+    :raises ExternalServiceException: An unexpected error occurs in AWS
+    """
+    global _site_index, _site_index_built_at  # pylint: disable=global-statement
+    with _site_index_lock:
+        if _site_index is None or monotonic() - _site_index_built_at >= SITE_INDEX_TTL_SECONDS:
+            key_condition = Key("pk").eq(ItemType.SITE.value)
+            _site_index = SiteIndex(table.iter_query(key_condition_expression=key_condition))
+            _site_index_built_at = monotonic()
+        return _site_index
+
+
+def index_site(site: DBSite) -> None:
+    """
+    Add or replace a site in the index, if the index has been built by this process
+
+    :param site: The site that was created or updated
+    """
+    with _site_index_lock:
+        if _site_index is not None:
+            _site_index.add(site)
+
+
+def unindex_site(site_id: str) -> None:
+    """
+    Remove a site from the index, if the index has been built by this process
+
+    :param site_id: The unique identifier of the site that was deleted
+    """
+    with _site_index_lock:
+        if _site_index is not None:
+            _site_index.remove(site_id)
+
+
+def clear_site_index() -> None:
+    """
+    Remove the index, so that it is rebuilt on next use
+    """
+    global _site_index  # pylint: disable=global-statement
+    with _site_index_lock:
+        _site_index = None
@@ -50,3 +50,34 @@ class APIExpiringDocumentResponse(CustomBaseModel):
 
     documents: list[APIDocumentResponse]
     last_key: Optional[str] = None
+
+
+class APIDocumentDeleteProgress(CustomBaseModel):
+    """The progress of a folder delete that needs to be resumed to complete"""
+
+    deleted_documents: int
+    resume_token: str
+
+
+class APIDocumentTreeNode(CustomBaseModel):
+    """A document in the document tree of a site, as represented in the API"""
+
+    document_id: str
+    document_name: str
+    document_type: FileType
+    parent_folder_id: str
+    tree_path: str
+
+
+class APIDocumentTreeIndexResponse(CustomBaseModel):
+    """The number of documents added to the document tree of a site by a backfill"""
+
+    indexed_documents: int
+
+
+class APIDocumentTreeResponse(CustomBaseModel):
+    """All the documents under a folder, with the number of files and folders among them"""
+
+    documents: list[APIDocumentTreeNode]
+    file_count: int
+    folder_count: int
@@ -2,14 +2,19 @@
 Representations of file attachments in the API
 """
 
+from typing import Optional
+
 from ..custom_base_model import CustomBaseModel
 
 
 class APIFileAttachmentResponse(CustomBaseModel):
-    """Format of a file attachment in an API response"""
+    """
+    Format of a file attachment in an API response, the url is left out of responses
+    which were asked not to sign urls
+    """
 
     name: str
-    url: str
+    url: Optional[str] = None
 
 
 class APIAddFileAttachment(CustomBaseModel):
@@ -32,3 +32,15 @@ class APIListSitesResponse(CustomBaseModel):
 
     sites: list[APISite]
     last_key: Optional[str] = None
+
+
+class APINearbySite(APISite):
+    """A site near a position, as represented in the nearby sites API"""
+
+    distance: float  # Distance from the position to the centre of the site in meters
+
+
+class APINearbySitesResponse(CustomBaseModel):
+    """A list of sites near a position, nearest first"""
+
+    sites: list[APINearbySite]
@@ -2,12 +2,13 @@
 Defines structure of a site visit in the API
 """
 
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 
 from pydantic import Field, model_validator
 from typing_extensions import Self
 
+from ...util import ExportFormat, ExportStatus
 from ..custom_base_model import CustomBaseModel
 from .file_attachment import APIFileAttachmentResponse
 
@@ -60,3 +61,68 @@ class APIListSiteVisitResponse(CustomBaseModel):
 
     visits: list[APISiteVisit]
     last_key: Optional[str] = None
+
+
+class APISiteOccupant(CustomBaseModel):
+    """A user currently on a site, as represented in the API"""
+
+    site_id: str
+    user_id: str
+    user_email: str
+    entry_time: datetime
+    on_site: Optional[bool] = None
+    employee_id: Optional[str] = None
+
+
+class APIListSiteOccupantsResponse(CustomBaseModel):
+    """The users currently on a site, as represented in the list site occupants API"""
+
+    occupants: list[APISiteOccupant]
+
+
+class APILatestSiteVisit(CustomBaseModel):
+    """
+    The latest site visit of a user, without its editable details and attachments, as
+    represented in the API
+    """
+
+    site_id: str
+    user_id: str
+    user_email: str
+    entry_time: datetime
+    allowed_tracking: bool
+    ack_status: bool
+    exit_time: Optional[datetime] = None
+    on_site: Optional[bool] = None
+    employee_id: Optional[str] = None
+
+
+class APISiteVisitStats(CustomBaseModel):
+    """Statistics of the visits to a site entered on a single day"""
+
+    site_id: str
+    day: date
+    visits: int
+    exited_visits: int
+    ack_rate: float
+    on_site_rate: Optional[float] = None
+    mean_dwell_seconds: Optional[float] = None
+    p50_dwell_seconds: Optional[float] = None
+    p90_dwell_seconds: Optional[float] = None
+    p99_dwell_seconds: Optional[float] = None
+
+
+class APISiteVisitStatsResponse(CustomBaseModel):
+    """The statistics of site visits, grouped by site and day of entry"""
+
+    stats: list[APISiteVisitStats]
+
+
+class APIVisitExport(CustomBaseModel):
+    """An export of site visits to a file, as represented in the API"""
+
+    export_id: str
+    export_format: ExportFormat
+    status: ExportStatus
+    visits_exported: int
+    url: Optional[str] = None
@@ -3,8 +3,10 @@ Defines a customized model configuration for this project
 """
 
 from datetime import datetime
+from functools import cache
+from typing import Iterable, Type
 
-from pydantic import BaseModel
+from pydantic import BaseModel, create_model
 from pydantic.config import ConfigDict
 
 
@@ -34,3 +36,30 @@ class CustomBaseModel(BaseModel):
         return super().model_dump_json(
             *args, exclude_none=exclude_none, by_alias=by_alias, **kwargs
         )
+
+
+@cache
+def _partial_model(model: Type[CustomBaseModel], fields: frozenset[str]) -> Type[CustomBaseModel]:
+    return create_model(
+        f"Partial{model.__name__}",
+        __base__=CustomBaseModel,
+        **{
+            name: (field.annotation, field)
+            for name, field in model.model_fields.items()
+            if name in fields
+        },
+    )
+
+
+def partial_model(model: Type[CustomBaseModel], fields: Iterable[str]) -> Type[CustomBaseModel]:
+    """
+    A model containing only the given fields of another model, with the same types and
+    defaults. Used as a projection to only read some attributes of items in the database,
+    and to only give some fields of items in a response. Models are created once for each
+    set of fields.
+
+    :param model: The model to take the fields from
+    :param fields: The names of the fields to keep
+    :return: The partial model
+    """
+    return _partial_model(model, frozenset(fields))
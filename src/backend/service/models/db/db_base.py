@@ -43,3 +43,13 @@ class DBItemModel(CustomBaseModel, ABC):
     def type(self) -> ItemType:
         """A computed field containing the schemas item type"""
         return self.item_type()
+
+
+class DBItemKey(CustomBaseModel):
+    """
+    A partial model of any database item containing only its key, useful when only
+    the existence of an item is of interest
+    """
+
+    pk: str
+    sk: str
@@ -3,14 +3,26 @@ Defines the model for a document as represented in the database
 """
 
 from datetime import datetime
-from typing import Optional
+from enum import Enum
+from typing import Any, Optional, Type
 
 from pydantic import computed_field
 
 from ...util import FileType, ItemType
-from ..api.document import APIDocumentResponse
+from ..api.document import APIDocumentResponse, APIDocumentTreeNode
+from ..custom_base_model import CustomBaseModel, partial_model
 from .db_base import DBItemModel
 
+DOCUMENT_API_ATTRIBUTES = {
+    "last_modified": "last_modified_time",
+    "document_expiry": "expiry_date",
+}
+# The attribute of a document in the database giving each field of the API model that is
+# named differently
+
+DOCUMENT_URL_ATTRIBUTES = ("document_type", "s3_key", "document_name")
+# The attributes of a document in the database needed to sign a url to get the file
+
 
 class DBDocument(DBItemModel):
     """Model representing a document in the database"""
@@ -65,3 +77,102 @@ class DBDocument(DBItemModel):
             document_expiry=self.expiry_date,
             parent_folder_id=self.parent_folder_id,
         )
+
+    @staticmethod
+    def api_projection(fields: set[str]) -> Type[CustomBaseModel]:
+        """
+        The partial model of a document read from the database to give only some fields of
+        its API model. The attributes needed to sign a url are only read when the url is
+        given.
+
+        :param fields: The fields of the API model to give
+        :return: The partial model of the document
+        """
+        attributes = {
+            DOCUMENT_API_ATTRIBUTES.get(field, field)
+            for field in fields
+            if field != "s3_presigned_get"
+        }
+        if "s3_presigned_get" in fields:
+            attributes.update(DOCUMENT_URL_ATTRIBUTES)
+        return partial_model(DBDocument, attributes)
+
+    @staticmethod
+    def to_partial_api_model(
+        document: Any, fields: set[str], s3_link: Optional[str] = None
+    ) -> CustomBaseModel:
+        """
+        Only some fields of a document as an API model
+
+        :param document: The document, or a partial model of it read with api_projection
+        :param fields: The fields of the API model to give
+        :param s3_link: The s3 presigned url
+        :return: A partial representation of the document for the API
+        """
+        values = {
+            field: getattr(document, DOCUMENT_API_ATTRIBUTES.get(field, field))
+            for field in fields
+            if field != "s3_presigned_get"
+        }
+        if "s3_presigned_get" in fields:
+            values["s3_presigned_get"] = s3_link
+        return partial_model(APIDocumentResponse, fields)(**values)
+
+
+class DBDocumentName(CustomBaseModel):
+    """Partial model of a document in the database, containing only its name"""
+
+    document_name: str
+
+
+class TreeIndex(Enum):
+    """
+    Enum of the ways a document is indexed in the document tree
+    """
+
+    PATH = "path"
+    ID = "id"
+
+
+class DBDocumentTreeNode(DBItemModel):
+    """
+    Model representing a document in the materialised document tree of a site. Every document
+    has a node indexed by its path, so a subtree can be listed with a single query, and a node
+    indexed by its id, so the path of a folder can be found when adding documents to it
+    """
+
+    site_id: str
+    document_id: str
+    document_name: str
+    document_type: FileType
+    parent_folder_id: str
+    tree_path: str  # The escaped names of the document and its parent folders, joined by "/"
+    indexed_by: TreeIndex
+
+    @staticmethod
+    def item_type() -> ItemType:
+        return ItemType.DOCUMENT_TREE
+
+    @computed_field
+    @property
+    def pk(self) -> str:
+        return f"{self.item_type().value}#{self.site_id}"
+
+    @computed_field
+    @property
+    def sk(self) -> str:
+        if self.indexed_by == TreeIndex.ID.value:
+            return f"{TreeIndex.ID.value}#{self.document_id}"
+        return f"{TreeIndex.PATH.value}#{self.tree_path}"
+
+    def to_api_model(self) -> APIDocumentTreeNode:
+        """
+        The document tree node as an API model, without the DB specific attributes
+        """
+        return APIDocumentTreeNode(
+            document_id=self.document_id,
+            document_name=self.document_name,
+            document_type=self.document_type,
+            parent_folder_id=self.parent_folder_id,
+            tree_path=self.tree_path,
+        )
@@ -3,11 +3,13 @@ Defines structure of a site in the DB
 """
 
 from decimal import Decimal
+from typing import Any, Type
 
 from pydantic import computed_field
 
 from ...util import ItemType
 from ..api.site import APISite
+from ..custom_base_model import CustomBaseModel, partial_model
 from .db_base import DBItemModel
 
 
@@ -41,3 +43,25 @@ class DBSite(DBItemModel):
             latitude=self.latitude,
             acceptable_range=self.acceptable_range,
         )
+
+    @staticmethod
+    def api_projection(fields: set[str]) -> Type[CustomBaseModel]:
+        """
+        The partial model of a site read from the database to give only some fields of
+        its API model
+
+        :param fields: The fields of the API model to give
+        :return: The partial model of the site
+        """
+        return partial_model(DBSite, fields)
+
+    @staticmethod
+    def to_partial_api_model(site: Any, fields: set[str]) -> CustomBaseModel:
+        """
+        Only some fields of a site as an API model
+
+        :param site: The site, or a partial model of it read with api_projection
+        :param fields: The fields of the API model to give
+        :return: A partial representation of the site for the API
+        """
+        return partial_model(APISite, fields).model_validate(site, from_attributes=True)
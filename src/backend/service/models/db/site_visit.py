@@ -2,17 +2,41 @@
 Defines the model for a site visit as represented in the database
 """
 
-from datetime import datetime
-from typing import Optional
+from datetime import date, datetime
+from typing import Any, Iterator, Optional, Type
 
 from pydantic import Field, computed_field
 
 from ...file_storage.s3_bucket import S3Bucket
-from ...util import ItemType
+from ...util import ExportFormat, ExportStatus, ItemType
 from ..api.file_attachment import APIFileAttachmentResponse
-from ..api.site_visit import APISiteVisit
+from ..api.site_visit import (
+    APILatestSiteVisit,
+    APISiteOccupant,
+    APISiteVisit,
+    APISiteVisitStats,
+    APIVisitExport,
+)
+from ..custom_base_model import CustomBaseModel, partial_model
 from .db_base import DBItemModel
 
+VISIT_API_ATTRIBUTES = {"allowed_tracking": "loc_tracking"}
+# The attribute of a site visit in the database giving each field of the API model that is
+# named differently
+
+
+def _attachment_urls(visits: list[Any], bucket: Optional[S3Bucket]) -> Iterator[Optional[str]]:
+    """
+    Signs the urls of the attachments of many site visits together
+
+    :param visits: The site visits, with their attachments
+    :param bucket: The bucket to use when creating the presigned urls, if not given no
+        urls are signed
+    :return: The url of each attachment, in order of visit then attachment
+    """
+    objects = [(visit.attachments[name], name) for visit in visits for name in visit.attachments]
+    return iter(bucket.create_get_urls(objects) if bucket else [None] * len(objects))
+
 
 class DBSiteVisit(DBItemModel):
     """Model representing a site visit in the database"""
@@ -44,6 +68,18 @@ class DBSiteVisit(DBItemModel):
     def sk(self) -> str:
         return self.entry_time.isoformat()
 
+    @computed_field
+    @property
+    def visit_site_id(self) -> str:
+        """The hash key of the index of visits by site, only set on site visits"""
+        return self.site_id
+
+    @computed_field
+    @property
+    def visit_user_id(self) -> str:
+        """The hash key of the index of visits by user, only set on site visits"""
+        return self.user_id
+
     def to_api_model(self, bucket: S3Bucket) -> APISiteVisit:
         """
         The site visit as an API model, without the DB specific attributes
@@ -51,17 +87,220 @@ class DBSiteVisit(DBItemModel):
         :param bucket: The bucket to use when creating the presigned url
         :return: A representation of the site visits for the API
         """
-        attachments = []
+        return self.to_api_models([self], bucket)[0]
+
+    @staticmethod
+    def to_api_models(
+        visits: list["DBSiteVisit"], bucket: Optional[S3Bucket]
+    ) -> list[APISiteVisit]:
+        """
+        Many site visits as API models, with the urls of the attachments of every visit
+        signed together, rather than visit by visit
+
+        :param visits: The site visits to convert
+        :param bucket: The bucket to use when creating the presigned urls, if not given
+            attachments are listed without urls
+        :return: A representation of each site visit for the API, in the same order
+        """
         # pylint thinks I'm trying to access an instance of `Field` here
         # even though it's a dictionary
         # pylint: disable=no-member
-        for name, s3_key in self.attachments.items():
-            attachments.append(
-                APIFileAttachmentResponse(
-                    name=name, url=bucket.create_get_url(key=s3_key, original_filename=name)
-                )
+        urls = _attachment_urls(visits, bucket)
+        return [
+            APISiteVisit(
+                site_id=visit.site_id,
+                user_id=visit.user_id,
+                user_email=visit.user_email,
+                entry_time=visit.entry_time,
+                allowed_tracking=visit.loc_tracking,
+                ack_status=visit.ack_status,
+                exit_time=visit.exit_time,
+                work_order=visit.work_order,
+                description=visit.description,
+                on_site=visit.on_site,
+                employee_id=visit.employee_id,
+                attachments=[
+                    APIFileAttachmentResponse(name=name, url=next(urls))
+                    for name in visit.attachments
+                ],
             )
-        return APISiteVisit(
+            for visit in visits
+        ]
+
+    @staticmethod
+    def api_projection(fields: set[str]) -> Type[CustomBaseModel]:
+        """
+        The partial model of a site visit read from the database to give only some fields
+        of its API model
+
+        :param fields: The fields of the API model to give
+        :return: The partial model of the site visit
+        """
+        return partial_model(
+            DBSiteVisit, {VISIT_API_ATTRIBUTES.get(field, field) for field in fields}
+        )
+
+    @staticmethod
+    def to_partial_api_models(
+        visits: list[Any], fields: set[str], bucket: Optional[S3Bucket]
+    ) -> list[CustomBaseModel]:
+        """
+        Only some fields of many site visits as API models. Attachments are only signed
+        when they are given.
+
+        :param visits: The site visits, or partial models of them read with api_projection
+        :param fields: The fields of the API model to give
+        :param bucket: The bucket to use when creating the presigned urls, if not given
+            attachments are listed without urls
+        :return: A partial representation of each site visit for the API, in the same order
+        """
+        model = partial_model(APISiteVisit, fields)
+        with_attachments = "attachments" in fields
+        urls = _attachment_urls(visits if with_attachments else [], bucket)
+        api_visits = []
+        for visit in visits:
+            values = {
+                field: getattr(visit, VISIT_API_ATTRIBUTES.get(field, field))
+                for field in fields
+                if field != "attachments"
+            }
+            if with_attachments:
+                values["attachments"] = [
+                    APIFileAttachmentResponse(name=name, url=next(urls))
+                    for name in visit.attachments
+                ]
+            api_visits.append(model(**values))
+        return api_visits
+
+
+class DBSiteVisitSummary(CustomBaseModel):
+    """
+    Partial model of a site visit in the database, containing only the attributes needed
+    to compute statistics over many visits
+    """
+
+    site_id: str
+    entry_time: datetime
+    ack_status: bool
+    exit_time: Optional[datetime] = None
+    on_site: Optional[bool] = None
+
+
+class DBSiteOccupant(DBItemModel):
+    """
+    Model representing a site visit that has not been exited. Occupants of a site share a
+    partition, so everyone on a site can be found with a single query, without reading the
+    history of visits to the site
+    """
+
+    site_id: str
+    user_id: str
+    user_email: str
+    entry_time: datetime
+    on_site: Optional[bool] = None
+    employee_id: Optional[str] = None
+
+    @staticmethod
+    def item_type() -> ItemType:
+        return ItemType.SITE_OCCUPANT
+
+    @computed_field
+    @property
+    def pk(self) -> str:
+        return f"{self.item_type().value}#{self.site_id}"
+
+    @computed_field
+    @property
+    def sk(self) -> str:
+        return f"{self.user_id}#{self.entry_time.isoformat()}"
+
+    @classmethod
+    def from_visit(cls, visit: DBSiteVisit) -> "DBSiteOccupant":
+        """
+        The occupant of a site, for a visit to the site that has not been exited
+
+        :param visit: The visit to the site
+        :return: The occupant of the site during the visit
+        """
+        return cls(
+            last_modified_by=visit.last_modified_by,
+            last_modified_time=visit.last_modified_time,
+            site_id=visit.site_id,
+            user_id=visit.user_id,
+            user_email=visit.user_email,
+            entry_time=visit.entry_time,
+            on_site=visit.on_site,
+            employee_id=visit.employee_id,
+        )
+
+    def to_api_model(self) -> APISiteOccupant:
+        """The occupant as an API model, without the DB specific attributes"""
+        return APISiteOccupant(
+            site_id=self.site_id,
+            user_id=self.user_id,
+            user_email=self.user_email,
+            entry_time=self.entry_time,
+            on_site=self.on_site,
+            employee_id=self.employee_id,
+        )
+
+
+class DBLatestSiteVisit(DBItemModel):
+    """
+    Model representing the latest site visit of a user, kept up to date as the user enters
+    and exits sites, so that it is found with a single read rather than a query of the
+    visits of the user
+    """
+
+    site_id: str
+    user_id: str
+    user_email: str
+    entry_time: datetime
+    loc_tracking: bool
+    ack_status: bool
+    exit_time: Optional[datetime] = None
+    on_site: Optional[bool] = None
+    employee_id: Optional[str] = None
+
+    @staticmethod
+    def item_type() -> ItemType:
+        return ItemType.LATEST_SITE_VISIT
+
+    @computed_field
+    @property
+    def pk(self) -> str:
+        return f"{self.item_type().value}#{self.user_id}"
+
+    @computed_field
+    @property
+    def sk(self) -> str:
+        return self.user_id
+
+    @classmethod
+    def from_visit(cls, visit: DBSiteVisit) -> "DBLatestSiteVisit":
+        """
+        The latest visit of a user, for the visit they most recently entered
+
+        :param visit: The visit most recently entered by the user
+        :return: The latest visit of the user
+        """
+        return cls(
+            last_modified_by=visit.last_modified_by,
+            last_modified_time=visit.last_modified_time,
+            site_id=visit.site_id,
+            user_id=visit.user_id,
+            user_email=visit.user_email,
+            entry_time=visit.entry_time,
+            loc_tracking=visit.loc_tracking,
+            ack_status=visit.ack_status,
+            exit_time=visit.exit_time,
+            on_site=visit.on_site,
+            employee_id=visit.employee_id,
+        )
+
+    def to_api_model(self) -> APILatestSiteVisit:
+        """The latest visit as an API model, without the DB specific attributes"""
+        return APILatestSiteVisit(
             site_id=self.site_id,
             user_id=self.user_id,
             user_email=self.user_email,
@@ -69,9 +308,115 @@ class DBSiteVisit(DBItemModel):
             allowed_tracking=self.loc_tracking,
             ack_status=self.ack_status,
             exit_time=self.exit_time,
-            work_order=self.work_order,
-            description=self.description,
             on_site=self.on_site,
             employee_id=self.employee_id,
-            attachments=attachments,
+        )
+
+
+class DBSiteVisitRollup(DBItemModel):
+    """
+    Model representing running totals of the visits to a site entered on a single day.
+    Totals are added to as visits are entered and exited, so statistics over a range of
+    days are read from one item per day rather than one item per visit
+    """
+
+    site_id: str
+    entry_date: date
+    visits: int = 0
+    exited_visits: int = 0
+    acknowledged_visits: int = 0
+    tracked_visits: int = 0
+    on_site_visits: int = 0
+    dwell_seconds: int = 0
+
+    @staticmethod
+    def item_type() -> ItemType:
+        return ItemType.SITE_VISIT_ROLLUP
+
+    @computed_field
+    @property
+    def pk(self) -> str:
+        return f"{self.item_type().value}#{self.site_id}"
+
+    @computed_field
+    @property
+    def sk(self) -> str:
+        return self.entry_date.isoformat()
+
+    def to_api_model(self) -> APISiteVisitStats:
+        """
+        The totals as statistics in the API, dwell time percentiles are not known from the
+        totals so are not given
+
+        :return: The statistics of the visits to the site on the day
+        """
+        return APISiteVisitStats(
+            site_id=self.site_id,
+            day=self.entry_date,
+            visits=self.visits,
+            exited_visits=self.exited_visits,
+            ack_rate=self.acknowledged_visits / self.visits if self.visits else 0.0,
+            on_site_rate=(
+                self.on_site_visits / self.tracked_visits if self.tracked_visits else None
+            ),
+            mean_dwell_seconds=(
+                self.dwell_seconds / self.exited_visits if self.exited_visits else None
+            ),
+        )
+
+
+class DBVisitExport(DBItemModel):
+    """
+    Model representing an export of site visits to a file in S3. The file is uploaded in
+    parts, and the export records the parts uploaded so far along with the key of the last
+    visit written, so that an export which runs out of time can be continued later. Visits
+    written since the last part are kept in a pending object until there are enough of
+    them for a part. An export is claimed by the invocation continuing it until the
+    invocation ends.
+    """
+
+    export_id: str
+    export_format: ExportFormat
+    status: ExportStatus
+    s3_key: str
+    upload_id: str
+    parts: list[str] = Field(default_factory=list)
+    last_key: Optional[dict[str, str]] = None
+    pending_size: int = 0
+    visits_exported: int = 0
+    from_time: Optional[datetime] = None
+    to_time: Optional[datetime] = None
+    site_id: Optional[str] = None
+    claimed_until: Optional[datetime] = None
+
+    @staticmethod
+    def item_type() -> ItemType:
+        return ItemType.VISIT_EXPORT
+
+    @computed_field
+    @property
+    def pk(self) -> str:
+        return self.item_type().value
+
+    @computed_field
+    @property
+    def sk(self) -> str:
+        return self.export_id
+
+    def to_api_model(self, bucket: S3Bucket) -> APIVisitExport:
+        """
+        The export as an API model, with a url to download the file once it is complete
+
+        :param bucket: The bucket to use when creating the presigned url
+        :return: A representation of the export for the API
+        """
+        url = None
+        if self.status == ExportStatus.COMPLETE.value:
+            url = bucket.create_get_url(self.s3_key, self.s3_key.rsplit("/", 1)[-1])
+        return APIVisitExport(
+            export_id=self.export_id,
+            export_format=self.export_format,
+            status=self.status,
+            visits_exported=self.visits_exported,
+            url=url,
         )
@@ -12,36 +12,49 @@ from aws_lambda_powertools.event_handler.api_gateway import Router
 from aws_lambda_powertools.event_handler.openapi.params import Body, Path, Query
 from typing_extensions import Annotated
 
-from ...database.db_table import DBTable
+from ...database.db_table_pool import table_pool
 from ...document_management.document_management import (
     delete,
     get_all_files,
+    get_document_tree,
     get_presigned_url,
+    index_document_tree,
     list_expiring_documents,
+    resolve_document_path,
     upload_file,
 )
 from ...environment import DOCUMENT_STORAGE_BUCKET_NAME
 from ...file_storage.s3_bucket import S3Bucket
 from ...models.api.document import (
+    APIDocumentDeleteProgress,
     APIDocumentListResponse,
     APIDocumentResponse,
+    APIDocumentTreeIndexResponse,
+    APIDocumentTreeNode,
+    APIDocumentTreeResponse,
     APIDocumentUploadRequest,
     APIExpiringDocumentResponse,
 )
-from ...models.db.document import DBDocument
+from ...models.db.document import DBDocument, DBDocumentTreeNode
 from ...util import (
     CORS_HEADERS,
     AWSAccessLevel,
+    FileType,
     UserType,
     create_http_response,
     create_open_api_error_response,
     create_open_api_response,
+    parse_fields,
+    partial_list_body,
     time_epoch_to_datetime,
     verify_user_role,
 )
 
 router = Router()
 
+DELETE_TIME_BUDGET_SECONDS = 10.0
+# Time after which a folder delete stops, to respond before the lambda times out
+
 
 @router.post(
     "/upload",
@@ -71,9 +84,11 @@ def upload_handler(body: Annotated[APIDocumentUploadRequest, Body()]):
         router.current_event["requestContext"]["requestTimeEpoch"]
     )
 
-    document_table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+    document_table = table_pool.get(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+    tree_table = table_pool.get(access=AWSAccessLevel.WRITE, item_schema=DBDocumentTreeNode)
     item = upload_file(
         document_table,
+        tree_table,
         body.document_name,
         body.document_type,
         body.parent_folder_id,
@@ -102,17 +117,27 @@ def upload_handler(body: Annotated[APIDocumentUploadRequest, Body()]):
         )
     },
 )
-def get_files_handler(site_id: Annotated[str, Path()], folder: Annotated[str, Path()]):
+def get_files_handler(
+    site_id: Annotated[str, Path()],
+    folder: Annotated[str, Path()],
+    fields: Annotated[Optional[str], Query()] = None,
+):
     """
     Route to get files for a specific site
     :param site_id: The site id to get documents for
     :param folder: The parent folder id to get files for
+    :param fields: The fields of each document to return, separated by commas. Only the
+        attributes needed for them are read from the database, and urls are only signed
+        when selected. By default all fields are returned
     :return: dictionary containing http response
     """
-    s3_bucket = S3Bucket(DOCUMENT_STORAGE_BUCKET_NAME, AWSAccessLevel.READ)
-    document_table = DBTable(access=AWSAccessLevel.READ, item_schema=DBDocument)
+    selected_fields = parse_fields(fields, APIDocumentResponse)
+    s3_bucket = None
+    if not selected_fields or "s3_presigned_get" in selected_fields:
+        s3_bucket = S3Bucket(DOCUMENT_STORAGE_BUCKET_NAME, AWSAccessLevel.READ)
+    document_table = table_pool.get(access=AWSAccessLevel.READ, item_schema=DBDocument)
 
-    files = get_all_files(document_table, s3_bucket, site_id, folder)
+    files = get_all_files(document_table, s3_bucket, site_id, folder, fields=selected_fields)
 
     response_body = json.dumps([file.model_dump() for file in files])
 
@@ -149,25 +174,135 @@ def get_presigned_url_handler(s3_key: Annotated[str, Path()]):
     )
 
 
+@router.get(
+    "/<site_id>/<folder>/tree",
+    security=[{"bearer": []}],
+    responses={
+        200: create_open_api_response(
+            description="Every document under the folder",
+            response_body_schema=APIDocumentTreeResponse,
+        )
+    },
+)
+def get_document_tree_handler(
+    site_id: Annotated[str, Path()], folder: Annotated[str, Path()]
+) -> Response[APIDocumentTreeResponse]:
+    """
+    Route to get every document under a folder, at any depth
+    :param site_id: The site id to get documents for
+    :param folder: The folder id to get the documents under
+    :return: The documents under the folder, with the number of files and folders
+    """
+    tree_table = table_pool.get(access=AWSAccessLevel.READ, item_schema=DBDocumentTreeNode)
+    nodes = get_document_tree(tree_table, site_id, folder)
+    folder_count = sum(node.document_type == FileType.FOLDER.value for node in nodes)
+
+    return create_http_response(
+        status_code=HTTPStatus.OK.value,
+        content_type=content_types.APPLICATION_JSON,
+        body=APIDocumentTreeResponse(
+            documents=[node.to_api_model() for node in nodes],
+            file_count=len(nodes) - folder_count,
+            folder_count=folder_count,
+        ),
+    )
+
+
+@router.post(
+    "/<site_id>/<folder>/tree/index",
+    security=[{"bearer": [UserType.ADMIN.value]}],
+    responses={
+        200: create_open_api_response(
+            description="The number of documents added to the document tree",
+            response_body_schema=APIDocumentTreeIndexResponse,
+        )
+    },
+)
+def index_document_tree_handler(
+    site_id: Annotated[str, Path()], folder: Annotated[str, Path()]
+) -> Response[APIDocumentTreeIndexResponse]:
+    """
+    Route to add every document under a folder to the document tree. Documents uploaded
+    before the tree was maintained have no tree nodes, so this must be run on the top level
+    folders of every site before uploads rely on the tree. Running it again is harmless.
+    :param site_id: The site id containing the folder
+    :param folder: The folder id to index the documents under
+    :return: The number of documents indexed
+    """
+    verify_user_role(
+        user_groups=router.current_event["requestContext"]["authorizer"]["claims"][
+            "cognito:groups"
+        ],
+        acceptable_roles=[UserType.ADMIN],
+        action="index the document tree",
+    )
+
+    document_table = table_pool.get(access=AWSAccessLevel.READ, item_schema=DBDocument)
+    tree_table = table_pool.get(access=AWSAccessLevel.WRITE, item_schema=DBDocumentTreeNode)
+    indexed = index_document_tree(document_table, tree_table, site_id, folder)
+
+    return create_http_response(
+        status_code=HTTPStatus.OK.value,
+        content_type=content_types.APPLICATION_JSON,
+        body=APIDocumentTreeIndexResponse(indexed_documents=indexed),
+    )
+
+
+@router.get(
+    "/<site_id>/resolve",
+    security=[{"bearer": []}],
+    responses={
+        200: create_open_api_response(
+            description="The document at the path", response_body_schema=APIDocumentTreeNode
+        ),
+        404: create_open_api_error_response(description="No document exists at the path"),
+    },
+)
+def resolve_document_path_handler(
+    site_id: Annotated[str, Path()], path: Annotated[list[str], Query()]
+) -> Response[APIDocumentTreeNode]:
+    """
+    Route to find a document by the names of the folders leading to it
+    :param site_id: The site id containing the document
+    :param path: The top level folder, then the name of each folder, then the name of
+        the document, given as repeated query parameters
+    :return: The document at the path
+    """
+    tree_table = table_pool.get(access=AWSAccessLevel.READ, item_schema=DBDocumentTreeNode)
+    node = resolve_document_path(tree_table, site_id, path)
+
+    return create_http_response(
+        status_code=HTTPStatus.OK.value,
+        content_type=content_types.APPLICATION_JSON,
+        body=node.to_api_model(),
+    )
+
+
 @router.delete(
     "/delete",
     security=[{"bearer": [UserType.ADMIN.value]}],
     responses={
+        202: create_open_api_response(
+            description="The folder was partially deleted, and the delete should be resumed",
+            response_body_schema=APIDocumentDeleteProgress,
+        ),
         204: create_open_api_response(
             description="No content returned on delete", response_body_schema={}
-        )
+        ),
     },
 )
 def delete_file_handler(
     site_id: Annotated[str, Query()],
     parent_folder_id: Annotated[str, Query()],
     document_id: Annotated[str, Query()],
+    resume_token: Annotated[Optional[str], Query()] = None,
 ):
     """
-    Route to get files for a specific site
+    Route to delete a document, large folders may take multiple requests to delete
     :param site_id: The site containg the file to be deleted
     :param parent_folder_id: The parent folder which contains this document
     :param document_id: The unique identifier of the document to be deleted
+    :param resume_token: The resume token of a previous partial delete of the document
     :return: dictionary containing http response
     """
     verify_user_role(
@@ -179,8 +314,24 @@ def delete_file_handler(
     )
 
     s3_bucket = S3Bucket(DOCUMENT_STORAGE_BUCKET_NAME, AWSAccessLevel.WRITE)
-    document_table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
-    delete(document_table, s3_bucket, site_id, parent_folder_id, document_id)
+    document_table = table_pool.get(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+    tree_table = table_pool.get(access=AWSAccessLevel.WRITE, item_schema=DBDocumentTreeNode)
+    deleted, next_token = delete(
+        document_table,
+        tree_table,
+        s3_bucket,
+        site_id,
+        parent_folder_id,
+        document_id,
+        time_budget_seconds=DELETE_TIME_BUDGET_SECONDS,
+        resume_token=resume_token,
+    )
+    if next_token:
+        return create_http_response(
+            status_code=HTTPStatus.ACCEPTED.value,
+            content_type=content_types.APPLICATION_JSON,
+            body=APIDocumentDeleteProgress(deleted_documents=deleted, resume_token=next_token),
+        )
     return create_http_response(
         status_code=HTTPStatus.NO_CONTENT.value,
     )
@@ -200,7 +351,8 @@ def list_expiring_documents_handler(
     days: Annotated[Optional[int], Query()] = None,
     limit: Annotated[Optional[int], Query()] = None,
     start_key: Annotated[Optional[str], Query()] = None,
-) -> Response[APIExpiringDocumentResponse]:
+    fields: Annotated[Optional[str], Query()] = None,
+):
     """
     Lists all the documents expiring withing the provided timedelta.
 
@@ -208,6 +360,9 @@ def list_expiring_documents_handler(
     :param limit: The maximum amount of site visits to retrieve
     :param start_key: The key to start listing visits from, should be
         obtained from the last_key of a previous request
+    :param fields: The fields of each document to return, separated by commas. Only the
+        attributes needed for them are read from the database. By default all fields are
+        returned
     :return: The documents that are expiring
     """
     request_time = time_epoch_to_datetime(
@@ -220,19 +375,21 @@ def list_expiring_documents_handler(
         acceptable_roles=[UserType.EMPLOYEE, UserType.ADMIN],
         action="list expiring documents",
     )
+    selected_fields = parse_fields(fields, APIDocumentResponse)
 
     decoded_key: Optional[dict] = None
     if start_key:
         key_bytes = base64.urlsafe_b64decode(start_key.encode("utf-8"))
         decoded_key = json.loads(key_bytes)
 
-    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBDocument)
+    table = table_pool.get(access=AWSAccessLevel.READ, item_schema=DBDocument)
     documents, last_eval_key = list_expiring_documents(
         table=table,
         from_time=request_time,
         days=days,
         limit=limit,
         start_key=decoded_key,
+        projection=DBDocument.api_projection(selected_fields) if selected_fields else None,
     )
 
     encoded_key = None
@@ -240,9 +397,17 @@ def list_expiring_documents_handler(
         key_bytes = json.dumps(last_eval_key).encode("utf-8")
         encoded_key = base64.urlsafe_b64encode(key_bytes).decode("utf-8")
 
-    response_body = APIExpiringDocumentResponse(
-        documents=[document.to_api_model() for document in documents], last_key=encoded_key
-    )
+    response_body: dict | APIExpiringDocumentResponse
+    if selected_fields:
+        response_body = partial_list_body(
+            "documents",
+            [DBDocument.to_partial_api_model(document, selected_fields) for document in documents],
+            encoded_key,
+        )
+    else:
+        response_body = APIExpiringDocumentResponse(
+            documents=[document.to_api_model() for document in documents], last_key=encoded_key
+        )
 
     return create_http_response(
         status_code=HTTPStatus.OK.value,
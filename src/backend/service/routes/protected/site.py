@@ -10,14 +10,21 @@ from aws_lambda_powertools.event_handler.api_gateway import Router
 from aws_lambda_powertools.event_handler.openapi.params import Body, Path, Query
 from typing_extensions import Annotated
 
-from ...database.db_table import DBTable
-from ...models.api.site import APIListSitesResponse, APISite, APISitePartial
+from ...database.db_table_pool import table_pool
+from ...models.api.site import (
+    APIListSitesResponse,
+    APINearbySite,
+    APINearbySitesResponse,
+    APISite,
+    APISitePartial,
+)
 from ...models.db.document import DBDocument
 from ...models.db.site import DBSite
 from ...site_management.site_management import (
     create_site,
     delete_site,
     get_site,
+    list_nearby_sites,
     list_sites,
     update_site,
 )
@@ -29,12 +36,20 @@ from ...util import (
     create_open_api_response,
     decode_db_key,
     encode_db_key,
+    parse_fields,
+    partial_list_body,
     time_epoch_to_datetime,
     verify_user_role,
 )
 
 router = Router()
 
+NEARBY_SITES_DEFAULT_RADIUS = 5000
+# Default distance in meters within which sites are considered nearby
+
+NEARBY_SITES_MAX_RADIUS = 50000
+# Maximum distance in meters that can be searched for nearby sites
+
 
 @router.post(
     "/",
@@ -66,7 +81,7 @@ def create_site_handler(site: Annotated[APISite, Body()]):
     # Getting user id from claims
     user_id = router.current_event["requestContext"]["authorizer"]["claims"]["sub"]
 
-    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSite)
+    table = table_pool.get(access=AWSAccessLevel.WRITE, item_schema=DBSite)
     new_site = create_site(
         table=table,
         site_id=site.site_id,
@@ -123,7 +138,7 @@ def update_site_handler(
     # Getting user id from claims
     user_id = router.current_event["requestContext"]["authorizer"]["claims"]["sub"]
 
-    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSite)
+    table = table_pool.get(access=AWSAccessLevel.WRITE, item_schema=DBSite)
     new_site = update_site(
         table=table,
         timestamp=request_time,
@@ -147,6 +162,53 @@ def update_site_handler(
     )
 
 
+@router.get(
+    "/nearby",
+    security=[{"bearer": [UserType.ADMIN.value, UserType.EMPLOYEE.value]}],
+    responses={
+        200: create_open_api_response(
+            description="Sites near the given position, nearest first",
+            response_body_schema=APINearbySitesResponse,
+        )
+    },
+)
+def list_nearby_sites_handler(
+    latitude: Annotated[float, Query(ge=-90, le=90)],
+    longitude: Annotated[float, Query(ge=-180, le=180)],
+    radius: Annotated[float, Query(gt=0, le=NEARBY_SITES_MAX_RADIUS)] = NEARBY_SITES_DEFAULT_RADIUS,
+):
+    """
+    List the sites near a position
+
+    :param latitude: The latitude of the position in degrees
+    :param longitude: The longitude of the position in degrees
+    :param radius: The distance from the position in meters, within which sites are listed
+    :return: The sites near the position and their distance from it, nearest first
+    """
+    verify_user_role(
+        user_groups=router.current_event["requestContext"]["authorizer"]["claims"][
+            "cognito:groups"
+        ],
+        acceptable_roles=[UserType.ADMIN, UserType.EMPLOYEE],
+        action="list nearby sites",
+    )
+
+    table = table_pool.get(access=AWSAccessLevel.READ, item_schema=DBSite)
+    sites = list_nearby_sites(table=table, latitude=latitude, longitude=longitude, radius=radius)
+
+    return Response(
+        status_code=HTTPStatus.OK.value,
+        content_type=content_types.APPLICATION_JSON,
+        body=APINearbySitesResponse(
+            sites=[
+                APINearbySite(**site.to_api_model().model_dump(), distance=distance)
+                for site, distance in sites
+            ]
+        ),
+        headers=CORS_HEADERS,
+    )
+
+
 @router.get(
     "/<site_id>",
     security=[{"bearer": [UserType.ADMIN.value, UserType.EMPLOYEE.value]}],
@@ -173,7 +235,7 @@ def get_site_handler(
         action="get site",
     )
 
-    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBSite)
+    table = table_pool.get(access=AWSAccessLevel.READ, item_schema=DBSite)
     new_site = get_site(table=table, site_id=site_id)
 
     return Response(
@@ -211,8 +273,8 @@ def delete_site_handler(site_id: Annotated[str, Path(min_length=5, max_length=5)
         action="delete site",
     )
 
-    site_table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSite)
-    document_table = DBTable(access=AWSAccessLevel.READ, item_schema=DBDocument)
+    site_table = table_pool.get(access=AWSAccessLevel.WRITE, item_schema=DBSite)
+    document_table = table_pool.get(access=AWSAccessLevel.READ, item_schema=DBDocument)
     delete_site(
         site_table=site_table,
         document_table=document_table,
@@ -239,12 +301,16 @@ def delete_site_handler(site_id: Annotated[str, Path(min_length=5, max_length=5)
 def list_sites_handler(
     limit: Annotated[Optional[int], Query(le=100)] = None,
     start_key: Annotated[Optional[str], Query()] = None,
+    fields: Annotated[Optional[str], Query()] = None,
 ):
     """
     List the available sites from the database
 
     :param limit: The maximum amount of sites to recieve
     :param start_key: A key to start from, should be recieved from a previous request
+    :param fields: The fields of each site to return, separated by commas. Only the
+        attributes needed for them are read from the database. By default all fields
+        are returned
     :return: The list of sites and their details
     """
     verify_user_role(
@@ -254,19 +320,34 @@ def list_sites_handler(
         acceptable_roles=[UserType.ADMIN, UserType.EMPLOYEE],
         action="list sites",
     )
+    selected_fields = parse_fields(fields, APISite)
 
     decoded_start_key = decode_db_key(key=start_key) if start_key else None
 
-    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBSite)
-    sites, last_key = list_sites(table=table, limit=limit, start_key=decoded_start_key)
+    table = table_pool.get(access=AWSAccessLevel.READ, item_schema=DBSite)
+    sites, last_key = list_sites(
+        table=table,
+        limit=limit,
+        start_key=decoded_start_key,
+        projection=DBSite.api_projection(selected_fields) if selected_fields else None,
+    )
 
     encoded_key = encode_db_key(last_key) if last_key else None
 
+    body: dict | APIListSitesResponse
+    if selected_fields:
+        body = partial_list_body(
+            "sites",
+            [DBSite.to_partial_api_model(site, selected_fields) for site in sites],
+            encoded_key,
+        )
+    else:
+        body = APIListSitesResponse(
+            sites=[site.to_api_model() for site in sites], last_key=encoded_key
+        )
     return Response(
         status_code=HTTPStatus.OK.value,
         content_type=content_types.APPLICATION_JSON,
-        body=APIListSitesResponse(
-            sites=[site.to_api_model() for site in sites], last_key=encoded_key
-        ),
+        body=body,
         headers=CORS_HEADERS,
     )
@@ -2,7 +2,7 @@
 Routes for site visit APIs
 """
 
-from datetime import datetime
+from datetime import date, datetime
 from http import HTTPStatus
 from typing import Optional
 
@@ -11,34 +11,56 @@ from aws_lambda_powertools.event_handler.api_gateway import Router
 from aws_lambda_powertools.event_handler.openapi.params import Body, Path, Query
 from typing_extensions import Annotated
 
-from ...database.db_table import DBTable
+from ...database.db_table_pool import table_pool
 from ...environment import DOCUMENT_STORAGE_BUCKET_NAME
+from ...exceptions import BadRequestException
 from ...file_storage.s3_bucket import S3Bucket
 from ...models.api.file_attachment import APIAddFileAttachment, APIRemoveFileAttachment
 from ...models.api.site_visit import (
     APIEnterSiteRequest,
+    APILatestSiteVisit,
+    APIListSiteOccupantsResponse,
     APIListSiteVisitResponse,
     APISiteVisit,
+    APISiteVisitStatsResponse,
+    APIVisitExport,
     EditableSiteVisitDetails,
 )
-from ...models.db.site_visit import DBSiteVisit
+from ...models.db.site_visit import (
+    DBLatestSiteVisit,
+    DBSiteOccupant,
+    DBSiteVisit,
+    DBSiteVisitRollup,
+    DBVisitExport,
+)
 from ...site_visits.site_visits import (
     add_exit_time,
     create_file_attachment,
     create_site_entry,
     delete_file_attachment,
+    get_latest_site_visit,
     get_site_visit,
+    list_site_occupants,
+    list_site_visit_rollups,
     list_site_visits,
+    list_visits_for_site,
+    list_visits_for_user,
     update_visit_details,
 )
+from ...site_visits.visit_export import continue_visit_export, get_visit_export, start_visit_export
+from ...site_visits.visit_stats import get_site_visit_stats, rebuild_site_visit_rollups
 from ...util import (
     CORS_HEADERS,
     AWSAccessLevel,
+    ExportFormat,
     UserType,
+    VisitTimeRange,
     create_open_api_error_response,
     create_open_api_response,
     decode_db_key,
     encode_db_key,
+    parse_fields,
+    partial_list_body,
     time_epoch_to_datetime,
     verify_user_role,
 )
@@ -76,7 +98,7 @@ def enter_site_handler(
     # Getting user email (which is stored as cognito username) from claims
     user_email = router.current_event["requestContext"]["authorizer"]["claims"]["cognito:username"]
 
-    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisit)
+    table = table_pool.get(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisit)
     visit = create_site_entry(
         table=table,
         site_id=site_id,
@@ -129,7 +151,7 @@ def edit_visit_details_handler(
     # Getting user id from claims
     user_id = router.current_event["requestContext"]["authorizer"]["claims"]["sub"]
 
-    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisit)
+    table = table_pool.get(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisit)
     visit = update_visit_details(
         table=table,
         site_id=site_id,
@@ -180,7 +202,7 @@ def add_file_attachment_handler(
     # Getting user id from claims
     user_id = router.current_event["requestContext"]["authorizer"]["claims"]["sub"]
 
-    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisit)
+    table = table_pool.get(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisit)
     visit = create_file_attachment(
         table=table,
         site_id=site_id,
@@ -230,7 +252,7 @@ def remove_file_attachment_handler(
     # Getting user id from claims
     user_id = router.current_event["requestContext"]["authorizer"]["claims"]["sub"]
 
-    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisit)
+    table = table_pool.get(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisit)
     bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.WRITE)
     visit = delete_file_attachment(
         table=table,
@@ -275,7 +297,7 @@ def exit_site_handler(site_id: Annotated[str, Path()], entry_time: Annotated[dat
     # Getting user id from claims
     user_id = router.current_event["requestContext"]["authorizer"]["claims"]["sub"]
 
-    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisit)
+    table = table_pool.get(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisit)
     visit = add_exit_time(
         table=table, site_id=site_id, user_id=user_id, entry_time=entry_time, timestamp=request_time
     )
@@ -310,7 +332,7 @@ def get_visit_handler(site_id: Annotated[str, Path()], entry_time: Annotated[dat
     # Getting user id from claims
     user_id = router.current_event["requestContext"]["authorizer"]["claims"]["sub"]
 
-    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBSiteVisit)
+    table = table_pool.get(access=AWSAccessLevel.READ, item_schema=DBSiteVisit)
     visit = get_site_visit(table=table, site_id=site_id, user_id=user_id, entry_time=entry_time)
 
     bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.READ)
@@ -323,13 +345,85 @@ def get_visit_handler(site_id: Annotated[str, Path()], entry_time: Annotated[dat
     )
 
 
+@router.get(
+    "/visits/latest",
+    security=[{"bearer": []}],
+    responses={
+        200: create_open_api_response(
+            description="The latest site visit of the user", response_body_schema=APILatestSiteVisit
+        ),
+        404: create_open_api_error_response(description="User has not entered a site"),
+    },
+)
+def get_latest_visit_handler() -> Response[APILatestSiteVisit]:
+    """
+    Gets the site visit most recently entered by the user, so that the user can tell
+    whether they need to exit it
+
+    :return: The latest site visit of the user
+    """
+    # Getting user id from claims
+    user_id = router.current_event["requestContext"]["authorizer"]["claims"]["sub"]
+
+    table = table_pool.get(access=AWSAccessLevel.READ, item_schema=DBLatestSiteVisit)
+    visit = get_latest_site_visit(table=table, user_id=user_id)
+
+    return Response(
+        status_code=HTTPStatus.OK.value,
+        content_type=content_types.APPLICATION_JSON,
+        body=visit.to_api_model(),
+        headers=CORS_HEADERS,
+    )
+
+
+@router.get(
+    "/<site_id>/occupants",
+    security=[{"bearer": [UserType.ADMIN.value, UserType.EMPLOYEE.value]}],
+    responses={
+        200: create_open_api_response(
+            description="Users currently on the site",
+            response_body_schema=APIListSiteOccupantsResponse,
+        )
+    },
+)
+def list_site_occupants_handler(site_id: Annotated[str, Path()]):
+    """
+    Lists the users currently on a site, those who have entered the site and not exited it
+
+    :param site_id: The site id to list the occupants of
+    :return: The users currently on the site
+    """
+    verify_user_role(
+        user_groups=router.current_event["requestContext"]["authorizer"]["claims"][
+            "cognito:groups"
+        ],
+        acceptable_roles=[UserType.ADMIN, UserType.EMPLOYEE],
+        action="list site occupants",
+    )
+
+    table = table_pool.get(access=AWSAccessLevel.READ, item_schema=DBSiteOccupant)
+    occupants = list_site_occupants(table=table, site_id=site_id)
+
+    return Response(
+        status_code=HTTPStatus.OK.value,
+        content_type=content_types.APPLICATION_JSON,
+        body=APIListSiteOccupantsResponse(
+            occupants=[occupant.to_api_model() for occupant in occupants]
+        ),
+        headers=CORS_HEADERS,
+    )
+
+
 @router.get(
     "/visits",
     security=[{"bearer": [UserType.ADMIN.value]}],
     responses={
         200: create_open_api_response(
             description="List of all site visits", response_body_schema=APIListSiteVisitResponse
-        )
+        ),
+        503: create_open_api_error_response(
+            description="The database index needed for the time range has not been created yet"
+        ),
     },
 )
 def list_site_visits_handler(
@@ -337,15 +431,31 @@ def list_site_visits_handler(
     to_time: Annotated[Optional[datetime], Query()] = None,
     limit: Annotated[Optional[int], Query(le=100)] = None,
     start_key: Annotated[Optional[str], Query()] = None,
-) -> Response[APIListSiteVisitResponse]:
+    site_id: Annotated[Optional[str], Query()] = None,
+    user_id: Annotated[Optional[str], Query()] = None,
+    time_range: Annotated[VisitTimeRange, Query()] = VisitTimeRange.LAST_MODIFIED,
+    attachment_urls: Annotated[bool, Query()] = True,
+    fields: Annotated[Optional[str], Query()] = None,
+):
     """
-    Lists the site visits in the database, according to the passed parameters
+    Lists the site visits in the database, according to the passed parameters. When a
+    site or user is given, only their visits are read, and the time range applies to the
+    time the visits were entered rather than last modified
 
     :param from_time: Only site visits from after this time are returned
     :param to_time: Only site visits from before this time are returned
     :param limit: The maximum amount of site visits to retrieve
     :param start_key: The key to start listing visits from, should be
         obtained from the last_key of a previous request
+    :param site_id: Only visits to this site are returned
+    :param user_id: Only visits by this user are returned
+    :param time_range: The time of each visit the time range applies to, when listing
+        all visits
+    :param attachment_urls: Whether to sign a url for each attachment. Lists which don't
+        show attachments can skip signing, and get the urls of a single visit when needed
+    :param fields: The fields of each visit to return, separated by commas. Only the
+        attributes needed for them are read from the database, and attachments are only
+        signed when selected. By default all fields are returned
     :return: The details of all site visits retrieved
     """
 
@@ -356,25 +466,62 @@ def list_site_visits_handler(
         acceptable_roles=[UserType.ADMIN],
         action="list site visits",
     )
+    if site_id and user_id:
+        raise BadRequestException("Only one of [site_id] and [user_id] can be given")
+    selected_fields = parse_fields(fields, APISiteVisit)
+    projection = DBSiteVisit.api_projection(selected_fields) if selected_fields else None
 
     decoded_key = decode_db_key(key=start_key) if start_key else None
 
-    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBSiteVisit)
-    visits, last_eval_key = list_site_visits(
-        table=table,
-        from_time=from_time,
-        to_time=to_time,
-        limit=limit,
-        start_key=decoded_key,
-    )
+    table = table_pool.get(access=AWSAccessLevel.READ, item_schema=DBSiteVisit)
+    if site_id:
+        visits, last_eval_key = list_visits_for_site(
+            table=table,
+            site_id=site_id,
+            from_time=from_time,
+            to_time=to_time,
+            limit=limit,
+            start_key=decoded_key,
+            projection=projection,
+        )
+    elif user_id:
+        visits, last_eval_key = list_visits_for_user(
+            table=table,
+            user_id=user_id,
+            from_time=from_time,
+            to_time=to_time,
+            limit=limit,
+            start_key=decoded_key,
+            projection=projection,
+        )
+    else:
+        visits, last_eval_key = list_site_visits(
+            table=table,
+            from_time=from_time,
+            to_time=to_time,
+            limit=limit,
+            start_key=decoded_key,
+            time_range=time_range,
+            projection=projection,
+        )
 
     encoded_key = encode_db_key(key=last_eval_key) if last_eval_key else None
 
-    bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.READ)
+    bucket = None
+    if attachment_urls and (not selected_fields or "attachments" in selected_fields):
+        bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.READ)
 
-    response_body = APIListSiteVisitResponse(
-        visits=[visit.to_api_model(bucket=bucket) for visit in visits], last_key=encoded_key
-    )
+    response_body: dict | APIListSiteVisitResponse
+    if selected_fields:
+        response_body = partial_list_body(
+            "visits",
+            DBSiteVisit.to_partial_api_models(visits, selected_fields, bucket=bucket),
+            encoded_key,
+        )
+    else:
+        response_body = APIListSiteVisitResponse(
+            visits=DBSiteVisit.to_api_models(visits, bucket=bucket), last_key=encoded_key
+        )
 
     return Response(
         status_code=HTTPStatus.OK.value,
@@ -382,3 +529,270 @@ def list_site_visits_handler(
         body=response_body,
         headers=CORS_HEADERS,
     )
+
+
+@router.get(
+    "/visits/stats",
+    security=[{"bearer": [UserType.ADMIN.value]}],
+    responses={
+        200: create_open_api_response(
+            description="Statistics of site visits, per site and day of entry",
+            response_body_schema=APISiteVisitStatsResponse,
+        ),
+        400: create_open_api_error_response(description="Time range missing or too long"),
+    },
+)
+def get_site_visit_stats_handler(
+    from_time: Annotated[Optional[datetime], Query()] = None,
+    to_time: Annotated[Optional[datetime], Query()] = None,
+    site_id: Annotated[Optional[str], Query()] = None,
+) -> Response[APISiteVisitStatsResponse]:
+    """
+    Computes the visit count, acknowledgement and on site rates, and dwell times of the
+    visits entered in a time range, for each site and day. Both ends of the range are
+    required, and the range can be at most STATS_MAX_DAYS long
+
+    :param from_time: Only site visits entered after this time are included
+    :param to_time: Only site visits entered before this time are included
+    :param site_id: Only visits to this site are included
+    :return: The statistics of the site visits
+    """
+    verify_user_role(
+        user_groups=router.current_event["requestContext"]["authorizer"]["claims"][
+            "cognito:groups"
+        ],
+        acceptable_roles=[UserType.ADMIN],
+        action="get site visit statistics",
+    )
+
+    table = table_pool.get(access=AWSAccessLevel.READ, item_schema=DBSiteVisit)
+    stats = get_site_visit_stats(table=table, from_time=from_time, to_time=to_time, site_id=site_id)
+
+    return Response(
+        status_code=HTTPStatus.OK.value,
+        content_type=content_types.APPLICATION_JSON,
+        body=APISiteVisitStatsResponse(stats=stats),
+        headers=CORS_HEADERS,
+    )
+
+
+@router.get(
+    "/<site_id>/visits/daily",
+    security=[{"bearer": [UserType.ADMIN.value]}],
+    responses={
+        200: create_open_api_response(
+            description="Totals of the visits to a site for each day",
+            response_body_schema=APISiteVisitStatsResponse,
+        )
+    },
+)
+def list_site_visit_rollups_handler(
+    site_id: Annotated[str, Path()],
+    from_date: Annotated[Optional[date], Query()] = None,
+    to_date: Annotated[Optional[date], Query()] = None,
+) -> Response[APISiteVisitStatsResponse]:
+    """
+    Lists the visit count, acknowledgement and on site rates, and mean dwell time of the
+    visits to a site for each day, read from the running totals kept for each day
+
+    :param site_id: The site to list the totals of
+    :param from_date: The first day to list the totals of
+    :param to_date: The last day to list the totals of
+    :return: The statistics of the visits to the site for each day with visits
+    """
+    verify_user_role(
+        user_groups=router.current_event["requestContext"]["authorizer"]["claims"][
+            "cognito:groups"
+        ],
+        acceptable_roles=[UserType.ADMIN],
+        action="list daily site visit totals",
+    )
+
+    table = table_pool.get(access=AWSAccessLevel.READ, item_schema=DBSiteVisitRollup)
+    rollups = list_site_visit_rollups(
+        table=table, site_id=site_id, from_date=from_date, to_date=to_date
+    )
+
+    return Response(
+        status_code=HTTPStatus.OK.value,
+        content_type=content_types.APPLICATION_JSON,
+        body=APISiteVisitStatsResponse(stats=[rollup.to_api_model() for rollup in rollups]),
+        headers=CORS_HEADERS,
+    )
+
+
+@router.post(
+    "/visits/rollups/rebuild",
+    security=[{"bearer": [UserType.ADMIN.value]}],
+    responses={
+        200: create_open_api_response(
+            description="Rebuilt totals of the visits to each site for each day",
+            response_body_schema=APISiteVisitStatsResponse,
+        )
+    },
+)
+def rebuild_site_visit_rollups_handler(
+    from_date: Annotated[date, Query()],
+    to_date: Annotated[date, Query()],
+    site_id: Annotated[Optional[str], Query()] = None,
+) -> Response[APISiteVisitStatsResponse]:
+    """
+    Rebuilds the running totals of the visits to each site for each day in a range, from
+    the visits entered on those days
+
+    :param from_date: The first day to rebuild the totals of
+    :param to_date: The last day to rebuild the totals of
+    :param site_id: Only the totals of this site are rebuilt
+    :return: The statistics of the rebuilt totals
+    """
+    verify_user_role(
+        user_groups=router.current_event["requestContext"]["authorizer"]["claims"][
+            "cognito:groups"
+        ],
+        acceptable_roles=[UserType.ADMIN],
+        action="rebuild site visit totals",
+    )
+    request_time = time_epoch_to_datetime(
+        router.current_event["requestContext"]["requestTimeEpoch"]
+    )
+    user_id = router.current_event["requestContext"]["authorizer"]["claims"]["sub"]
+
+    table = table_pool.get(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisitRollup)
+    rollups = rebuild_site_visit_rollups(
+        table=table,
+        from_date=from_date,
+        to_date=to_date,
+        timestamp=request_time,
+        user_id=user_id,
+        site_id=site_id,
+    )
+
+    return Response(
+        status_code=HTTPStatus.OK.value,
+        content_type=content_types.APPLICATION_JSON,
+        body=APISiteVisitStatsResponse(stats=[rollup.to_api_model() for rollup in rollups]),
+        headers=CORS_HEADERS,
+    )
+
+
+def _export_response(export: DBVisitExport) -> Response[APIVisitExport]:
+    """
+    The response to a request to export site visits
+
+    :param export: The export as it was left by the request
+    :return: The export, with a url to download the file once it is complete
+    """
+    bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.READ)
+    return Response(
+        status_code=HTTPStatus.OK.value,
+        content_type=content_types.APPLICATION_JSON,
+        body=export.to_api_model(bucket=bucket),
+        headers=CORS_HEADERS,
+    )
+
+
+def _continue_export(export: DBVisitExport, request_time: datetime) -> DBVisitExport:
+    """
+    Continues an export of site visits for the rest of the invocation
+
+    :param export: The export to continue
+    :param request_time: The time at which the request was issued
+    :return: The export as it was left by the invocation
+    """
+    return continue_visit_export(
+        visit_table=table_pool.get(access=AWSAccessLevel.READ, item_schema=DBSiteVisit),
+        export_table=table_pool.get(access=AWSAccessLevel.WRITE, item_schema=DBVisitExport),
+        bucket=S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.WRITE),
+        export=export,
+        timestamp=request_time,
+        time_remaining=lambda: router.lambda_context.get_remaining_time_in_millis() / 1000,
+    )
+
+
+@router.post(
+    "/visits/export",
+    security=[{"bearer": [UserType.ADMIN.value]}],
+    responses={
+        200: create_open_api_response(
+            description="Export of site visits, complete or to be continued",
+            response_body_schema=APIVisitExport,
+        )
+    },
+)
+def start_visit_export_handler(
+    export_format: Annotated[ExportFormat, Query()] = ExportFormat.CSV,
+    from_time: Annotated[Optional[datetime], Query()] = None,
+    to_time: Annotated[Optional[datetime], Query()] = None,
+    site_id: Annotated[Optional[str], Query()] = None,
+) -> Response[APIVisitExport]:
+    """
+    Exports the site visits entered in a time range to a gzip compressed file. Exports
+    which are not complete by the end of the request are continued by requests to
+    /visits/export/<export_id>
+
+    :param export_format: The format of the exported file
+    :param from_time: Only site visits entered after this time are exported
+    :param to_time: Only site visits entered before this time are exported
+    :param site_id: Only visits to this site are exported
+    :return: The export, with a url to download the file once it is complete
+    """
+    verify_user_role(
+        user_groups=router.current_event["requestContext"]["authorizer"]["claims"][
+            "cognito:groups"
+        ],
+        acceptable_roles=[UserType.ADMIN],
+        action="export site visits",
+    )
+    request_time = time_epoch_to_datetime(
+        router.current_event["requestContext"]["requestTimeEpoch"]
+    )
+    user_id = router.current_event["requestContext"]["authorizer"]["claims"]["sub"]
+
+    export = start_visit_export(
+        export_table=table_pool.get(access=AWSAccessLevel.WRITE, item_schema=DBVisitExport),
+        bucket=S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.WRITE),
+        export_format=export_format,
+        timestamp=request_time,
+        user_id=user_id,
+        from_time=from_time,
+        to_time=to_time,
+        site_id=site_id,
+    )
+    return _export_response(_continue_export(export, request_time))
+
+
+@router.post(
+    "/visits/export/<export_id>",
+    security=[{"bearer": [UserType.ADMIN.value]}],
+    responses={
+        200: create_open_api_response(
+            description="Export of site visits, complete or to be continued",
+            response_body_schema=APIVisitExport,
+        ),
+        404: create_open_api_error_response(description="Export not found"),
+        409: create_open_api_error_response(description="Export is being continued already"),
+    },
+)
+def continue_visit_export_handler(export_id: Annotated[str, Path()]) -> Response[APIVisitExport]:
+    """
+    Continues an export of site visits from where the last request left it
+
+    :param export_id: The id of the export to continue
+    :return: The export, with a url to download the file once it is complete
+    """
+    verify_user_role(
+        user_groups=router.current_event["requestContext"]["authorizer"]["claims"][
+            "cognito:groups"
+        ],
+        acceptable_roles=[UserType.ADMIN],
+        action="export site visits",
+    )
+    request_time = time_epoch_to_datetime(
+        router.current_event["requestContext"]["requestTimeEpoch"]
+    )
+
+    export = get_visit_export(
+        export_table=table_pool.get(access=AWSAccessLevel.READ, item_schema=DBVisitExport),
+        export_id=export_id,
+    )
+    return _export_response(_continue_export(export, request_time))
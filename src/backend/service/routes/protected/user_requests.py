@@ -10,7 +10,7 @@ from aws_lambda_powertools.event_handler.api_gateway import Router
 from aws_lambda_powertools.event_handler.openapi.params import Body, Query
 from typing_extensions import Annotated
 
-from ...database.db_table import DBTable
+from ...database.db_table_pool import table_pool
 from ...environment import USER_POOL_CLIENT_ID, USER_POOL_ID
 from ...models.api.user_requests import (
     APIActionUserRequest,
@@ -63,7 +63,7 @@ def get_user_requests_handler(
 
     decoded_key = decode_db_key(key=start_key) if start_key else None
 
-    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBUserRequest)
+    table = table_pool.get(access=AWSAccessLevel.READ, item_schema=DBUserRequest)
     user_requests, last_eval_key = get_user_requests(
         table=table, limit=limit, start_key=decoded_key
     )
@@ -110,7 +110,7 @@ def action_user_request_handler(body: Annotated[APIActionUserRequest, Body()]):
         action="action user requests",
     )
 
-    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBUserRequest)
+    table = table_pool.get(access=AWSAccessLevel.WRITE, item_schema=DBUserRequest)
 
     response_body = action_user_request(
         cognito_client=AdminCognitoClient(user_pool_id=USER_POOL_ID, clientid=USER_POOL_CLIENT_ID),
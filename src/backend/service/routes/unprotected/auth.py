@@ -9,7 +9,7 @@ from aws_lambda_powertools.event_handler.api_gateway import Router
 from aws_lambda_powertools.event_handler.openapi.params import Body
 from typing_extensions import Annotated
 
-from ...database.db_table import DBTable
+from ...database.db_table_pool import table_pool
 from ...environment import USER_POOL_CLIENT_ID, USER_POOL_ID
 from ...models.api.user_requests import APIUserRequest
 from ...models.db.user_request import DBUserRequest
@@ -78,7 +78,7 @@ def create_user_request_handler(body: Annotated[APIUserRequest, Body()]):
     :param body: The body of the HTTP request
     :return: dictionary containing http response
     """
-    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBUserRequest)
+    table = table_pool.get(access=AWSAccessLevel.WRITE, item_schema=DBUserRequest)
     request_time = time_epoch_to_datetime(
         router.current_event["requestContext"]["requestTimeEpoch"]
     )
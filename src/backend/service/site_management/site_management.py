@@ -4,10 +4,12 @@ Manages the creation, updating, deletion and retrieval of site visits
 
 from datetime import datetime
 from decimal import Decimal
-from typing import Optional
+from threading import Lock
+from typing import Any, Optional, Type
 
 from aws_lambda_powertools.logging import Logger
 from boto3.dynamodb.conditions import Attr, Key
+from cachetools import TTLCache
 
 from ..database.db_table import GSI, DBTable, KeySchema
 from ..exceptions import (
@@ -16,12 +18,55 @@ from ..exceptions import (
     ResourceConflict,
     TimeConsistencyException,
 )
+from ..location_verification.site_index import get_site_index, index_site, unindex_site
+from ..models.custom_base_model import CustomBaseModel
+from ..models.db.db_base import DBItemKey
 from ..models.db.document import DBDocument
 from ..models.db.site import DBSite
 from ..util import ItemType
 
 logger = Logger()
 
+SITE_CACHE_TTL_SECONDS = 60
+# Time a site is reused from the cache before it is read from the database again
+
+SITE_CACHE_SIZE = 1024
+# Maximum number of sites kept in the cache
+
+_site_cache: TTLCache[str, DBSite] = TTLCache(maxsize=SITE_CACHE_SIZE, ttl=SITE_CACHE_TTL_SECONDS)
+_site_cache_lock = Lock()
+
+
+def clear_site_cache() -> None:
+    """
+    Remove all sites from the cache
+    """
+    with _site_cache_lock:
+        _site_cache.clear()
+
+
+def _cache_site(site: DBSite) -> None:
+    """
+    Add a site to the cache, unless a newer version of the site is already cached. This
+    prevents a slow read from replacing a site that was updated while the read was in flight
+
+    :param site: The site to cache
+    """
+    with _site_cache_lock:
+        cached = _site_cache.get(site.site_id)
+        if cached is None or cached.last_modified_time <= site.last_modified_time:
+            _site_cache[site.site_id] = site
+
+
+def _evict_site(site_id: str) -> None:
+    """
+    Remove a site from the cache
+
+    :param site_id: The unique identifier of the site to remove
+    """
+    with _site_cache_lock:
+        _site_cache.pop(site_id, None)
+
 
 def create_site(
     table: DBTable[DBSite],
@@ -58,12 +103,14 @@ def create_site(
     )
     condition = Attr("pk").not_exists() & Attr("sk").not_exists()
     try:
-        return table.put(item=item, condition_expression=condition)
+        site = table.put(item=item, condition_expression=condition)
     except ConditionCheckFailed as err:
         logger.exception(err)
         raise ResourceConflict(
             resource_type=item.type.value, resource_id=str(KeySchema(pk=item.pk, sk=item.sk))
         ) from err
+    index_site(site)
+    return site
 
 
 def update_site(
@@ -106,7 +153,7 @@ def update_site(
     if acceptable_range:
         update_attrs["acceptable_range"] = acceptable_range
     try:
-        return table.update(
+        site = table.update(
             key=key,
             update_attributes=update_attrs,
             last_modified_time=timestamp,
@@ -115,7 +162,12 @@ def update_site(
         )
     except ConditionCheckFailed as err:
         logger.exception(err)
+        # The site has been changed since the request was issued, so the cache may be stale
+        _evict_site(site_id)
         raise TimeConsistencyException(key=str(key), timestamp=timestamp) from err
+    _cache_site(site)
+    index_site(site)
+    return site
 
 
 def delete_site(
@@ -140,7 +192,9 @@ def delete_site(
     :raises PermissionException: The given table does not have write permissions
     """
     document_key_condition = Key("pk").eq(f"{DBDocument.item_type().value}#{site_id}#root")
-    documents, _ = document_table.query(key_condition_expression=document_key_condition, limit=1)
+    documents, _ = document_table.query(
+        key_condition_expression=document_key_condition, limit=1, projection=DBItemKey
+    )
     if documents:
         raise BadRequestException(f"Documents exist for site [{site_id}], cannot delete site")
 
@@ -155,7 +209,10 @@ def delete_site(
         site_table.delete(key=key, condition_expression=condition)
     except ConditionCheckFailed as err:
         logger.exception(err)
+        _evict_site(site_id)
         raise TimeConsistencyException(key=str(key), timestamp=timestamp) from err
+    _evict_site(site_id)
+    unindex_site(site_id)
 
 
 def get_site(table: DBTable[DBSite], site_id: str) -> DBSite:
@@ -172,17 +229,58 @@ def get_site(table: DBTable[DBSite], site_id: str) -> DBSite:
     return table.get(key=key)
 
 
+def list_nearby_sites(
+    table: DBTable[DBSite], latitude: float, longitude: float, radius: float
+) -> list[tuple[DBSite, float]]:
+    """
+    List the sites whose centre is within a distance of a position, using the spatial index
+    of sites so that only sites near the position are checked
+
+    :param table: The DBTable object to use when building the index of sites
+    :param latitude: The latitude of the position in degrees
+    :param longitude: The longitude of the position in degrees
+    :param radius: The distance from the position in meters
+    :return: The sites and their distance from the position in meters, nearest first
+    :raises ExternalServiceException: An unexpected error occurs in AWS
+    """
+    return get_site_index(table).near(latitude, longitude, radius)
+
+
+def get_cached_site(table: DBTable[DBSite], site_id: str) -> DBSite:
+    """
+    Get a site, reusing a recent read of the site by this process if there is one. Sites
+    updated or deleted by this process are replaced in, or removed from, the cache, while
+    changes made by other processes are seen once the cached site expires.
+
+    :param table: The DBTable object to use when reading the site, if it is not cached
+    :param site_id: The unique identifier of the site to get
+    :return: The site with the given ID
+    :raises ResourceNotFound: No site with the given ID exists
+    :raises ExternalServiceException: An unexpected error occurs in AWS
+    """
+    with _site_cache_lock:
+        cached = _site_cache.get(site_id)
+    if cached is not None:
+        return cached
+
+    site = get_site(table=table, site_id=site_id)
+    _cache_site(site)
+    return site
+
+
 def list_sites(
     table: DBTable[DBSite],
     limit: Optional[int] = None,
     start_key: Optional[dict] = None,
-) -> tuple[list[DBSite], Optional[dict]]:
+    projection: Optional[Type[CustomBaseModel]] = None,
+) -> tuple[list[Any], Optional[dict]]:
     """
     Get a list of all sites from the database
 
     :param table: The table to use when getting the sites
     :param limit: The maximum number of sites to get
     :param start_key: The database key to start querying from
+    :param projection: A partial model of the sites, if given only its attributes are read
     :return: The list of all sites within the given limit, and the last evaluated key
     :raises ExternalServiceException: An unexpected error occurs in AWS
     """
@@ -193,4 +291,5 @@ def list_sites(
         limit=limit,
         scan_reverse=True,
         start_key=start_key,
+        projection=projection,
     )
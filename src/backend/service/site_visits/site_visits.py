@@ -2,13 +2,13 @@
 Manages the creation, and updating of site visits
 """
 
-from datetime import datetime
-from typing import Optional
+from datetime import date, datetime
+from typing import Any, Optional, Type
 
 from aws_lambda_powertools.logging import Logger
-from boto3.dynamodb.conditions import Attr, Key
+from boto3.dynamodb.conditions import Attr, ConditionBase, Key
 
-from ..database.db_table import GSI, DBTable, KeySchema
+from ..database.db_table import GSI, DBTable, DBTransaction, KeySchema
 from ..exceptions import (
     BadRequestException,
     ConditionCheckFailed,
@@ -19,11 +19,59 @@ from ..exceptions import (
 )
 from ..file_storage.s3_bucket import S3Bucket
 from ..models.api.site_visit import EditableSiteVisitDetails
-from ..models.db.site_visit import DBSiteVisit
-from ..util import ItemType
+from ..models.custom_base_model import CustomBaseModel
+from ..models.db.site_visit import (
+    DBLatestSiteVisit,
+    DBSiteOccupant,
+    DBSiteVisit,
+    DBSiteVisitRollup,
+)
+from ..util import ItemType, VisitTimeRange
 
 logger = Logger()
 
+ATTACHMENT_LIMIT = 10
+# Maximum number of file attachments on a site visit
+
+ROLLUP_ATTRIBUTE_NAMES = {"#type": "type"}
+# Aliases of the attributes set on rollups, "type" is a reserved word in DynamoDB
+
+
+def _rollup_update(
+    transaction: DBTransaction,
+    site_id: str,
+    entry_time: datetime,
+    timestamp: datetime,
+    user_id: str,
+    increments: dict[str, int],
+) -> DBTransaction:
+    """
+    Adds to the totals of the visits to a site on the day a visit was entered, as part of a
+    transaction. The attributes identifying the rollup are set on every update, so that a
+    rollup created by its first update is complete.
+
+    :param transaction: The transaction to add the update to
+    :param site_id: The site visited
+    :param entry_time: The time the visit was entered
+    :param timestamp: The time of the request changing the visit
+    :param user_id: The user making the request
+    :param increments: The totals to add to, mapped to the amount to add
+    :return: The transaction, so that writes may be chained
+    """
+    entry_date = entry_time.date().isoformat()
+    return transaction.update(
+        key=KeySchema(pk=f"{ItemType.SITE_VISIT_ROLLUP.value}#{site_id}", sk=entry_date),
+        update_attributes={
+            "site_id": site_id,
+            "entry_date": entry_date,
+            "#type": ItemType.SITE_VISIT_ROLLUP.value,
+        },
+        last_modified_time=timestamp,
+        last_modified_by=user_id,
+        expression_attribute_names=ROLLUP_ATTRIBUTE_NAMES,
+        increment_attributes=increments,
+    )
+
 
 def create_site_entry(
     table: DBTable[DBSiteVisit],
@@ -50,6 +98,7 @@ def create_site_entry(
     :param employee_id: The id of the employee accompanying the user
     :return: The representation of the site visit in the database
     :raises ResourceConflict: There is already a site visit in the database with the same parameters
+    :raises ConflictException: Other visits kept writing the totals of the day at the same time
     :raises ExternalServiceException: An unexpected error occurs in AWS
     :raises PermissionException: The given table does not have write permissions
     """
@@ -67,14 +116,54 @@ def create_site_entry(
     )
 
     condition = Attr("pk").not_exists() & Attr("sk").not_exists()
+    conflict = ResourceConflict(
+        resource_type=item.type.value, resource_id=str(KeySchema(pk=item.pk, sk=item.sk))
+    )
 
-    try:
-        return table.put(item=item, condition_expression=condition)
-    except ConditionCheckFailed as err:
-        logger.exception(err)
-        raise ResourceConflict(
-            resource_type=item.type.value, resource_id=str(KeySchema(pk=item.pk, sk=item.sk))
-        ) from err
+    # The user is added to the occupants of the site, and the visit to the totals of the
+    # day, along with the visit, which becomes the latest visit of the user
+    transaction = table.transaction().put(item, condition, condition_error=conflict)
+    transaction.put(DBSiteOccupant.from_visit(item))
+    transaction.put(DBLatestSiteVisit.from_visit(item))
+    _rollup_update(
+        transaction,
+        site_id=site_id,
+        entry_time=timestamp,
+        timestamp=timestamp,
+        user_id=user_id,
+        increments={
+            "visits": 1,
+            "acknowledged_visits": int(ack_status),
+            "tracked_visits": int(on_site is not None),
+            "on_site_visits": int(bool(on_site)),
+        },
+    ).execute()
+    return item
+
+
+def _exit_writes(
+    table: DBTable[DBSiteVisit], visit: DBSiteVisit, increments: dict[str, int]
+) -> DBTransaction:
+    """
+    Starts a transaction removing the occupant of an exited visit and updating the totals
+    of the day it was entered. If the transaction fails, exiting again removes the
+    occupant, and rebuilding the rollups of the day corrects its totals
+
+    :param table: The DBTable object to use to access the database. Requires write access
+    :param visit: The visit, as updated by the exit
+    :param increments: The totals of the day to add to, mapped to the amount to add
+    :return: The transaction, so that writes may be chained
+    """
+    occupant = DBSiteOccupant.from_visit(visit)
+    transaction = table.transaction().delete(key=KeySchema(pk=occupant.pk, sk=occupant.sk))
+    return _rollup_update(
+        transaction,
+        site_id=visit.site_id,
+        entry_time=visit.entry_time,
+        timestamp=visit.last_modified_time,
+        user_id=visit.last_modified_by,
+        increments=increments,
+    )
 
 
 def add_exit_time(
@@ -94,6 +183,7 @@ def add_exit_time(
     :param timestamp: The time at which the request for the site exit came in
     :return: The representation of the site visit in the database
     :raises ResourceNotFound: The user has never visited this site before
+    :raises ConflictException: Other visits kept writing the totals of the day at the same time
     :raises ExternalServiceException: An unexpected error occurs in AWS
     :raises PermissionException: The given table does not have write permissions
     """
@@ -102,7 +192,7 @@ def add_exit_time(
     )
 
     try:
-        return table.update(
+        previous = table.update(
             key=key,
             update_attributes={"exit_time": timestamp.isoformat()},
             last_modified_by=user_id,
@@ -110,12 +200,41 @@ def add_exit_time(
             condition_expression=Attr("pk").exists()
             & Attr("sk").exists()
             & Attr("last_modified_time").lt(timestamp.isoformat()),
+            return_old=True,
         )
     except ConditionCheckFailed as err:
         logger.exception(err)
         raise ResourceNotFound(
             resource_type=ItemType.SITE_VISIT.value, resource_id=str(key)
         ) from err
+    visit = previous.model_copy(
+        update={
+            "exit_time": timestamp,
+            "last_modified_by": user_id,
+            "last_modified_time": timestamp,
+        }
+    )
+
+    # A visit exited again only changes its dwell time in the totals of the day
+    dwell_seconds = round((timestamp - visit.entry_time).total_seconds())
+    increments = {"exited_visits": 1, "dwell_seconds": dwell_seconds}
+    if previous.exit_time is not None:
+        previous_dwell = round((previous.exit_time - visit.entry_time).total_seconds())
+        increments = {"exited_visits": 0, "dwell_seconds": dwell_seconds - previous_dwell}
+
+    # The latest visit of the user is only replaced if it is still this visit. The other
+    # writes have no conditions, so a failed condition means the user has entered a site
+    # since, and the writes are made again without it
+    latest_condition = Attr("site_id").eq(site_id) & Attr("entry_time").eq(
+        visit.entry_time.isoformat()
+    )
+    try:
+        _exit_writes(table, visit, increments).put(
+            DBLatestSiteVisit.from_visit(visit), latest_condition
+        ).execute()
+    except ConditionCheckFailed:
+        _exit_writes(table, visit, increments).execute()
+    return visit
 
 
 def get_site_visit(
@@ -140,39 +259,191 @@ def get_site_visit(
     return table.get(key=key)
 
 
+def get_latest_site_visit(table: DBTable[DBLatestSiteVisit], user_id: str) -> DBLatestSiteVisit:
+    """
+    Get the latest site visit of a user from the database, with a single read
+
+    :param table: The DBTable object to use to access the database
+    :param user_id: The user to get the latest visit of
+    :return: The visit most recently entered by the user
+    :raises ResourceNotFound: The user has not entered a site
+    :raises ExternalServiceException: An unexpected error occurs in AWS
+    """
+    return table.get(key=KeySchema(pk=f"{ItemType.LATEST_SITE_VISIT.value}#{user_id}", sk=user_id))
+
+
+def time_range_condition(
+    key_expression: ConditionBase,
+    attribute: str,
+    from_time: Optional[date],
+    to_time: Optional[date],
+) -> ConditionBase:
+    """
+    Limits a query of visits to those with a time within a range. DynamoDB only allows
+    one condition on the range key, so a closed range is given as a single between
+
+    :param key_expression: The condition on the hash key of the query
+    :param attribute: The range key holding the time of each visit
+    :param from_time: The earliest time or date of the visits, if any
+    :param to_time: The latest time or date of the visits, if any
+    :return: The key condition of the query
+    """
+    range_key = Key(attribute)
+    if from_time and to_time:
+        return key_expression & range_key.between(from_time.isoformat(), to_time.isoformat())
+    if from_time:
+        return key_expression & range_key.gte(from_time.isoformat())
+    if to_time:
+        return key_expression & range_key.lte(to_time.isoformat())
+    return key_expression
+
+
 def list_site_visits(
     table: DBTable[DBSiteVisit],
     from_time: Optional[datetime] = None,
     to_time: Optional[datetime] = None,
     limit: Optional[int] = None,
     start_key: Optional[dict] = None,
-) -> tuple[list[DBSiteVisit], Optional[dict]]:
+    time_range: VisitTimeRange = VisitTimeRange.LAST_MODIFIED,
+    projection: Optional[Type[CustomBaseModel]] = None,
+) -> tuple[list[Any], Optional[dict]]:
     """
-    Updates a site visit in the database with its exit time
+    Lists the site visits in the database within a time range
 
-    :param table: The DBTable object to use to access the database. Requires write access
-    :param from_time: All items found in the query must have been last modified after
+    :param table: The DBTable object to use to access the database
+    :param from_time: All items found in the query must have their ranged time after
         this time
-    :param to_time: All items found in the query must have been last modified before
+    :param to_time: All items found in the query must have their ranged time before
         this time
     :param limit: Maximum number of visits to retrieve from the database
-    :param start_key: The key to start getting new visits from
+    :param start_key: The key to start getting new visits from, must come from a list
+        using the same time range
+    :param time_range: The time of each visit to range over, by default the time the
+        visit was last modified. Ranging over the entry time only reads visits entered
+        in the range, no matter when they were last edited
+    :param projection: A partial model of the visits, if given only its attributes are read
     :return: The list of site visits matching the criteria
+    :raises IndexUnavailableException: Ranging over entry times before its index is deployed
     :raises ExternalServiceException: An unexpected error occurs in AWS
     """
+    gsi = GSI.GSI5 if time_range == VisitTimeRange.ENTRY else GSI.GSI1
+    key_expression = time_range_condition(
+        Key("type").eq(ItemType.SITE_VISIT.value), time_range.value, from_time, to_time
+    )
+    return table.query(
+        gsi=gsi,
+        key_condition_expression=key_expression,
+        limit=limit,
+        scan_reverse=True,
+        start_key=start_key,
+        projection=projection,
+    )
 
-    key_expression = Key("type").eq(ItemType.SITE_VISIT.value)
-    if from_time:
-        key_expression = key_expression & Key("last_modified_time").gte(from_time.isoformat())
-    if to_time:
-        key_expression = key_expression & Key("last_modified_time").lte(to_time.isoformat())
+
+def list_visits_for_site(
+    table: DBTable[DBSiteVisit],
+    site_id: str,
+    from_time: Optional[datetime] = None,
+    to_time: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    start_key: Optional[dict] = None,
+    projection: Optional[Type[CustomBaseModel]] = None,
+) -> tuple[list[Any], Optional[dict]]:
+    """
+    Lists the visits to a site, most recently entered first
+
+    :param table: The DBTable object to use to access the database
+    :param site_id: The identifier of the site to list the visits of
+    :param from_time: All visits found must have been entered after this time
+    :param to_time: All visits found must have been entered before this time
+    :param limit: Maximum number of visits to retrieve from the database
+    :param start_key: The key to start getting new visits from
+    :param projection: A partial model of the visits, if given only its attributes are read
+    :return: The list of visits to the site, and the last evaluated key
+    :raises ExternalServiceException: An unexpected error occurs in AWS
+    """
+    key_expression = time_range_condition(
+        Key("visit_site_id").eq(site_id), "entry_time", from_time, to_time
+    )
+    return table.query(
+        gsi=GSI.GSI3,
+        key_condition_expression=key_expression,
+        limit=limit,
+        scan_reverse=True,
+        start_key=start_key,
+        projection=projection,
+    )
+
+
+def list_visits_for_user(
+    table: DBTable[DBSiteVisit],
+    user_id: str,
+    from_time: Optional[datetime] = None,
+    to_time: Optional[datetime] = None,
+    limit: Optional[int] = None,
+    start_key: Optional[dict] = None,
+    projection: Optional[Type[CustomBaseModel]] = None,
+) -> tuple[list[Any], Optional[dict]]:
+    """
+    Lists the visits of a user to any site, most recently entered first
+
+    :param table: The DBTable object to use to access the database
+    :param user_id: The identifier of the user to list the visits of
+    :param from_time: All visits found must have been entered after this time
+    :param to_time: All visits found must have been entered before this time
+    :param limit: Maximum number of visits to retrieve from the database
+    :param start_key: The key to start getting new visits from
+    :param projection: A partial model of the visits, if given only its attributes are read
+    :return: The list of visits by the user, and the last evaluated key
+    :raises ExternalServiceException: An unexpected error occurs in AWS
+    """
+    key_expression = time_range_condition(
+        Key("visit_user_id").eq(user_id), "entry_time", from_time, to_time
+    )
     return table.query(
-        gsi=GSI.GSI1,
+        gsi=GSI.GSI4,
         key_condition_expression=key_expression,
         limit=limit,
         scan_reverse=True,
         start_key=start_key,
+        projection=projection,
+    )
+
+
+def list_site_visit_rollups(
+    table: DBTable[DBSiteVisitRollup],
+    site_id: str,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+) -> list[DBSiteVisitRollup]:
+    """
+    Lists the totals of the visits to a site for each day visits were entered on
+
+    :param table: The DBTable object to use to access the database
+    :param site_id: The identifier of the site to list the totals of
+    :param from_date: The first day to list the totals of
+    :param to_date: The last day to list the totals of
+    :return: The totals of each day with visits, in order of day
+    :raises ExternalServiceException: An unexpected error occurs in AWS
+    """
+    key_expression = time_range_condition(
+        Key("pk").eq(f"{ItemType.SITE_VISIT_ROLLUP.value}#{site_id}"), "sk", from_date, to_date
     )
+    return list(table.iter_query(key_condition_expression=key_expression))
+
+
+def list_site_occupants(table: DBTable[DBSiteOccupant], site_id: str) -> list[DBSiteOccupant]:
+    """
+    Lists the users currently on a site, those with a visit to the site that has not
+    been exited
+
+    :param table: The DBTable object to use to access the database
+    :param site_id: The identifier of the site to list the occupants of
+    :return: The occupants of the site, in order of user and entry time
+    :raises ExternalServiceException: An unexpected error occurs in AWS
+    """
+    key_expression = Key("pk").eq(f"{ItemType.SITE_OCCUPANT.value}#{site_id}")
+    return list(table.iter_query(key_condition_expression=key_expression))
 
 
 def create_file_attachment(
@@ -198,6 +469,9 @@ def create_file_attachment(
     :raises ResourceConflict: An attachment with the same name exists for the visit
     :raises LimitExceeded: Only 10 attachments can be uploaded to a site visit,
         so this error is raised, when this limit is exceeded
+    :raises ResourceNotFound: The site visit does not exist
+    :raises TimeConsistencyException: In the time since this update was requested, a new
+        update has been made to the entry
     :raises ExternalServiceException: An unexpected error occurs in AWS
     :raises PermissionException: The given table does not have write permissions
     """
@@ -205,26 +479,14 @@ def create_file_attachment(
     sk = entry_time.isoformat()
     key = KeySchema(pk=pk, sk=sk)
 
-    # Condition expression in the high-level boto3 dynamodb resource don't allow for the use
-    # of expression attribute names in the condition. This means if the name of an attribute
-    # contains a ".", then it won't work in the condition expression as "." is reserved to
-    # access members of a map.
-    # This means that we can't check that a name exists in the attachments map from the
-    # condition expression. Instead getting it here to do the check.
-    existing_item = table.get(key=key)
-
-    if name in existing_item.attachments:
-        logger.info(f"Attachment [{name}] already exists for visit [{str(key)}]")
-        raise ResourceConflict(resource_type="file_attachment", resource_id=name)
-
-    # There is also an added check here to see that the item hasn't been modified
-    # since we got it earlier, so we know that no changes have been made in between
+    # "#key" is an alias for the name of the attachment, as names may contain ".", which
+    # would otherwise be read as accessing a member of a map
     condition = (
         Attr("pk").exists()
         & Attr("sk").exists()
-        & (Attr("attachments").not_exists() | Attr("attachments").size().lt(10))
+        & Attr("attachments.#key").not_exists()
+        & (Attr("attachments").not_exists() | Attr("attachments").size().lt(ATTACHMENT_LIMIT))
         & Attr("last_modified_time").lt(timestamp.isoformat())
-        & Attr("last_modified_time").lte(existing_item.last_modified_time.isoformat())
     )
 
     try:
@@ -240,7 +502,14 @@ def create_file_attachment(
         )
     except ConditionCheckFailed as err:
         logger.exception(err)
-        raise LimitExceeded(resource_type="file_attachment", limit=10) from err
+        # The visit is only read to find out which part of the condition failed
+        existing_visit = table.get(key=key)
+        if name in existing_visit.attachments:
+            logger.info(f"Attachment [{name}] already exists for visit [{str(key)}]")
+            raise ResourceConflict(resource_type="file_attachment", resource_id=name) from err
+        if len(existing_visit.attachments) >= ATTACHMENT_LIMIT:
+            raise LimitExceeded(resource_type="file_attachment", limit=ATTACHMENT_LIMIT) from err
+        raise TimeConsistencyException(key=str(key), timestamp=timestamp) from err
 
 
 def delete_file_attachment(
@@ -263,6 +532,7 @@ def delete_file_attachment(
     :param timestamp: The time at which the request for the site exit came in
     :param name: The display name of the attachment
     :return: The representation of the attachment in the database
+    :raises ResourceNotFound: The site visit does not exist
     :raises TimeConsistencyException: In the time since this update was requested, a new
         update has been made to the entry. Not sure whether to proceed with update
     :raises ExternalServiceException: An unexpected error occurs in AWS
@@ -272,18 +542,15 @@ def delete_file_attachment(
     sk = entry_time.isoformat()
     key = KeySchema(pk=pk, sk=sk)
 
-    existing_visit = table.get(key=key)
-    s3_key = existing_visit.attachments.get(name)
-
     condition = (
         Attr("pk").exists()
         & Attr("sk").exists()
         & Attr("last_modified_time").lt(timestamp.isoformat())
-        & Attr("last_modified_time").lte(existing_visit.last_modified_time.isoformat())
     )
 
     try:
-        new_visit = table.update(
+        # The visit as it was before the update gives the key of the removed attachment
+        existing_visit = table.update(
             key=key,
             update_attributes={"attachments.#key": None},
             expression_attribute_names={
@@ -292,15 +559,28 @@ def delete_file_attachment(
             last_modified_time=timestamp,
             last_modified_by=user_id,
             condition_expression=condition,
+            return_old=True,
         )
     except ConditionCheckFailed as err:
         logger.exception(err)
+        # The visit is only read to tell a missing visit from a newer update
+        table.get(key=key)
         raise TimeConsistencyException(key=str(key), timestamp=timestamp) from err
 
+    attachments = dict(existing_visit.attachments)
+    s3_key = attachments.pop(name, None)
     if s3_key:
-        bucket.delete(key=s3_key)
-
-    return new_visit
+        # The attachment is already removed from the visit, so an object that can't be
+        # deleted is left behind and logged, rather than failing the request
+        bucket.delete_many([(s3_key, None)])
+
+    return existing_visit.model_copy(
+        update={
+            "attachments": attachments,
+            "last_modified_by": user_id,
+            "last_modified_time": timestamp,
+        }
+    )
 
 
 def update_visit_details(
@@ -0,0 +1,374 @@
+"""
+Exports site visits to a gzip compressed file in S3, for audits covering more visits than
+can be listed in a single request
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import UTC, datetime, timedelta
+from typing import Callable, Iterator, Optional
+from uuid import uuid4
+
+from aws_lambda_powertools.logging import Logger
+from boto3.dynamodb.conditions import Attr, ConditionBase, Key
+
+from ..database.db_table import GSI, DBTable, KeySchema, QueryCursor
+from ..exceptions import ConditionCheckFailed, ResourceConflict
+from ..file_storage.s3_bucket import MULTIPART_MIN_PART_SIZE, S3Bucket
+from ..models.db.site_visit import DBSiteVisit, DBVisitExport
+from ..util import ExportFormat, ExportStatus, ItemType
+from .site_visits import time_range_condition
+
+logger = Logger()
+
+EXPORT_PART_SIZE = MULTIPART_MIN_PART_SIZE
+# Size in bytes of compressed visits collected before they are uploaded as a part
+
+EXPORT_PAGE_SIZE = 500
+# Number of visits read from the database per request when exporting
+
+EXPORT_TIME_MARGIN_SECONDS = 3
+# Time left in the invocation below which an export stops, to be continued later
+
+EXPORT_KEY_PREFIX = "exports/site_visits"
+# Prefix of the keys of exported files in S3
+
+EXPORT_COLUMNS = (
+    "site_id",
+    "user_id",
+    "user_email",
+    "employee_id",
+    "entry_time",
+    "exit_time",
+    "allowed_tracking",
+    "ack_status",
+    "work_order",
+    "on_site",
+    "description",
+    "attachments",
+)
+# The fields of each exported visit, in the order of the columns of a CSV export
+
+
+def _export_row(visit: DBSiteVisit) -> dict:
+    """
+    The fields of a visit as they are exported. Attachments are given by name, as links
+    to them would expire long before an export is read
+
+    :param visit: The visit to export
+    :return: The value of each exported field, in the order of EXPORT_COLUMNS
+    """
+    return {
+        "site_id": visit.site_id,
+        "user_id": visit.user_id,
+        "user_email": visit.user_email,
+        "employee_id": visit.employee_id,
+        "entry_time": visit.entry_time.isoformat(),
+        "exit_time": visit.exit_time.isoformat() if visit.exit_time else None,
+        "allowed_tracking": visit.loc_tracking,
+        "ack_status": visit.ack_status,
+        "work_order": visit.work_order,
+        "on_site": visit.on_site,
+        "description": visit.description,
+        "attachments": sorted(visit.attachments),
+    }
+
+
+class ExportPart:
+    """
+    A part of an export file, compressed as visits are written to it. Each part is a
+    complete gzip member, and a gzip file may be made of many members, so no compression
+    state is kept between parts and an export can be continued by another invocation.
+    """
+
+    def __init__(self, export_format: str, header: bool, pending: bytes = b""):
+        """
+        Create a part
+
+        :param export_format: The format of the export file
+        :param header: Whether the part begins with the header of the file
+        :param pending: Compressed visits already in the part, written by an earlier invocation
+        """
+        self._export_format = export_format
+        self._compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+        self._data = bytearray(pending)
+        if header and export_format == ExportFormat.CSV.value:
+            self._write_line(",".join(EXPORT_COLUMNS))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _write_line(self, line: str) -> None:
+        self._data += self._compressor.compress((line + "\n").encode("utf-8"))
+
+    def write(self, visit: DBSiteVisit) -> None:
+        """
+        Write a visit to the part as a line of the export file
+
+        :param visit: The visit to write
+        """
+        row = _export_row(visit)
+        if self._export_format == ExportFormat.NDJSON.value:
+            self._write_line(json.dumps(row))
+            return
+        row["attachments"] = ", ".join(row["attachments"])
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="").writerow(row.values())
+        self._write_line(buffer.getvalue())
+
+    def close(self) -> bytes:
+        """
+        Finish compressing the part
+
+        :return: The compressed part, ready to be uploaded
+        """
+        self._data += self._compressor.flush()
+        return bytes(self._data)
+
+
+def start_visit_export(
+    export_table: DBTable[DBVisitExport],
+    bucket: S3Bucket,
+    export_format: ExportFormat,
+    timestamp: datetime,
+    user_id: str,
+    from_time: Optional[datetime] = None,
+    to_time: Optional[datetime] = None,
+    site_id: Optional[str] = None,
+) -> DBVisitExport:
+    """
+    Starts an export of the visits entered within a time range, without exporting any
+    visits. The export is carried out by continue_visit_export.
+
+    :param export_table: The DBTable object to use when creating the export. Requires
+        write access
+    :param bucket: The bucket to upload the export to. Requires write access
+    :param export_format: The format of the exported file
+    :param timestamp: The time at which the request to export was issued
+    :param user_id: The user who issued the request to export
+    :param from_time: Only visits entered after this time are exported
+    :param to_time: Only visits entered before this time are exported
+    :param site_id: Only visits to this site are exported, if given
+    :return: The newly created export
+    :raises ExternalServiceException: An unexpected error occurs in AWS
+    :raises PermissionException: The given table or bucket does not have write permissions
+    """
+    export_id = uuid4().hex
+    s3_key = f"{EXPORT_KEY_PREFIX}/site_visits_{export_id}.{export_format.value}.gz"
+    export = DBVisitExport(
+        last_modified_by=user_id,
+        last_modified_time=timestamp,
+        export_id=export_id,
+        export_format=export_format,
+        status=ExportStatus.IN_PROGRESS,
+        s3_key=s3_key,
+        upload_id=bucket.start_multipart_upload(key=s3_key, content_type="application/gzip"),
+        from_time=from_time,
+        to_time=to_time,
+        site_id=site_id,
+    )
+    return export_table.put(
+        item=export, condition_expression=Attr("pk").not_exists() & Attr("sk").not_exists()
+    )
+
+
+def get_visit_export(export_table: DBTable[DBVisitExport], export_id: str) -> DBVisitExport:
+    """
+    Get an export of site visits from the database
+
+    :param export_table: The table to use when getting the export
+    :param export_id: The unique identifier of the export
+    :return: The export with the given id
+    :raises ResourceNotFound: No export with the given id exists
+    :raises ExternalServiceException: An unexpected error occurs in AWS
+    """
+    return export_table.get(key=KeySchema(pk=ItemType.VISIT_EXPORT.value, sk=export_id))
+
+
+def _iter_export_visits(
+    visit_table: DBTable[DBSiteVisit], export: DBVisitExport, cursor: QueryCursor
+) -> Iterator[DBSiteVisit]:
+    """
+    Reads the visits of an export, after the last visit already exported
+
+    :param visit_table: The DBTable object to use to read the visits
+    :param export: The export to read the visits of
+    :param cursor: The cursor to read from, updated with each visit read
+    :return: An iterator over the visits still to be exported, in order of entry time
+    :raises ExternalServiceException: An unexpected error occurs in AWS
+    """
+    if export.site_id:
+        gsi = GSI.GSI3
+        key_expression = Key("visit_site_id").eq(export.site_id)
+    else:
+        gsi = GSI.GSI5
+        key_expression = Key("type").eq(ItemType.SITE_VISIT.value)
+    return visit_table.iter_query(
+        gsi=gsi,
+        key_condition_expression=time_range_condition(
+            key_expression, "entry_time", export.from_time, export.to_time
+        ),
+        page_size=EXPORT_PAGE_SIZE,
+        cursor=cursor,
+    )
+
+
+def _pending_key(export: DBVisitExport) -> str:
+    """
+    The key of the object holding the visits written since the last part of an export
+
+    :param export: The export the visits belong to
+    :return: The key of the pending object in S3
+    """
+    return f"{export.s3_key}.pending"
+
+
+def _save_export(
+    export_table: DBTable[DBVisitExport],
+    export: DBVisitExport,
+    updated: DBVisitExport,
+    condition_expression: Optional[ConditionBase] = None,
+) -> DBVisitExport:
+    """
+    Saves the progress of an export. Exports are only saved by the invocation that last
+    read them, so two invocations cannot continue the same export at once.
+
+    :param export_table: The DBTable object to use when saving the export
+    :param export: The export as it was read
+    :param updated: The export with its progress
+    :param condition_expression: A further condition that must be met to save the export
+    :return: The saved export
+    :raises ResourceConflict: The export was saved by another invocation, or the further
+        condition was not met
+    """
+    condition = Attr("last_modified_time").eq(export.last_modified_time.isoformat())
+    if condition_expression:
+        condition &= condition_expression
+    try:
+        return export_table.put(item=updated, condition_expression=condition)
+    except ConditionCheckFailed as err:
+        logger.exception(err)
+        raise ResourceConflict(
+            resource_type=export.type.value, resource_id=str(KeySchema(pk=export.pk, sk=export.sk))
+        ) from err
+
+
+def _claim_export(
+    export_table: DBTable[DBVisitExport],
+    export: DBVisitExport,
+    timestamp: datetime,
+    time_remaining: Callable[[], float],
+) -> DBVisitExport:
+    """
+    Claims an export for the invocation continuing it, before any of the export is
+    uploaded. The claim lasts until the invocation runs out of time, so an invocation which
+    reads the export after it was claimed cannot upload parts of it at the same time. The
+    claim is released when the invocation saves the export for the last time.
+
+    :param export_table: The DBTable object to use when saving the export
+    :param export: The export as it was read
+    :param timestamp: The time at which the request continuing the export was issued
+    :param time_remaining: Gives the number of seconds left in the invocation
+    :return: The claimed export
+    :raises ResourceConflict: The export was saved or claimed by another invocation
+    """
+    claimed_until = datetime.now(UTC) + timedelta(seconds=time_remaining())
+    unclaimed = Attr("claimed_until").not_exists() | Attr("claimed_until").lt(timestamp.isoformat())
+    claimed = export.model_copy(
+        update={"last_modified_time": timestamp, "claimed_until": claimed_until}
+    )
+    return _save_export(export_table, export, claimed, unclaimed)
+
+
+def continue_visit_export(
+    visit_table: DBTable[DBSiteVisit],
+    export_table: DBTable[DBVisitExport],
+    bucket: S3Bucket,
+    export: DBVisitExport,
+    timestamp: datetime,
+    time_remaining: Callable[[], float],
+) -> DBVisitExport:
+    """
+    Exports visits until every visit is exported, or the invocation is about to run out
+    of time. Visits are read a page at a time and compressed as they are read, with at most
+    one part of the file held in memory. Progress is saved with each part uploaded, and
+    when the invocation stops, so that the export can be continued from the last visit
+    written.
+
+    :param visit_table: The DBTable object to use to read the visits
+    :param export_table: The DBTable object to use when saving the export. Requires
+        write access
+    :param bucket: The bucket to upload the export to. Requires write access
+    :param export: The export to continue
+    :param timestamp: The time at which the request continuing the export was issued
+    :param time_remaining: Gives the number of seconds left in the invocation
+    :return: The export, complete if every visit was exported
+    :raises ResourceConflict: The export is claimed or was saved by another invocation
+    :raises ResourceNotFound: The upload of the export was aborted
+    :raises ExternalServiceException: An unexpected error occurs in AWS
+    :raises PermissionException: The given table or bucket does not have write permissions
+    """
+    if export.status == ExportStatus.COMPLETE.value:
+        return export
+
+    export = _claim_export(export_table, export, timestamp, time_remaining)
+    pending = bucket.get_object(_pending_key(export)) if export.pending_size else b""
+    part = ExportPart(export.export_format, header=not (export.parts or pending), pending=pending)
+    parts = list(export.parts)
+    cursor = QueryCursor(last_key=export.last_key)
+    visits_exported = export.visits_exported
+
+    def progress(**update) -> DBVisitExport:
+        return export.model_copy(
+            update={
+                "parts": parts,
+                "last_key": cursor.last_key,
+                "visits_exported": visits_exported,
+                "last_modified_time": timestamp,
+                **update,
+            }
+        )
+
+    for visit in _iter_export_visits(visit_table, export, cursor):
+        part.write(visit)
+        visits_exported += 1
+        if len(part) >= EXPORT_PART_SIZE:
+            parts.append(
+                bucket.upload_part(
+                    key=export.s3_key,
+                    upload_id=export.upload_id,
+                    part_number=len(parts) + 1,
+                    body=part.close(),
+                )
+            )
+            export = _save_export(export_table, export, progress(pending_size=0))
+            part = ExportPart(export.export_format, header=False)
+        if time_remaining() < EXPORT_TIME_MARGIN_SECONDS:
+            # Parts must be at least the minimum part size, so the visits written since the
+            # last part are kept until the export is continued
+            pending = part.close()
+            bucket.put_object(key=_pending_key(export), body=pending)
+            return _save_export(
+                export_table, export, progress(pending_size=len(pending), claimed_until=None)
+            )
+
+    # The last part may be smaller than the minimum part size
+    parts.append(
+        bucket.upload_part(
+            key=export.s3_key,
+            upload_id=export.upload_id,
+            part_number=len(parts) + 1,
+            body=part.close(),
+        )
+    )
+    bucket.complete_multipart_upload(key=export.s3_key, upload_id=export.upload_id, e_tags=parts)
+    bucket.delete(key=_pending_key(export))
+    return _save_export(
+        export_table,
+        export,
+        progress(
+            status=ExportStatus.COMPLETE.value, last_key=None, pending_size=0, claimed_until=None
+        ),
+    )
@@ -0,0 +1,434 @@
+"""
+Computes statistics of site visits on the server, reading visits one page at a time so
+that memory use grows with the number of groups rather than the number of visits
+"""
+
+from datetime import date, datetime, time, timedelta, timezone
+from math import ceil, exp, floor, log
+from typing import Iterable, Optional
+
+from aws_lambda_powertools.logging import Logger
+from boto3.dynamodb.conditions import Attr, Key
+
+from ..database.db_table import GSI, DBTable
+from ..exceptions import BadRequestException, ConditionCheckFailed
+from ..models.api.site_visit import APISiteVisitStats
+from ..models.db.db_base import DBItemKey
+from ..models.db.site_visit import DBSiteVisit, DBSiteVisitRollup, DBSiteVisitSummary
+from ..util import ItemType
+from .site_visits import list_site_visit_rollups, time_range_condition
+
+logger = Logger()
+
+DWELL_BUCKET_GROWTH = 1.02
+# Ratio between the bounds of consecutive dwell time buckets, so estimated
+# percentiles are within 1% of the dwell time of a visit in the percentile
+
+STATS_PAGE_SIZE = 500
+# Number of visits read from the database per request when computing statistics
+
+STATS_MAX_DAYS = 92
+# Maximum number of days of visits read by a single request for statistics
+
+ROLLUP_REBUILD_MAX_DAYS = 92
+# Maximum number of days of rollups rebuilt by a single request
+
+ROLLUP_REBUILD_ATTEMPTS = 3
+# Number of times the rollup of a day is rebuilt while visits to the day keep changing it
+
+ROLLUP_TOTALS = {
+    "visits",
+    "exited_visits",
+    "acknowledged_visits",
+    "tracked_visits",
+    "on_site_visits",
+    "dwell_seconds",
+}
+# Attributes of a rollup which are totals of its visits
+
+
+class DwellHistogram:
+    """
+    A histogram of dwell times in buckets that grow geometrically in size. The number of
+    buckets grows with the log of the longest dwell time rather than with the number of
+    visits, while percentiles are estimated with a bounded relative error.
+    """
+
+    def __init__(self, growth: float = DWELL_BUCKET_GROWTH):
+        """
+        Create an empty histogram
+
+        :param growth: The ratio between the bounds of consecutive buckets
+        """
+        self._log_growth = log(growth)
+        self._buckets: dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds: float) -> None:
+        """
+        Add a dwell time to the histogram
+
+        :param seconds: The dwell time in seconds, times under a second are counted as a second
+        """
+        seconds = max(seconds, 1.0)
+        bucket = floor(log(seconds) / self._log_growth)
+        self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+
+    def mean(self) -> Optional[float]:
+        """
+        The exact mean of the dwell times
+
+        :return: The mean dwell time in seconds, or None if the histogram is empty
+        """
+        return self.total / self.count if self.count else None
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """
+        Estimate a percentile of the dwell times, as the geometric middle of the bucket
+        it falls in
+
+        :param percentile: The percentile to estimate, between 0 and 1
+        :return: The estimated dwell time in seconds, or None if the histogram is empty
+        """
+        rank = max(ceil(percentile * self.count), 1)
+        seen = 0
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if seen >= rank:
+                return exp((bucket + 0.5) * self._log_growth)
+        return None
+
+
+class VisitStatsGroup:
+    """
+    Running totals of the visits to a site entered on a single day
+    """
+
+    def __init__(self, site_id: str, day: date):
+        """
+        Create a group with no visits
+
+        :param site_id: The site visited
+        :param day: The day the visits were entered
+        """
+        self.site_id = site_id
+        self.day = day
+        self.visits = 0
+        self.acknowledged = 0
+        self.tracked = 0
+        self.on_site = 0
+        self.dwell_seconds = 0
+        self.dwell = DwellHistogram()
+
+    def add(self, visit: DBSiteVisitSummary) -> None:
+        """
+        Add a visit to the totals of the group
+
+        :param visit: The visit to add
+        """
+        self.visits += 1
+        if visit.ack_status:
+            self.acknowledged += 1
+        if visit.on_site is not None:
+            self.tracked += 1
+            if visit.on_site:
+                self.on_site += 1
+        if visit.exit_time is not None:
+            dwell = (visit.exit_time - visit.entry_time).total_seconds()
+            self.dwell_seconds += round(dwell)
+            self.dwell.add(dwell)
+
+    def to_api_model(self) -> APISiteVisitStats:
+        """
+        The statistics of the group as an API model
+
+        :return: The statistics of the visits in the group
+        """
+        return APISiteVisitStats(
+            site_id=self.site_id,
+            day=self.day,
+            visits=self.visits,
+            exited_visits=self.dwell.count,
+            ack_rate=self.acknowledged / self.visits,
+            on_site_rate=self.on_site / self.tracked if self.tracked else None,
+            mean_dwell_seconds=self.dwell.mean(),
+            p50_dwell_seconds=self.dwell.percentile(0.5),
+            p90_dwell_seconds=self.dwell.percentile(0.9),
+            p99_dwell_seconds=self.dwell.percentile(0.99),
+        )
+
+    def to_rollup(self, timestamp: datetime, user_id: str) -> DBSiteVisitRollup:
+        """
+        The totals of the group as a rollup item
+
+        :param timestamp: The time the rollup is written
+        :param user_id: The user writing the rollup
+        :return: The rollup of the visits in the group
+        """
+        return DBSiteVisitRollup(
+            last_modified_by=user_id,
+            last_modified_time=timestamp,
+            site_id=self.site_id,
+            entry_date=self.day,
+            visits=self.visits,
+            exited_visits=self.dwell.count,
+            acknowledged_visits=self.acknowledged,
+            tracked_visits=self.tracked,
+            on_site_visits=self.on_site,
+            dwell_seconds=self.dwell_seconds,
+        )
+
+
+def _group_visits(visits: Iterable[DBSiteVisitSummary]) -> list[VisitStatsGroup]:
+    """
+    Adds visits to the totals of the site and day they were entered, consuming the
+    visits one at a time
+
+    :param visits: The visits to group
+    :return: The totals of each group, ordered by site then day
+    """
+    groups: dict[tuple[str, date], VisitStatsGroup] = {}
+    for visit in visits:
+        key = (visit.site_id, visit.entry_time.date())
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = VisitStatsGroup(*key)
+        group.add(visit)
+    return [groups[key] for key in sorted(groups)]
+
+
+def summarize_visits(visits: Iterable[DBSiteVisitSummary]) -> list[APISiteVisitStats]:
+    """
+    Computes the statistics of visits grouped by site and the day they were entered,
+    consuming the visits one at a time
+
+    :param visits: The visits to compute the statistics of
+    :return: The statistics of each group, ordered by site then day
+    """
+    return [group.to_api_model() for group in _group_visits(visits)]
+
+
+def _iter_visit_summaries(
+    table: DBTable,
+    from_time: Optional[datetime],
+    to_time: Optional[datetime],
+    site_id: Optional[str],
+) -> Iterable[DBSiteVisitSummary]:
+    """
+    Reads the visits entered within a time range, with only the attributes needed for
+    statistics, one page at a time
+
+    :param table: The DBTable object to use to access the database
+    :param from_time: Only visits entered after this time are read
+    :param to_time: Only visits entered before this time are read
+    :param site_id: Only visits to this site are read, if given
+    :return: An iterator over the visits
+    :raises ExternalServiceException: An unexpected error occurs in AWS
+    """
+    if site_id:
+        gsi = GSI.GSI3
+        key_expression = Key("visit_site_id").eq(site_id)
+    else:
+        gsi = GSI.GSI5
+        key_expression = Key("type").eq(ItemType.SITE_VISIT.value)
+    return table.iter_query(
+        gsi=gsi,
+        key_condition_expression=time_range_condition(
+            key_expression, "entry_time", from_time, to_time
+        ),
+        page_size=STATS_PAGE_SIZE,
+        projection=DBSiteVisitSummary,
+    )
+
+
+def get_site_visit_stats(
+    table: DBTable[DBSiteVisit],
+    from_time: Optional[datetime],
+    to_time: Optional[datetime],
+    site_id: Optional[str] = None,
+) -> list[APISiteVisitStats]:
+    """
+    Computes the statistics of the visits entered within a time range, grouped by site and
+    the day they were entered. Only the attributes needed for the statistics are read, and
+    visits are dropped once added to the totals of their group. The range is required and
+    bounded, longer periods are read from the daily rollups instead.
+
+    :param table: The DBTable object to use to access the database
+    :param from_time: Only visits entered after this time are included
+    :param to_time: Only visits entered before this time are included
+    :param site_id: Only visits to this site are included, if given
+    :return: The statistics of each group, ordered by site then day
+    :raises BadRequestException: The time range is missing, empty or too long
+    :raises ExternalServiceException: An unexpected error occurs in AWS
+    """
+    if from_time is None or to_time is None:
+        raise BadRequestException("Both from_time and to_time are required for statistics")
+    if not timedelta() <= to_time - from_time <= timedelta(days=STATS_MAX_DAYS):
+        raise BadRequestException(
+            f"Can only compute statistics over at most {STATS_MAX_DAYS} days of visits"
+        )
+
+    return summarize_visits(_iter_visit_summaries(table, from_time, to_time, site_id))
+
+
+def _rollup_site_ids(table: DBTable, site_id: Optional[str]) -> list[str]:
+    """
+    The sites whose rollups are rebuilt
+
+    :param table: The DBTable object to use to access the database
+    :param site_id: The site to rebuild the rollups of, if not given every site is rebuilt
+    :return: The identifiers of the sites
+    :raises ExternalServiceException: An unexpected error occurs in AWS
+    """
+    if site_id:
+        return [site_id]
+    sites = table.iter_query(
+        key_condition_expression=Key("pk").eq(ItemType.SITE.value), projection=DBItemKey
+    )
+    return [site.sk for site in sites]
+
+
+def _read_rollups(
+    table: DBTable[DBSiteVisitRollup], site_ids: Iterable[str], from_date: date, to_date: date
+) -> dict[tuple[str, date], DBSiteVisitRollup]:
+    """
+    Reads the existing rollups of sites for a range of days
+
+    :param table: The DBTable object to use to access the database
+    :param site_ids: The sites to read the rollups of
+    :param from_date: The first day to read the rollups of
+    :param to_date: The last day to read the rollups of
+    :return: The rollups, mapped by their site and day
+    :raises ExternalServiceException: An unexpected error occurs in AWS
+    """
+    return {
+        (rollup.site_id, rollup.entry_date): rollup
+        for site_id in site_ids
+        for rollup in list_site_visit_rollups(table, site_id, from_date, to_date)
+    }
+
+
+def _replace_rollup(
+    table: DBTable[DBSiteVisitRollup],
+    group: VisitStatsGroup,
+    existing: Optional[DBSiteVisitRollup],
+    timestamp: datetime,
+    user_id: str,
+) -> Optional[DBSiteVisitRollup]:
+    """
+    Replaces the rollup of a site and day with the totals of its visits. The rollup must be
+    read before the visits are counted, and is only replaced if it is unchanged since, so
+    that totals added by visits entered or exited in the meantime are not overwritten.
+
+    :param table: The DBTable object to use to access the database. Requires write access
+    :param group: The totals of the visits to the site on the day, empty if it had none
+    :param existing: The rollup of the site and day as read before the visits were counted
+    :param timestamp: The time at which the request to rebuild the rollup was issued
+    :param user_id: The user who issued the request to rebuild the rollup
+    :return: The rollup as left in the database, or None if it changed since it was read
+    :raises ExternalServiceException: An unexpected error occurs in AWS
+    :raises PermissionException: The given table does not have write permissions
+    """
+    rollup = group.to_rollup(timestamp, user_id)
+    if existing is None:
+        condition = Attr("pk").not_exists()
+    elif existing.model_dump(include=ROLLUP_TOTALS) == rollup.model_dump(include=ROLLUP_TOTALS):
+        return existing
+    else:
+        condition = Attr("last_modified_time").eq(existing.model_dump()["last_modified_time"])
+
+    try:
+        return table.put(rollup, condition_expression=condition)
+    except ConditionCheckFailed:
+        return None
+
+
+def _rebuild_day(
+    table: DBTable[DBSiteVisitRollup], site_id: str, day: date, timestamp: datetime, user_id: str
+) -> Optional[DBSiteVisitRollup]:
+    """
+    Rebuilds the rollup of a site for a single day which changed while it was rebuilt,
+    reading the rollup again before counting the visits of the day on each attempt
+
+    :param table: The DBTable object to use to access the database. Requires write access
+    :param site_id: The site to rebuild the rollup of
+    :param day: The day to rebuild the rollup of
+    :param timestamp: The time at which the request to rebuild the rollup was issued
+    :param user_id: The user who issued the request to rebuild the rollup
+    :return: The rebuilt rollup, or None if visits to the day kept changing it
+    :raises ExternalServiceException: An unexpected error occurs in AWS
+    :raises PermissionException: The given table does not have write permissions
+    """
+    for _ in range(ROLLUP_REBUILD_ATTEMPTS):
+        existing = _read_rollups(table, [site_id], day, day).get((site_id, day))
+        group = VisitStatsGroup(site_id, day)
+        for visit in _iter_visit_summaries(
+            table,
+            from_time=datetime.combine(day, time.min, tzinfo=timezone.utc),
+            to_time=datetime.combine(day, time.max, tzinfo=timezone.utc),
+            site_id=site_id,
+        ):
+            group.add(visit)
+        rollup = _replace_rollup(table, group, existing, timestamp, user_id)
+        if rollup is not None:
+            return rollup
+
+    logger.warning(f"Rollup of site [{site_id}] on [{day}] changed on every rebuild attempt")
+    return None
+
+
+def rebuild_site_visit_rollups(
+    table: DBTable[DBSiteVisitRollup],
+    from_date: date,
+    to_date: date,
+    timestamp: datetime,
+    user_id: str,
+    site_id: Optional[str] = None,
+) -> list[DBSiteVisitRollup]:
+    """
+    Rebuilds the rollups of whole days from the visits entered on them. Days with visits
+    are given the totals of their visits, and existing rollups of days without visits are
+    reset to zero. Rollups changed by visits entered or exited while they are rebuilt are
+    rebuilt again rather than overwritten. Visits are read from an eventually consistent
+    index, so days that are over should be rebuilt.
+
+    :param table: The DBTable object to use to access the database. Requires write access
+    :param from_date: The first day to rebuild the rollups of
+    :param to_date: The last day to rebuild the rollups of
+    :param timestamp: The time at which the request to rebuild the rollups was issued
+    :param user_id: The user who issued the request to rebuild the rollups
+    :param site_id: Only the rollups of this site are rebuilt, if given
+    :return: The rebuilt rollups, ordered by site then day
+    :raises BadRequestException: The range of days is empty or too long
+    :raises ExternalServiceException: An unexpected error occurs in AWS
+    :raises PermissionException: The given table does not have write permissions
+    """
+    days = (to_date - from_date).days + 1
+    if not 0 < days <= ROLLUP_REBUILD_MAX_DAYS:
+        raise BadRequestException(
+            f"Can only rebuild between 1 and {ROLLUP_REBUILD_MAX_DAYS} days of rollups"
+        )
+
+    # The existing rollups are read before the visits are counted, so that a rollup which
+    # changes while it is rebuilt fails the condition on its replacement
+    existing = _read_rollups(table, _rollup_site_ids(table, site_id), from_date, to_date)
+    visits = _iter_visit_summaries(
+        table,
+        from_time=datetime.combine(from_date, time.min, tzinfo=timezone.utc),
+        to_time=datetime.combine(to_date, time.max, tzinfo=timezone.utc),
+        site_id=site_id,
+    )
+    groups = {(group.site_id, group.day): group for group in _group_visits(visits)}
+
+    rollups = []
+    for key in sorted(existing.keys() | groups.keys()):
+        group = groups.get(key) or VisitStatsGroup(*key)
+        rollup = _replace_rollup(table, group, existing.get(key), timestamp, user_id)
+        if rollup is None:
+            rollup = _rebuild_day(table, *key, timestamp=timestamp, user_id=user_id)
+        if rollup is not None:
+            rollups.append(rollup)
+    return rollups
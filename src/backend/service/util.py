@@ -4,9 +4,11 @@ Generic utility functions common across modules
 
 import base64
 import json
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timezone
 from enum import Enum
-from typing import Optional
+from threading import Lock
+from typing import Optional, Type
 
 import boto3
 from aws_lambda_powertools.event_handler import Response
@@ -17,11 +19,14 @@ from aws_lambda_powertools.event_handler.openapi.types import (
 )
 from aws_lambda_powertools.logging import Logger
 from botocore.config import Config
+from botocore.credentials import RefreshableCredentials
 from botocore.exceptions import ClientError
-from cachetools.func import ttl_cache
+from botocore.session import get_session
+from cachetools.func import lru_cache
 from pydantic import BaseModel
 
 from .exceptions import (
+    BadRequestException,
     ExternalServiceException,
     InsufficientUserPermissionException,
     PermissionException,
@@ -36,6 +41,18 @@ CORS_HEADERS = {
     "Access-Control-Allow-Methods": "POST, GET, PUT, PATCH, DELETE",
 }
 
+ROLE_SESSION_DURATION_SECONDS = 30 * 60
+# How long the credentials of an assumed role remain valid for
+
+ROLE_MANDATORY_REFRESH_SECONDS = 5 * 60
+# How long before expiry that requests must block until the credentials of a role are refreshed
+
+_base_session = get_session()
+# Session holding components shared by the sessions of every role
+
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="role-refresh")
+# Runs refreshes of assumed role credentials in the background
+
 
 class AWSAccessLevel(Enum):
     """
@@ -55,7 +72,12 @@ class ItemType(Enum):
     """
 
     DOCUMENT = "document"
+    DOCUMENT_TREE = "document_tree"
     SITE_VISIT = "site_visit"
+    SITE_OCCUPANT = "site_occupant"
+    LATEST_SITE_VISIT = "latest_site_visit"
+    SITE_VISIT_ROLLUP = "site_visit_rollup"
+    VISIT_EXPORT = "visit_export"
     SITE = "site"
     USER_REQUEST = "user_request"
 
@@ -88,7 +110,144 @@ class UserType(Enum):
     ADMIN = "admin"
 
 
-@ttl_cache(maxsize=16, ttl=15 * 60)
+class VisitTimeRange(Enum):
+    """
+    Enum of the times of a site visit that a list of visits can be ranged over
+    """
+
+    LAST_MODIFIED = "last_modified_time"
+    # The time the visit was last changed, including by edits and attachments
+    ENTRY = "entry_time"
+    # The time the site was entered
+
+
+class ExportFormat(Enum):
+    """
+    Enum of the file formats site visits can be exported in
+    """
+
+    CSV = "csv"
+    NDJSON = "ndjson"
+    # One JSON object per line
+
+
+class ExportStatus(Enum):
+    """
+    Enum of the states of an export of site visits
+    """
+
+    IN_PROGRESS = "in_progress"
+    COMPLETE = "complete"
+
+
+class RoleCredentialRefresher:
+    """
+    Holds the credentials of an assumed role, refreshing them ahead of their expiry. Once the
+    credentials enter botocore's advisory refresh window, new credentials are requested in
+    the background while the current (still valid) credentials continue to be used. Requests
+    only block on STS if the credentials enter the mandatory refresh window before the
+    background refresh completes. A failed refresh falls back to the current credentials,
+    until they are too close to expiry.
+    """
+
+    def __init__(self, role: str):
+        """
+        Assume the given role, and set up refreshing of its credentials
+
+        :param role: The role to assume
+        :raises PermissionException: The lambda does not have permission to assume
+            the provided role
+        :raises ExternalServiceException: Unable to connect to AWS
+        """
+        self.role = role
+        self._lock = Lock()
+        self._pending: Optional[Future[dict]] = None
+        self._current = self.assume_role()
+        self.credentials = RefreshableCredentials.create_from_metadata(
+            metadata=self._current,
+            refresh_using=self.refresh,
+            method="sts-assume-role",
+            mandatory_timeout=ROLE_MANDATORY_REFRESH_SECONDS,
+        )
+
+    def assume_role(self) -> dict:
+        """
+        Assume the role, getting a new set of credentials from STS
+
+        :return: The credentials of the assumed role, as botocore credential metadata
+        :raises PermissionException: The lambda does not have permission to assume
+            the provided role
+        :raises ExternalServiceException: Unable to connect to AWS
+        """
+        try:
+            assumed_role_object: dict = boto3.client("sts").assume_role(
+                RoleArn=self.role,
+                RoleSessionName="SyncMasterRoleSession",
+                DurationSeconds=ROLE_SESSION_DURATION_SECONDS,
+            )
+        except ClientError as err:
+            logger.exception(err)
+            if err.response["Error"]["Code"] == "AccessDenied":
+                raise PermissionException("Insufficient permissions to assume role") from err
+            raise ExternalServiceException("Unknown Error from AWS") from err
+
+        creds: dict = assumed_role_object["Credentials"]
+        return {
+            "access_key": creds["AccessKeyId"],
+            "secret_key": creds["SecretAccessKey"],
+            "token": creds["SessionToken"],
+            "expiry_time": creds["Expiration"].isoformat(),
+        }
+
+    def refresh(self) -> dict:
+        """
+        Called by botocore once the credentials need refreshing. Starts a background refresh
+        if one isn't running, and gives the refreshed credentials once they are available.
+
+        :return: The newest credentials available, as botocore credential metadata
+        :raises PermissionException: The background refresh was not permitted to assume the role
+        :raises ExternalServiceException: The background refresh was unable to connect to AWS
+        """
+        with self._lock:
+            if self._pending is None:
+                self._pending = _refresh_executor.submit(self.assume_role)
+            pending = self._pending
+
+        if not pending.done() and not self.credentials.refresh_needed(
+            ROLE_MANDATORY_REFRESH_SECONDS
+        ):
+            # Keep using the current credentials until the background refresh completes
+            return self._current
+
+        with self._lock:
+            self._pending = None
+        self._current = pending.result()
+        return self._current
+
+
+@lru_cache(maxsize=16)
+def get_role_session(role: str) -> boto3.Session:
+    """
+    Gets a boto3 session for the given role, which is shared by all clients and resources
+    using the role. The credentials of the session refresh themselves ahead of expiry.
+
+    :param role: The role for this session to assume
+    :raises PermissionException: The lambda does not have permission to assume
+        the provided role
+    :raises ExternalServiceException: Unable to connect to AWS
+    :return: The boto3 session with credentials for the given role
+    """
+    botocore_session = get_session()
+    # Share the loaded service models between sessions, rather than loading them per role
+    botocore_session.register_component("data_loader", _base_session.get_component("data_loader"))
+    # botocore has no public API to give a session refreshable credentials
+    botocore_session._credentials = (  # pylint: disable=protected-access
+        RoleCredentialRefresher(role).credentials
+    )
+    return boto3.Session(botocore_session=botocore_session)
+
+
+@lru_cache(maxsize=16)
 def create_client_with_role(service_name: str, role: str):
     """
     Creates a boto3 client for the provided service, with the given role
@@ -101,28 +260,12 @@ def create_client_with_role(service_name: str, role: str):
     :raises ExternalServiceException: Unable to connect to AWS
     :return: The boto3 client for the given service, with the provided credentials
     """
-    try:
-        assumed_role_object: dict = boto3.client("sts").assume_role(
-            RoleArn=role, RoleSessionName="SyncMasterRoleSession", DurationSeconds=30 * 60
-        )
-
-        creds: dict = assumed_role_object["Credentials"]
-
-        return boto3.client(
-            service_name,
-            aws_access_key_id=creds["AccessKeyId"],
-            aws_secret_access_key=creds["SecretAccessKey"],
-            aws_session_token=creds["SessionToken"],
-            config=Config(signature_version="s3v4", region_name="us-east-2"),
-        )
-    except ClientError as err:
-        logger.exception(err)
-        if err.response["Error"]["Code"] == "AccessDenied":
-            raise PermissionException("Insufficient permissions to assume role") from err
-        raise ExternalServiceException("Unknown Error from AWS") from err
+    return get_role_session(role).client(
+        service_name, config=Config(signature_version="s3v4", region_name="us-east-2")
+    )
 
 
-@ttl_cache(maxsize=16, ttl=15 * 60)
+@lru_cache(maxsize=16)
 def create_resource_with_role(service_name: str, role: str):
     """
     Creates a boto3 resource, with the given role
@@ -135,24 +278,7 @@ def create_resource_with_role(service_name: str, role: str):
     :raises ExternalServiceException: Unable to connect to AWS
     :return: The boto3 resource for the given service, with the provided credentials
     """
-    try:
-        assumed_role_object: dict = boto3.client("sts").assume_role(
-            RoleArn=role, RoleSessionName="SyncMasterRoleSession", DurationSeconds=30 * 60
-        )
-
-        creds: dict = assumed_role_object["Credentials"]
-
-        return boto3.resource(
-            service_name,
-            aws_access_key_id=creds["AccessKeyId"],
-            aws_secret_access_key=creds["SecretAccessKey"],
-            aws_session_token=creds["SessionToken"],
-        )
-    except ClientError as err:
-        logger.exception(err)
-        if err.response["Error"]["Code"] == "AccessDenied":
-            raise PermissionException("Insufficient permissions to assume role") from err
-        raise ExternalServiceException("Unknown Error from AWS") from err
+    return get_role_session(role).resource(service_name)
 
 
 def decode_db_key(key: str) -> dict:
@@ -231,6 +357,47 @@ def verify_user_role(user_groups: list[str], acceptable_roles: list[UserType], a
         raise InsufficientUserPermissionException(roles=user_groups, action=action)
 
 
+def parse_fields(fields: Optional[str], model: Type[CustomBaseModel]) -> Optional[set[str]]:
+    """
+    Parses the fields of a model selected by a request, so that a response only gives the
+    selected fields of each item, and only what is needed for them is read and signed
+
+    :param fields: The names of the selected fields, separated by commas
+    :param model: The model of the items in the response
+    :return: The names of the selected fields, or None if no fields were selected
+    :raises BadRequestException: No fields are selected, or a selected field is not a field
+        of the model
+    """
+    if fields is None:
+        return None
+    selected = {field.strip() for field in fields.split(",") if field.strip()}
+    if not selected:
+        raise BadRequestException("[fields] must select at least one field")
+    unknown = selected - model.model_fields.keys()
+    if unknown:
+        raise BadRequestException(f"Unknown [fields] selected: {', '.join(sorted(unknown))}")
+    return selected
+
+
+def partial_list_body(
+    name: str, items: list[CustomBaseModel], last_key: Optional[str] = None
+) -> dict:
+    """
+    The body of a response listing only some fields of each item. Items of partial models
+    don't match the response model of the list, so the body is given as a dictionary with
+    the same structure.
+
+    :param name: The name of the list in the response
+    :param items: The items to list, as partial API models
+    :param last_key: The key to start listing the next items from, if any
+    :return: The body of the response
+    """
+    body: dict = {name: [item.model_dump() for item in items]}
+    if last_key:
+        body["last_key"] = last_key
+    return body
+
+
 def create_open_api_response(
     description: str, response_body_schema: dict | type[BaseModel]
 ) -> OpenAPIResponse:
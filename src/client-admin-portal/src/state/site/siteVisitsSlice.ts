@@ -2,7 +2,7 @@ import { createSlice, createAsyncThunk } from '@reduxjs/toolkit';
 
 interface Attachment {
   name: string;
-  url: string;
+  url?: string;
 }
 
 interface SiteVisit {
@@ -25,6 +25,10 @@ export interface GetSiteVisitsParams {
   to_time?: string;
   limit?: number;
   start_key?: string;
+  site_id?: string;
+  user_id?: string;
+  time_range?: 'last_modified_time' | 'entry_time';
+  attachment_urls?: boolean;
 }
 
 export interface FetchSiteVisitsArgs {
@@ -5,6 +5,7 @@ TEST_ATTACHMENT_NAME = "test.txt"
 TEST_S3_FILE_KEY = "hello.txt"
 TEST_S3_FILE_CONTENT = "Hello World"
 TEST_USER_ID = "b15b955a-0ffc-4890-9025-49f37bab09f9"
+TEST_USER_ID_ALT = "4f1b3c1e-6d2a-4e8b-9c47-2a7d5b0e8f13"
 TEST_EMPLOYEE_ID = "IAMANEMPLOYEE"
 TEST_SITE_ID = "HC059"
 TEST_SITE_ID_ALT = "HC309"
@@ -1,14 +1,28 @@
+from datetime import timedelta
+from unittest.mock import patch
+
 import pytest
-from backend.service.database.db_table import GSI, DBTable, KeySchema
+from backend.service.database.db_table import (
+    BATCH_MAX_ATTEMPTS,
+    GSI,
+    TRANSACTION_MAX_ATTEMPTS,
+    DBTable,
+    KeySchema,
+    QueryCursor,
+)
 from backend.service.exceptions import (
     ConditionCheckFailed,
     ConditionValidationError,
+    ConflictException,
     ExternalServiceException,
+    IndexUnavailableException,
     PermissionException,
+    ResourceConflict,
     ResourceNotFound,
 )
-from backend.service.models.db.document import DBDocument
-from backend.service.models.db.site_visit import DBSiteVisit
+from backend.service.models.db.db_base import DBItemKey
+from backend.service.models.db.document import DBDocument, DBDocumentName
+from backend.service.models.db.site_visit import DBSiteVisit, DBSiteVisitRollup
 from backend.service.util import AWSAccessLevel, ItemType
 from boto3.dynamodb.conditions import Attr, Key
 from botocore.stub import Stubber
@@ -86,6 +100,16 @@ def test_get_item(database_with_document):
     assert table.get(key=key) == document
 
 
+def test_new_connection(database_with_document):
+    base_resource, document = database_with_document
+
+    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBDocument)
+    connection = table.new_connection()
+
+    assert connection._resource is not table._resource
+    assert connection.get(key=KeySchema(pk=document.pk, sk=document.sk)) == document
+
+
 def test_get_item_resource_not_found(empty_database):
     base_resource = empty_database
 
@@ -212,6 +236,67 @@ def test_update_item_with_removal(database_with_complete_site_visit):
     assert DBSiteVisit.model_validate(items[0]) == item
 
 
+def test_update_item_with_increment(empty_database):
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisitRollup)
+    key = KeySchema(pk=f"{ItemType.SITE_VISIT_ROLLUP.value}#{TEST_SITE_ID}", sk="2025-01-22")
+
+    for _ in range(2):
+        item = table.update(
+            key=key,
+            update_attributes={"site_id": TEST_SITE_ID, "entry_date": "2025-01-22"},
+            last_modified_by=TEST_USER_ID,
+            last_modified_time=FUTURE_DATE_TIME,
+            increment_attributes={"visits": 1, "dwell_seconds": 60},
+        )
+
+    assert item.visits == 2
+    assert item.dwell_seconds == 120
+    assert item.exited_visits == 0
+    assert table.get(key=key) == item
+
+
+def test_update_item_return_old(database_with_complete_site_visit):
+    _, site_visit = database_with_complete_site_visit
+
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisit)
+
+    item = table.update(
+        key=KeySchema(pk=site_visit.pk, sk=site_visit.sk),
+        update_attributes={"exit_time": FUTURE_DATE_TIME.isoformat()},
+        last_modified_by=TEST_USER_ID,
+        last_modified_time=FUTURE_DATE_TIME,
+        return_old=True,
+    )
+    assert item == site_visit
+    assert table.get(key=KeySchema(pk=site_visit.pk, sk=site_visit.sk)).exit_time == (
+        FUTURE_DATE_TIME
+    )
+
+
+def test_update_item_condition_with_alias(database_with_complete_site_visit):
+    _, site_visit = database_with_complete_site_visit
+
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisit)
+
+    def add_attachment(timestamp):
+        # The alias addresses a single member of the map, despite the "." in its name
+        return table.update(
+            key=KeySchema(pk=site_visit.pk, sk=site_visit.sk),
+            update_attributes={"attachments.#key": "report_key"},
+            expression_attribute_names={"#key": "report.v2.pdf"},
+            last_modified_by=TEST_USER_ID,
+            last_modified_time=timestamp,
+            condition_expression=Attr("attachments.#key").not_exists()
+            & Attr("last_modified_time").lt(timestamp.isoformat()),
+        )
+
+    item = add_attachment(FUTURE_DATE_TIME)
+    assert item.attachments == {**site_visit.attachments, "report.v2.pdf": "report_key"}
+
+    with pytest.raises(ConditionCheckFailed):
+        add_attachment(FUTURE_DATE_TIME + timedelta(seconds=1))
+
+
 def test_update_item_condition_check_fail(database_with_document):
     base_resource, document = database_with_document
 
@@ -280,6 +365,18 @@ def test_query_items_with_gsi(database_with_document):
     assert items[0] == document
 
 
+def test_query_items_with_gsi_above_index_stage(database_with_document):
+    base_resource, document = database_with_document
+
+    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBDocument)
+
+    with (
+        patch("backend.service.database.db_table.DATABASE_INDEX_STAGE", 4),
+        pytest.raises(IndexUnavailableException),
+    ):
+        table.query(gsi=GSI.GSI5, key_condition_expression=Key("type").eq(document.type.value))
+
+
 def test_query_items_in_reverse(database_with_two_site_visits):
     table = DBTable(access=AWSAccessLevel.READ, item_schema=DBSiteVisit)
 
@@ -348,3 +445,443 @@ def test_query_items_external_error(database_with_document):
 
     with stubber, pytest.raises(ExternalServiceException):
         table.query(gsi=GSI.GSI1, key_condition_expression=Key("type").eq(document.type.value))
+
+
+def test_iter_query_items(database_with_two_site_visits):
+    _, visits = database_with_two_site_visits
+
+    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBSiteVisit)
+
+    items = list(
+        table.iter_query(
+            key_condition_expression=Key("pk").eq(
+                f"{ItemType.SITE_VISIT.value}#{TEST_SITE_ID}#{TEST_USER_ID}"
+            ),
+            page_size=1,
+            scan_reverse=True,
+        )
+    )
+    assert len(items) == 2
+    assert items[0].entry_time > items[1].entry_time
+    for item in items:
+        assert item in visits
+
+
+def test_iter_query_items_resumed_with_cursor(database_with_two_site_visits):
+    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBSiteVisit)
+
+    cursor = QueryCursor()
+    iterator = table.iter_query(
+        gsi=GSI.GSI1,
+        key_condition_expression=Key("type").eq(ItemType.SITE_VISIT.value),
+        page_size=10,
+        cursor=cursor,
+    )
+    first_item = next(iterator)
+    assert cursor.last_key is not None
+    assert not cursor.exhausted
+
+    resumed_cursor = QueryCursor.from_token(cursor.to_token())
+    remaining_items = list(
+        table.iter_query(
+            gsi=GSI.GSI1,
+            key_condition_expression=Key("type").eq(ItemType.SITE_VISIT.value),
+            cursor=resumed_cursor,
+        )
+    )
+    assert len(remaining_items) == 1
+    assert remaining_items[0] != first_item
+    assert resumed_cursor.exhausted
+    assert resumed_cursor.to_token() is None
+
+
+def test_iter_query_items_with_filter(database_with_document):
+    base_resource, document = database_with_document
+
+    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBDocument)
+
+    items = table.iter_query(
+        key_condition_expression=Key("pk").eq(document.pk),
+        filter_expression=Attr("last_modified_by").eq("does-not-exist"),
+    )
+    assert len(list(items)) == 0
+
+
+def test_iter_query_items_invalid_key_condition(database_with_document):
+    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBDocument)
+
+    with pytest.raises(ConditionValidationError):
+        next(
+            table.iter_query(
+                key_condition_expression=Key("pk").begins_with(DBDocument.item_type().value)
+            )
+        )
+
+
+def test_iter_query_items_external_error(database_with_document):
+    base_resource, document = database_with_document
+
+    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBDocument)
+
+    stubber = Stubber(table._resource.meta.client)
+    stubber.add_client_error(method="query", service_error_code="InternalError")
+
+    with stubber, pytest.raises(ExternalServiceException):
+        next(table.iter_query(key_condition_expression=Key("pk").eq(document.pk)))
+
+
+def test_get_item_with_projection(database_with_document):
+    _, document = database_with_document
+
+    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBDocument)
+
+    item = table.get(key=KeySchema(pk=document.pk, sk=document.sk), projection=DBDocumentName)
+    assert item == DBDocumentName(document_name=document.document_name)
+
+
+def test_query_items_with_projection(database_with_two_site_visits):
+    _, visits = database_with_two_site_visits
+
+    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBSiteVisit)
+
+    items, last_eval = table.query(
+        gsi=GSI.GSI1,
+        key_condition_expression=Key("type").eq(ItemType.SITE_VISIT.value),
+        limit=1,
+        projection=DBItemKey,
+    )
+    assert len(items) == 1
+    assert items[0] in [DBItemKey(pk=visit.pk, sk=visit.sk) for visit in visits]
+
+    items, last_eval = table.query(
+        gsi=GSI.GSI1,
+        key_condition_expression=Key("type").eq(ItemType.SITE_VISIT.value),
+        start_key=last_eval,
+        projection=DBItemKey,
+    )
+    assert len(items) == 1
+    assert last_eval is None
+
+
+def test_iter_query_items_with_projection(database_with_documents_and_folders):
+    _, documents = database_with_documents_and_folders
+
+    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBDocument)
+
+    cursor = QueryCursor()
+    items = list(
+        table.iter_query(
+            gsi=GSI.GSI2,
+            key_condition_expression=Key("type").eq(ItemType.DOCUMENT.value),
+            cursor=cursor,
+            projection=DBDocumentName,
+        )
+    )
+    assert len(items) == 2
+    assert all(isinstance(item, DBDocumentName) for item in items)
+    assert cursor.exhausted
+
+
+def test_batch_get_items(database_with_documents_and_folders):
+    _, documents = database_with_documents_and_folders
+
+    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBDocument)
+
+    keys = [KeySchema(pk=document.pk, sk=document.sk) for document in documents]
+    keys.append(KeySchema(pk="does-not-exist", sk="does-not-exist"))
+    keys.append(keys[0])
+
+    items = table.batch_get(keys=keys)
+    assert len(items) == len(documents)
+    for item in items:
+        assert item in documents
+
+
+def test_batch_get_items_more_than_limit(empty_database, db_document):
+    base_resource = empty_database
+
+    documents = [db_document.model_copy(update={"document_id": str(i)}) for i in range(120)]
+    with base_resource.batch_writer() as writer:
+        for document in documents:
+            writer.put_item(Item=document.model_dump())
+
+    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBDocument)
+
+    items = table.batch_get(keys=[KeySchema(pk=doc.pk, sk=doc.sk) for doc in documents])
+    assert len(items) == len(documents)
+
+
+@pytest.mark.parametrize(
+    "aws_error_code, expected_error_class",
+    [
+        pytest.param("InternalError", ExternalServiceException, id="AWS Error"),
+        pytest.param("AccessDeniedException", PermissionException, id="Incorrect Permissions"),
+    ],
+)
+def test_batch_get_items_external_errors(
+    database_with_document, aws_error_code, expected_error_class
+):
+    _, document = database_with_document
+
+    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBDocument)
+
+    stubber = Stubber(table._resource.meta.client)
+    stubber.add_client_error(method="batch_get_item", service_error_code=aws_error_code)
+
+    with stubber, pytest.raises(expected_error_class):
+        table.batch_get(keys=[KeySchema(pk=document.pk, sk=document.sk)])
+
+
+def test_batch_write_items(database_with_document, db_document_folder):
+    base_resource, document = database_with_document
+
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+
+    table.batch_write(
+        puts=[db_document_folder], deletes=[KeySchema(pk=document.pk, sk=document.sk)]
+    )
+
+    items: list[dict] = base_resource.scan()["Items"]
+    assert len(items) == 1
+    assert DBDocument.model_validate(items[0]) == db_document_folder
+
+
+def test_batch_write_items_more_than_limit(empty_database, db_document):
+    base_resource = empty_database
+
+    documents = [db_document.model_copy(update={"document_id": str(i)}) for i in range(60)]
+
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+
+    table.batch_write(puts=documents)
+    assert len(base_resource.scan()["Items"]) == len(documents)
+
+    table.batch_write(deletes=[KeySchema(pk=doc.pk, sk=doc.sk) for doc in documents])
+    assert len(base_resource.scan()["Items"]) == 0
+
+
+def test_batch_write_items_retries_unprocessed(database_with_document):
+    base_resource, document = database_with_document
+
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+
+    unprocessed = {
+        table.name: [
+            {"DeleteRequest": {"Key": {"pk": {"S": document.pk}, "sk": {"S": document.sk}}}}
+        ]
+    }
+    stubber = Stubber(table._resource.meta.client)
+    stubber.add_response(
+        method="batch_write_item", service_response={"UnprocessedItems": unprocessed}
+    )
+    stubber.add_response(method="batch_write_item", service_response={"UnprocessedItems": {}})
+
+    with stubber, patch("backend.service.database.db_table.time.sleep") as sleep:
+        table.batch_write(deletes=[KeySchema(pk=document.pk, sk=document.sk)])
+
+    stubber.assert_no_pending_responses()
+    assert sleep.call_count == 1
+
+
+def test_batch_write_items_unprocessed_exhausted(database_with_document):
+    base_resource, document = database_with_document
+
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+
+    stubber = Stubber(table._resource.meta.client)
+    for _ in range(BATCH_MAX_ATTEMPTS):
+        # responses are deserialized in place by boto3, so each needs its own copy
+        unprocessed = {
+            table.name: [
+                {"DeleteRequest": {"Key": {"pk": {"S": document.pk}, "sk": {"S": document.sk}}}}
+            ]
+        }
+        stubber.add_response(
+            method="batch_write_item", service_response={"UnprocessedItems": unprocessed}
+        )
+
+    with stubber, patch("backend.service.database.db_table.time.sleep"):
+        with pytest.raises(ExternalServiceException):
+            table.batch_write(deletes=[KeySchema(pk=document.pk, sk=document.sk)])
+
+
+@pytest.mark.parametrize(
+    "aws_error_code, expected_error_class",
+    [
+        pytest.param("InternalError", ExternalServiceException, id="AWS Error"),
+        pytest.param("AccessDeniedException", PermissionException, id="Incorrect Permissions"),
+    ],
+)
+def test_batch_write_items_external_errors(
+    database_with_document, aws_error_code, expected_error_class
+):
+    base_resource, document = database_with_document
+
+    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBDocument)
+
+    stubber = Stubber(table._resource.meta.client)
+    stubber.add_client_error(method="batch_write_item", service_error_code=aws_error_code)
+
+    with stubber, pytest.raises(expected_error_class):
+        table.batch_write(deletes=[KeySchema(pk=document.pk, sk=document.sk)])
+
+    items: list[dict] = base_resource.scan()["Items"]
+    assert len(items) == 1
+
+
+def test_transaction(database_with_document, db_document_folder):
+    base_resource, document = database_with_document
+
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+
+    table.transaction().put(db_document_folder, Attr("pk").not_exists()).update(
+        key=KeySchema(pk=document.pk, sk=document.sk),
+        update_attributes={"document_path": TEST_DOCUMENT_PATH_ALT},
+        last_modified_by=TEST_USER_ID,
+        last_modified_time=FUTURE_DATE_TIME,
+        condition_expression=Attr("last_modified_time").lt(FUTURE_DATE_TIME.isoformat()),
+    ).execute()
+
+    items = table.transact_get(
+        [
+            KeySchema(pk=document.pk, sk=document.sk),
+            KeySchema(pk=db_document_folder.pk, sk=db_document_folder.sk),
+        ]
+    )
+    assert items[0].document_path == TEST_DOCUMENT_PATH_ALT
+    assert items[1] == db_document_folder
+
+
+def test_transaction_delete_with_condition_check(database_with_document, db_document_folder):
+    base_resource, document = database_with_document
+    base_resource.put_item(Item=db_document_folder.model_dump())
+
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+
+    table.transaction().delete(KeySchema(pk=document.pk, sk=document.sk)).condition_check(
+        KeySchema(pk=db_document_folder.pk, sk=db_document_folder.sk), Attr("pk").exists()
+    ).execute()
+
+    items: list[dict] = base_resource.scan()["Items"]
+    assert len(items) == 1
+
+
+@pytest.mark.parametrize(
+    "condition_error, expected_error_class",
+    [
+        pytest.param(None, ConditionCheckFailed, id="Default Error"),
+        pytest.param(
+            ResourceConflict(resource_type="test", resource_id="test"),
+            ResourceConflict,
+            id="Step Error",
+        ),
+    ],
+)
+def test_transaction_condition_check_fail(
+    database_with_document, db_document_folder, condition_error, expected_error_class
+):
+    base_resource, document = database_with_document
+
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+
+    # The folder is not put, as the document already exists
+    with pytest.raises(expected_error_class):
+        table.transaction().put(db_document_folder).put(
+            document, Attr("pk").not_exists(), condition_error=condition_error
+        ).execute()
+
+    items: list[dict] = base_resource.scan()["Items"]
+    assert len(items) == 1
+
+
+@pytest.mark.parametrize(
+    "aws_error_code, expected_error_class",
+    [
+        pytest.param("InternalError", ExternalServiceException, id="AWS Error"),
+        pytest.param("AccessDeniedException", PermissionException, id="Incorrect Permissions"),
+        pytest.param(
+            "TransactionCanceledException", ExternalServiceException, id="Transaction Conflict"
+        ),
+    ],
+)
+def test_transaction_external_errors(
+    empty_database, db_document, aws_error_code, expected_error_class
+):
+    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBDocument)
+
+    stubber = Stubber(table._resource.meta.client)
+    stubber.add_client_error(method="transact_write_items", service_error_code=aws_error_code)
+
+    with stubber, pytest.raises(expected_error_class):
+        table.transaction().put(db_document).execute()
+
+
+def _add_transaction_conflict(stubber: Stubber) -> None:
+    stubber.add_client_error(
+        method="transact_write_items",
+        service_error_code="TransactionCanceledException",
+        modeled_fields={"CancellationReasons": [{"Code": "None"}, {"Code": "TransactionConflict"}]},
+    )
+
+
+def test_transaction_retries_conflict(empty_database, db_document, db_document_folder):
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+
+    stubber = Stubber(table._resource.meta.client)
+    _add_transaction_conflict(stubber)
+    stubber.add_response(method="transact_write_items", service_response={})
+
+    with stubber, patch("backend.service.database.db_table.time.sleep") as sleep:
+        table.transaction().put(db_document).put(db_document_folder).execute()
+
+    stubber.assert_no_pending_responses()
+    assert sleep.call_count == 1
+
+
+def test_transaction_conflict_exhausted(empty_database, db_document, db_document_folder):
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+
+    stubber = Stubber(table._resource.meta.client)
+    for _ in range(TRANSACTION_MAX_ATTEMPTS):
+        _add_transaction_conflict(stubber)
+
+    with stubber, patch("backend.service.database.db_table.time.sleep"):
+        with pytest.raises(ConflictException):
+            table.transaction().put(db_document).put(db_document_folder).execute()
+
+    stubber.assert_no_pending_responses()
+
+
+def test_transact_get_items_resource_not_found(database_with_document, db_document_folder):
+    _, document = database_with_document
+
+    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBDocument)
+
+    with pytest.raises(ResourceNotFound):
+        table.transact_get(
+            [
+                KeySchema(pk=document.pk, sk=document.sk),
+                KeySchema(pk=db_document_folder.pk, sk=db_document_folder.sk),
+            ]
+        )
+
+
+@pytest.mark.parametrize(
+    "aws_error_code, expected_error_class",
+    [
+        pytest.param("InternalError", ExternalServiceException, id="AWS Error"),
+        pytest.param("AccessDeniedException", PermissionException, id="Incorrect Permissions"),
+    ],
+)
+def test_transact_get_items_external_errors(
+    database_with_document, aws_error_code, expected_error_class
+):
+    _, document = database_with_document
+
+    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBDocument)
+
+    stubber = Stubber(table._resource.meta.client)
+    stubber.add_client_error(method="transact_get_items", service_error_code=aws_error_code)
+
+    with stubber, pytest.raises(expected_error_class):
+        table.transact_get([KeySchema(pk=document.pk, sk=document.sk)])
@@ -0,0 +1,54 @@
+from unittest.mock import patch
+
+from backend.service.database.db_table_pool import DBTablePool
+from backend.service.models.db.document import DBDocument
+from backend.service.models.db.site import DBSite
+from backend.service.util import AWSAccessLevel
+
+
+def test_get_table_reused(empty_database):
+    pool = DBTablePool()
+
+    table = pool.get(access=AWSAccessLevel.READ, item_schema=DBDocument)
+
+    assert pool.get(access=AWSAccessLevel.READ, item_schema=DBDocument) is table
+    assert pool.hits == 1
+    assert pool.misses == 1
+
+
+def test_get_table_keyed_by_access_and_schema(empty_database):
+    pool = DBTablePool()
+
+    read_table = pool.get(access=AWSAccessLevel.READ, item_schema=DBDocument)
+    write_table = pool.get(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+    site_table = pool.get(access=AWSAccessLevel.READ, item_schema=DBSite)
+
+    assert read_table is not write_table
+    assert read_table is not site_table
+    assert site_table.item_schema == DBSite
+    assert pool.hits == 0
+    assert pool.misses == 3
+
+
+def test_get_table_replaced_when_expiring(empty_database):
+    pool = DBTablePool(max_age_seconds=60)
+
+    with patch("backend.service.database.db_table_pool.monotonic", return_value=0):
+        table = pool.get(access=AWSAccessLevel.READ, item_schema=DBDocument)
+
+    with patch("backend.service.database.db_table_pool.monotonic", return_value=60):
+        assert pool.get(access=AWSAccessLevel.READ, item_schema=DBDocument) is not table
+
+    assert pool.hits == 0
+    assert pool.misses == 2
+
+
+def test_clear_pool(empty_database):
+    pool = DBTablePool()
+
+    table = pool.get(access=AWSAccessLevel.READ, item_schema=DBDocument)
+    pool.clear()
+
+    assert pool.hits == 0
+    assert pool.misses == 0
+    assert pool.get(access=AWSAccessLevel.READ, item_schema=DBDocument) is not table
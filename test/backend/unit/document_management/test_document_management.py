@@ -1,27 +1,34 @@
+from unittest.mock import patch
+
 import pytest
 from backend.service.database.db_table import DBTable, KeySchema
 from backend.service.document_management.document_management import (
     delete,
     get_all_files,
+    get_document_tree,
     get_presigned_url,
+    index_document_tree,
     list_expiring_documents,
+    resolve_document_path,
     upload_file,
 )
 from backend.service.environment import DOCUMENT_STORAGE_BUCKET_NAME
 from backend.service.exceptions import (
+    BadRequestException,
+    ExternalServiceException,
     ResourceConflict,
     ResourceNotFound,
     TimeConsistencyException,
 )
 from backend.service.file_storage.s3_bucket import S3Bucket
-from backend.service.models.db.document import DBDocument
+from backend.service.models.db.document import DBDocument, DBDocumentTreeNode
 from backend.service.models.db.site_visit import DBSiteVisit
 from backend.service.site_visits.site_visits import (
     add_exit_time,
     create_site_entry,
     list_site_visits,
 )
-from backend.service.util import AWSAccessLevel, FileType
+from backend.service.util import AWSAccessLevel, FileType, ItemType, encode_db_key
 from pydantic_core.core_schema import NoneSchema
 from requests import get
 
@@ -57,8 +64,10 @@ def test_create_document(empty_database):
     document_expiry: Optional[datetime] = None,"
     """
     table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+    tree_table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocumentTreeNode)
     document = upload_file(
         table=table,
+        tree_table=tree_table,
         document_name=TEST_DOCUMENT_NAME,
         document_type=FileType.FILE,
         parent_folder_id=TEST_PARENT_FOLDER_ID,
@@ -80,9 +89,13 @@ def test_create_document(empty_database):
 def test_create_document_with_resource_conflict(database_with_document):
     base_resource, document = database_with_document
     table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+    tree_table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocumentTreeNode)
+    # The name of the existing document is reserved once it is in the document tree
+    index_document_tree(table, tree_table, document.site_id, document.parent_folder_id)
     with pytest.raises(ResourceConflict):
         upload_file(
             table=table,
+            tree_table=tree_table,
             document_name=document.document_name,
             document_type=document.document_type,
             parent_folder_id=document.parent_folder_id,
@@ -125,6 +138,20 @@ def test_get_all_multiple_files(database_with_documents_and_folders, s3_bucket_w
     assert files[0].document_path == TEST_DOCUMENT_PATH
 
 
+def test_get_all_files_with_fields(database_with_documents_and_folders):
+    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBDocument)
+    files = get_all_files(
+        table=table,
+        bucket=None,
+        site_id=TEST_SITE_ID,
+        parent_folder_id=TEST_PARENT_FOLDER_ID,
+        fields={"document_name", "last_modified"},
+    )
+    assert len(files) == 2
+    assert files[0].model_dump().keys() == {"document_name", "last_modified"}
+    assert files[0].document_name == TEST_DOCUMENT_NAME
+
+
 def test_get_all_files_empty(empty_database, empty_s3_bucket):
     client = empty_s3_bucket
 
@@ -152,8 +179,10 @@ def test_delete_file(database_with_document, s3_bucket_with_item):
     # Initialize bucket wrapper
     bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.WRITE)
     table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+    tree_table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocumentTreeNode)
     delete(
         table=table,
+        tree_table=tree_table,
         s3_bucket=bucket,
         site_id=TEST_SITE_ID,
         parent_folder_id=TEST_PARENT_FOLDER_ID,
@@ -168,8 +197,10 @@ def test_delete_folder(database_with_documents_and_folders, s3_bucket_with_item)
     # Initialize bucket wrapper
     bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.WRITE)
     table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+    tree_table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocumentTreeNode)
     delete(
         table=table,
+        tree_table=tree_table,
         s3_bucket=bucket,
         site_id=TEST_SITE_ID,
         parent_folder_id=TEST_PARENT_FOLDER_ID,
@@ -179,6 +210,124 @@ def test_delete_folder(database_with_documents_and_folders, s3_bucket_with_item)
     assert len(items) == 1
 
 
+@pytest.mark.parametrize(
+    "s3_error_code, expected_error_class",
+    [
+        pytest.param("PreconditionFailed", ResourceNotFound, id="Etag Mismatch"),
+        pytest.param("InternalError", ExternalServiceException, id="AWS Error"),
+    ],
+)
+def test_delete_folder_with_s3_failures(
+    database_with_documents_and_folders, s3_bucket_with_item, s3_error_code, expected_error_class
+):
+    base_resource, _ = database_with_documents_and_folders
+    # Initialize bucket wrapper
+    bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.WRITE)
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+    tree_table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocumentTreeNode)
+    with patch.object(
+        bucket,
+        "delete_many",
+        side_effect=lambda objects: {key: s3_error_code for key, _ in objects},
+    ):
+        with pytest.raises(expected_error_class):
+            delete(
+                table=table,
+                tree_table=tree_table,
+                s3_bucket=bucket,
+                site_id=TEST_SITE_ID,
+                parent_folder_id=TEST_PARENT_FOLDER_ID,
+                document_id=TEST_DOCUMENT_FOLDER_ID,
+            )
+
+    # The folders, and the file still in S3 are kept
+    items: list[dict] = base_resource.scan()["Items"]
+    assert len(items) == 4
+    assert TEST_DOCUMENT_FOLDER_ID in {item["sk"] for item in items}
+
+
+def test_delete_folder_resumed(database_with_documents_and_folders, s3_bucket_with_item):
+    base_resource, _ = database_with_documents_and_folders
+    # Initialize bucket wrapper
+    bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.WRITE)
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+    tree_table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocumentTreeNode)
+
+    # Without any time, each delete only does a single step of the delete
+    resume_token = None
+    deletes = 0
+    while True:
+        deleted, resume_token = delete(
+            table=table,
+            tree_table=tree_table,
+            s3_bucket=bucket,
+            site_id=TEST_SITE_ID,
+            parent_folder_id=TEST_PARENT_FOLDER_ID,
+            document_id=TEST_DOCUMENT_FOLDER_ID,
+            time_budget_seconds=0,
+            resume_token=resume_token,
+        )
+        deletes += 1
+        if resume_token is None:
+            break
+
+    assert deletes > 1
+    assert deleted == 3
+    items: list[dict] = base_resource.scan()["Items"]
+    assert len(items) == 1
+
+
+def test_delete_folder_stops_after_round(database_with_documents_and_folders, s3_bucket_with_item):
+    base_resource, _ = database_with_documents_and_folders
+    bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.WRITE)
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+    tree_table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocumentTreeNode)
+
+    # Without any time, the delete stops after the first round of files deleted
+    deleted, resume_token = delete(
+        table=table,
+        tree_table=tree_table,
+        s3_bucket=bucket,
+        site_id=TEST_SITE_ID,
+        parent_folder_id=TEST_PARENT_FOLDER_ID,
+        document_id=TEST_DOCUMENT_FOLDER_ID,
+        time_budget_seconds=0,
+    )
+
+    assert deleted == 1
+    assert resume_token is not None
+    items: list[dict] = base_resource.scan()["Items"]
+    assert len(items) == 3
+
+
+@pytest.mark.parametrize(
+    "resume_token",
+    [
+        pytest.param("not a token", id="Invalid token"),
+        pytest.param(
+            encode_db_key({"pk": "DOCUMENT#HC059#other", "sk": TEST_DOCUMENT_FOLDER_ID}),
+            id="Token for other document",
+        ),
+    ],
+)
+def test_delete_folder_bad_resume_token(
+    database_with_documents_and_folders, s3_bucket_with_item, resume_token
+):
+    bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.WRITE)
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+    tree_table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocumentTreeNode)
+    with pytest.raises(BadRequestException):
+        delete(
+            table=table,
+            tree_table=tree_table,
+            s3_bucket=bucket,
+            site_id=TEST_SITE_ID,
+            parent_folder_id=TEST_PARENT_FOLDER_ID,
+            document_id=TEST_DOCUMENT_FOLDER_ID,
+            resume_token=resume_token,
+        )
+
+
 def test_list_expiring_documents_now(database_with_documents_and_folders):
     table = DBTable(access=AWSAccessLevel.READ, item_schema=DBDocument)
 
@@ -225,3 +374,166 @@ def test_list_expiring_documents_paginated(database_with_documents_and_folders):
 
     assert len(documents) == 1
     assert last_eval_key is None
+
+
+def _upload_tree(table, tree_table) -> dict[str, DBDocument]:
+    documents: dict[str, DBDocument] = {}
+    for name, document_type, parent in [
+        ("Safety", FileType.FOLDER, None),
+        ("plan.pdf", FileType.FILE, "Safety"),
+        ("Old", FileType.FOLDER, "Safety"),
+        ("a/b.pdf", FileType.FILE, "Old"),
+    ]:
+        documents[name] = upload_file(
+            table=table,
+            tree_table=tree_table,
+            document_name=name,
+            document_type=document_type,
+            parent_folder_id=documents[parent].document_id if parent else TEST_PARENT_FOLDER_ID,
+            site_id=TEST_SITE_ID,
+            document_path=TEST_DOCUMENT_PATH,
+            s3_key=name,
+            e_tag=TEST_DOCUMENT_ETAG,
+            user_id=TEST_USER_ID,
+            requires_ack=False,
+            timestamp=CURRENT_DATE_TIME,
+        )
+    return documents
+
+
+def test_document_tree(empty_database, empty_s3_bucket):
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+    tree_table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocumentTreeNode)
+    documents = _upload_tree(table, tree_table)
+
+    # The whole subtree is listed in path order
+    nodes = get_document_tree(tree_table, TEST_SITE_ID, TEST_PARENT_FOLDER_ID)
+    assert [node.tree_path for node in nodes] == [
+        "root/Safety",
+        "root/Safety/Old",
+        "root/Safety/Old/a%2Fb.pdf",
+        "root/Safety/plan.pdf",
+    ]
+    nodes = get_document_tree(tree_table, TEST_SITE_ID, documents["Old"].document_id)
+    assert [node.document_id for node in nodes] == [documents["a/b.pdf"].document_id]
+
+    # Documents are found from the names of the folders leading to them
+    node = resolve_document_path(tree_table, TEST_SITE_ID, ["root", "Safety", "Old", "a/b.pdf"])
+    assert node.document_id == documents["a/b.pdf"].document_id
+    assert node.parent_folder_id == documents["Old"].document_id
+    with pytest.raises(ResourceNotFound):
+        resolve_document_path(tree_table, TEST_SITE_ID, ["root", "Old"])
+
+
+def test_document_tree_delete(empty_database, empty_s3_bucket):
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+    tree_table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocumentTreeNode)
+    bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.WRITE)
+    documents = _upload_tree(table, tree_table)
+
+    delete(
+        table=table,
+        tree_table=tree_table,
+        s3_bucket=bucket,
+        site_id=TEST_SITE_ID,
+        parent_folder_id=documents["Safety"].document_id,
+        document_id=documents["plan.pdf"].document_id,
+    )
+    nodes = get_document_tree(tree_table, TEST_SITE_ID, TEST_PARENT_FOLDER_ID)
+    assert len(nodes) == 3
+
+    delete(
+        table=table,
+        tree_table=tree_table,
+        s3_bucket=bucket,
+        site_id=TEST_SITE_ID,
+        parent_folder_id=TEST_PARENT_FOLDER_ID,
+        document_id=documents["Safety"].document_id,
+    )
+    assert empty_database.scan()["Items"] == []
+
+
+def test_index_document_tree(empty_database, empty_s3_bucket):
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+    tree_table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocumentTreeNode)
+    _upload_tree(table, tree_table)
+    expected = get_document_tree(tree_table, TEST_SITE_ID, TEST_PARENT_FOLDER_ID)
+
+    # Remove the tree, as if the documents were uploaded before it was maintained
+    for item in empty_database.scan()["Items"]:
+        if item["type"] == ItemType.DOCUMENT_TREE.value:
+            empty_database.delete_item(Key={"pk": item["pk"], "sk": item["sk"]})
+    assert get_document_tree(tree_table, TEST_SITE_ID, TEST_PARENT_FOLDER_ID) == []
+
+    indexed = index_document_tree(table, tree_table, TEST_SITE_ID, TEST_PARENT_FOLDER_ID)
+
+    assert indexed == 4
+    assert get_document_tree(tree_table, TEST_SITE_ID, TEST_PARENT_FOLDER_ID) == expected
+
+
+def test_index_document_tree_after_upload_into_unindexed_folder(empty_database, empty_s3_bucket):
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+    tree_table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocumentTreeNode)
+    documents = _upload_tree(table, tree_table)
+    for item in empty_database.scan()["Items"]:
+        if item["type"] == ItemType.DOCUMENT_TREE.value:
+            empty_database.delete_item(Key={"pk": item["pk"], "sk": item["sk"]})
+
+    # The folder has no tree node, so the file is given a path as if the folder were at the
+    # top level of the site
+    safety_id = documents["Safety"].document_id
+    upload_file(
+        table=table,
+        tree_table=tree_table,
+        document_name="new.pdf",
+        document_type=FileType.FILE,
+        parent_folder_id=safety_id,
+        site_id=TEST_SITE_ID,
+        document_path=TEST_DOCUMENT_PATH,
+        s3_key="new.pdf",
+        e_tag=TEST_DOCUMENT_ETAG,
+        user_id=TEST_USER_ID,
+        requires_ack=False,
+        timestamp=CURRENT_DATE_TIME,
+    )
+    assert resolve_document_path(tree_table, TEST_SITE_ID, [safety_id, "new.pdf"])
+
+    assert index_document_tree(table, tree_table, TEST_SITE_ID, TEST_PARENT_FOLDER_ID) == 5
+
+    nodes = get_document_tree(tree_table, TEST_SITE_ID, TEST_PARENT_FOLDER_ID)
+    assert "root/Safety/new.pdf" in [node.tree_path for node in nodes]
+    with pytest.raises(ResourceNotFound):
+        resolve_document_path(tree_table, TEST_SITE_ID, [safety_id, "new.pdf"])
+    tree_items = [
+        item
+        for item in empty_database.scan()["Items"]
+        if item["type"] == ItemType.DOCUMENT_TREE.value
+    ]
+    assert len(tree_items) == 2 * 5
+
+
+def test_create_documents_with_same_name_in_other_folders(empty_database, empty_s3_bucket):
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument)
+    tree_table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocumentTreeNode)
+    documents = _upload_tree(table, tree_table)
+
+    for parent_folder_id in [documents["Old"].document_id, TEST_PARENT_FOLDER_ID]:
+        upload_file(
+            table=table,
+            tree_table=tree_table,
+            document_name="plan.pdf",
+            document_type=FileType.FILE,
+            parent_folder_id=parent_folder_id,
+            site_id=TEST_SITE_ID,
+            document_path=TEST_DOCUMENT_PATH,
+            s3_key="plan.pdf",
+            e_tag=TEST_DOCUMENT_ETAG,
+            user_id=TEST_USER_ID,
+            requires_ack=False,
+            timestamp=CURRENT_DATE_TIME,
+        )
+
+    with pytest.raises(ResourceConflict):
+        _upload_tree(table, tree_table)
+    # Nothing is written for a conflicting upload
+    assert len(get_document_tree(tree_table, TEST_SITE_ID, TEST_PARENT_FOLDER_ID)) == 6
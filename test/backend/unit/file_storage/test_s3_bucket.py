@@ -1,5 +1,8 @@
 import io
+from datetime import datetime
 from http import HTTPStatus
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlsplit
 
 import pytest
 import requests
@@ -9,12 +12,23 @@ from backend.service.exceptions import (
     PermissionException,
     ResourceNotFound,
 )
-from backend.service.file_storage.s3_bucket import S3Bucket
+from backend.service.file_storage.presigned_url import presign_get_url
+from backend.service.file_storage.s3_bucket import (
+    MULTIPART_MIN_PART_SIZE,
+    PRESIGNED_URL_EXPIRY_SECONDS,
+    S3Bucket,
+    clear_url_cache,
+)
 from backend.service.util import AWSAccessLevel
 from botocore.exceptions import ClientError
 from botocore.stub import Stubber
 
-from ..constants import TEST_ATTACHMENT_NAME, TEST_S3_FILE_CONTENT, TEST_S3_FILE_KEY
+from ..constants import (
+    TEST_ATTACHMENT_NAME,
+    TEST_DOCUMENT_ETAG,
+    TEST_S3_FILE_CONTENT,
+    TEST_S3_FILE_KEY,
+)
 
 
 def test_upload_file(empty_s3_bucket):
@@ -100,3 +114,213 @@ def test_delete_object_with_errors(s3_bucket_with_item, aws_error_code, expected
         # Delete object failure
         with pytest.raises(expected_error_class):
             print(bucket.delete(key=TEST_S3_FILE_KEY, e_tag=e_tag))
+
+
+def test_get_object_url_matches_botocore(s3_bucket_with_item):
+    bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.READ)
+    original_filename = "site plan (final).pdf"
+    key = "folder/a file+name.pdf"
+
+    botocore_url = bucket._client.generate_presigned_url(
+        ClientMethod="get_object",
+        Params={
+            "Bucket": bucket.name,
+            "Key": key,
+            "ResponseContentDisposition": f'attachment; filename="{original_filename}"',
+        },
+    )
+    botocore_parts = urlsplit(botocore_url)
+    botocore_query = parse_qs(botocore_parts.query)
+
+    url = presign_get_url(
+        bucket._credentials.get_frozen_credentials(),
+        bucket=bucket.name,
+        key=key,
+        region=bucket._client.meta.region_name,
+        endpoint_url=bucket._client.meta.endpoint_url,
+        signed_at=datetime.strptime(botocore_query["X-Amz-Date"][0], "%Y%m%dT%H%M%SZ"),
+        expires_in=PRESIGNED_URL_EXPIRY_SECONDS,
+        content_disposition=f'attachment; filename="{original_filename}"',
+    )
+    parts = urlsplit(url)
+
+    assert (parts.netloc, parts.path) == (botocore_parts.netloc, botocore_parts.path)
+    assert parse_qs(parts.query) == botocore_query
+
+
+def test_get_object_urls(s3_bucket_with_item):
+    bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.READ)
+
+    urls = bucket.create_get_urls(
+        [(TEST_S3_FILE_KEY, TEST_ATTACHMENT_NAME), (TEST_S3_FILE_KEY, "other.txt")]
+    )
+
+    assert len(urls) == 2
+    assert urls[0] != urls[1]
+    for url in urls:
+        http_response = requests.get(url=url)
+        assert http_response.status_code == HTTPStatus.OK.value
+        assert http_response.content == bytes(TEST_S3_FILE_CONTENT, encoding="utf-8")
+
+
+def test_get_object_url_cached(s3_bucket_with_item):
+    bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.READ)
+
+    url = bucket.create_get_url(key=TEST_S3_FILE_KEY, original_filename=TEST_ATTACHMENT_NAME)
+
+    # urls are shared between buckets, and reused while still valid
+    other_bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.READ)
+    with patch("backend.service.file_storage.s3_bucket.presign_get_url") as presign:
+        assert (
+            other_bucket.create_get_url(
+                key=TEST_S3_FILE_KEY, original_filename=TEST_ATTACHMENT_NAME
+            )
+            == url
+        )
+        presign.assert_not_called()
+
+    # urls are signed again once the cached url reaches the end of its reuse window
+    with patch("backend.service.file_storage.s3_bucket.PRESIGNED_URL_CACHE_FRACTION", 0):
+        clear_url_cache()
+        bucket.create_get_url(key=TEST_S3_FILE_KEY, original_filename=TEST_ATTACHMENT_NAME)
+        with patch("backend.service.file_storage.s3_bucket.presign_get_url") as presign:
+            presign.return_value = "resigned"
+            assert (
+                bucket.create_get_url(key=TEST_S3_FILE_KEY, original_filename=TEST_ATTACHMENT_NAME)
+                == "resigned"
+            )
+
+
+def test_delete_many_objects(s3_bucket_with_item):
+    client, metadata = s3_bucket_with_item
+    keys = [f"folder/{i}.txt" for i in range(5)]
+    for key in keys:
+        client.put_object(Bucket=DOCUMENT_STORAGE_BUCKET_NAME, Key=key, Body=b"content")
+
+    # Initialize bucket wrapper
+    bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.WRITE)
+
+    # Delete objects, over multiple requests
+    with patch("backend.service.file_storage.s3_bucket.DELETE_OBJECTS_LIMIT", 2):
+        failures = bucket.delete_many(
+            [(TEST_S3_FILE_KEY, metadata["ETag"])] + [(key, None) for key in keys]
+        )
+
+    assert failures == {}
+    assert "Contents" not in client.list_objects_v2(Bucket=DOCUMENT_STORAGE_BUCKET_NAME)
+
+
+def test_delete_many_objects_with_failures(s3_bucket_with_item):
+    # Initialize bucket wrapper
+    bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.WRITE)
+
+    stubber = Stubber(bucket._client)
+    stubber.add_response(
+        method="delete_objects",
+        service_response={
+            "Errors": [
+                {"Key": TEST_S3_FILE_KEY, "Code": "PreconditionFailed", "Message": "ETag"},
+                {"Key": "other.txt", "Code": "InternalError", "Message": "Error"},
+            ]
+        },
+        expected_params={
+            "Bucket": DOCUMENT_STORAGE_BUCKET_NAME,
+            "Delete": {
+                "Objects": [
+                    {"Key": TEST_S3_FILE_KEY, "ETag": TEST_DOCUMENT_ETAG},
+                    {"Key": "other.txt"},
+                    {"Key": "deleted.txt"},
+                ],
+                "Quiet": True,
+            },
+        },
+    )
+    with stubber:
+        failures = bucket.delete_many(
+            [
+                (TEST_S3_FILE_KEY, TEST_DOCUMENT_ETAG),
+                ("other.txt", None),
+                ("deleted.txt", None),
+            ]
+        )
+
+    assert failures == {TEST_S3_FILE_KEY: "PreconditionFailed", "other.txt": "InternalError"}
+
+
+@pytest.mark.parametrize(
+    "aws_error_code, expected_error_class",
+    [
+        pytest.param("InternalError", ExternalServiceException, id="AWS Error"),
+        pytest.param("AccessDenied", PermissionException, id="Incorrect Permissions"),
+    ],
+)
+def test_delete_many_objects_with_errors(s3_bucket_with_item, aws_error_code, expected_error_class):
+    # Initialize bucket wrapper
+    bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.WRITE)
+
+    stubber = Stubber(bucket._client)
+    stubber.add_client_error(method="delete_objects", service_error_code=aws_error_code)
+    with stubber:
+        with pytest.raises(expected_error_class):
+            bucket.delete_many([(TEST_S3_FILE_KEY, None)])
+
+
+def test_multipart_upload(empty_s3_bucket):
+    client = empty_s3_bucket
+    bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.WRITE)
+    first_part = b"a" * MULTIPART_MIN_PART_SIZE
+
+    upload_id = bucket.start_multipart_upload(key=TEST_S3_FILE_KEY, content_type="text/plain")
+    e_tags = [
+        bucket.upload_part(TEST_S3_FILE_KEY, upload_id, part_number=1, body=first_part),
+        bucket.upload_part(TEST_S3_FILE_KEY, upload_id, part_number=2, body=b"b"),
+    ]
+    bucket.complete_multipart_upload(TEST_S3_FILE_KEY, upload_id, e_tags)
+
+    response = client.get_object(Bucket=DOCUMENT_STORAGE_BUCKET_NAME, Key=TEST_S3_FILE_KEY)
+    assert response["Body"].read() == first_part + b"b"
+    assert response["ContentType"] == "text/plain"
+
+    # The upload no longer exists once completed
+    with pytest.raises(ResourceNotFound):
+        bucket.upload_part(TEST_S3_FILE_KEY, upload_id, part_number=3, body=b"c")
+
+
+def test_abort_multipart_upload(empty_s3_bucket):
+    client = empty_s3_bucket
+    bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.WRITE)
+
+    upload_id = bucket.start_multipart_upload(key=TEST_S3_FILE_KEY, content_type="text/plain")
+    bucket.upload_part(TEST_S3_FILE_KEY, upload_id, part_number=1, body=b"a")
+    bucket.abort_multipart_upload(TEST_S3_FILE_KEY, upload_id)
+
+    assert "Uploads" not in client.list_multipart_uploads(Bucket=DOCUMENT_STORAGE_BUCKET_NAME)
+    with pytest.raises(ResourceNotFound):
+        bucket.complete_multipart_upload(TEST_S3_FILE_KEY, upload_id, ["etag"])
+
+
+def test_put_and_get_object(empty_s3_bucket):
+    bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.WRITE)
+
+    with pytest.raises(ResourceNotFound):
+        bucket.get_object(TEST_S3_FILE_KEY)
+
+    bucket.put_object(key=TEST_S3_FILE_KEY, body=b"contents")
+    assert bucket.get_object(TEST_S3_FILE_KEY) == b"contents"
+
+
+@pytest.mark.parametrize(
+    "aws_error_code, expected_error_class",
+    [
+        pytest.param("InternalError", ExternalServiceException, id="AWS Error"),
+        pytest.param("AccessDenied", PermissionException, id="Incorrect Permissions"),
+    ],
+)
+def test_start_multipart_upload_with_errors(empty_s3_bucket, aws_error_code, expected_error_class):
+    bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.WRITE)
+
+    stubber = Stubber(bucket._client)
+    stubber.add_client_error(method="create_multipart_upload", service_error_code=aws_error_code)
+    with stubber:
+        with pytest.raises(expected_error_class):
+            bucket.start_multipart_upload(key=TEST_S3_FILE_KEY, content_type="text/plain")
@@ -127,6 +127,10 @@ def api_gateway_event():
             memory_limit_in_mb = 1
             invoked_function_arn = "function_arn"
 
+            @staticmethod
+            def get_remaining_time_in_millis():
+                return 15000
+
         return event, Context()
 
     return _api_gateway_event
@@ -188,6 +192,28 @@ def get_site_visit_request(api_gateway_event):
     yield event, context
 
 
+@pytest.fixture()
+def get_latest_site_visit_request(api_gateway_event):
+    event, context = api_gateway_event(
+        path="/protected/site/visits/latest",
+        method="GET",
+        time=FUTURE_DATE_TIME,
+    )
+    yield event, context
+
+
+@pytest.fixture()
+def list_site_occupants_request(api_gateway_event):
+    event, context = api_gateway_event(
+        path=f"/protected/site/{TEST_SITE_ID}/occupants",
+        method="GET",
+        path_params={"site_id": TEST_SITE_ID},
+        user_role="admin",
+        user_groups=["admin"],
+    )
+    yield event, context
+
+
 @pytest.fixture()
 def edit_site_visit_details_request(api_gateway_event):
     event, context = api_gateway_event(
@@ -268,6 +294,150 @@ def list_site_visits_request_paginated(api_gateway_event):
     yield event, context
 
 
+@pytest.fixture()
+def list_site_visits_by_entry_time_request(api_gateway_event):
+    event, context = api_gateway_event(
+        path=f"/protected/site/visits",
+        method="GET",
+        query_params={
+            "from_time": CURRENT_DATE_TIME.isoformat(),
+            "time_range": "entry_time",
+        },
+        user_role="admin",
+        user_groups=["admin"],
+    )
+    yield event, context
+
+
+@pytest.fixture()
+def list_site_visits_without_urls_request(api_gateway_event):
+    event, context = api_gateway_event(
+        path=f"/protected/site/visits",
+        method="GET",
+        query_params={"attachment_urls": "false"},
+        user_role="admin",
+        user_groups=["admin"],
+    )
+    yield event, context
+
+
+@pytest.fixture()
+def list_site_visits_with_fields_request(api_gateway_event):
+    event, context = api_gateway_event(
+        path=f"/protected/site/visits",
+        method="GET",
+        query_params={"fields": "site_id,entry_time"},
+        user_role="admin",
+        user_groups=["admin"],
+    )
+    yield event, context
+
+
+@pytest.fixture()
+def list_site_visits_unknown_field_request(api_gateway_event):
+    event, context = api_gateway_event(
+        path=f"/protected/site/visits",
+        method="GET",
+        query_params={"fields": "site_id,loc_tracking"},
+        user_role="admin",
+        user_groups=["admin"],
+    )
+    yield event, context
+
+
+@pytest.fixture()
+def list_site_visits_for_site_request(api_gateway_event):
+    event, context = api_gateway_event(
+        path=f"/protected/site/visits",
+        method="GET",
+        query_params={
+            "site_id": TEST_SITE_ID,
+            "from_time": CURRENT_DATE_TIME.isoformat(),
+        },
+        user_role="admin",
+        user_groups=["admin"],
+    )
+    yield event, context
+
+
+@pytest.fixture()
+def list_site_visits_for_site_and_user_request(api_gateway_event):
+    event, context = api_gateway_event(
+        path=f"/protected/site/visits",
+        method="GET",
+        query_params={
+            "site_id": TEST_SITE_ID,
+            "user_id": TEST_USER_ID,
+        },
+        user_role="admin",
+        user_groups=["admin"],
+    )
+    yield event, context
+
+
+@pytest.fixture()
+def get_site_visit_stats_request(api_gateway_event):
+    event, context = api_gateway_event(
+        path=f"/protected/site/visits/stats",
+        method="GET",
+        query_params={
+            "from_time": CURRENT_DATE_TIME.isoformat(),
+            "to_time": FUTURE_DATE_TIME.isoformat(),
+        },
+        user_role="admin",
+        user_groups=["admin"],
+    )
+    yield event, context
+
+
+@pytest.fixture()
+def get_site_visit_stats_without_range_request(api_gateway_event):
+    event, context = api_gateway_event(
+        path=f"/protected/site/visits/stats",
+        method="GET",
+        user_role="admin",
+        user_groups=["admin"],
+    )
+    yield event, context
+
+
+@pytest.fixture()
+def list_site_visit_rollups_request(api_gateway_event):
+    event, context = api_gateway_event(
+        path=f"/protected/site/{TEST_SITE_ID}/visits/daily",
+        method="GET",
+        path_params={"site_id": TEST_SITE_ID},
+        query_params={"from_date": CURRENT_DATE_TIME.date().isoformat()},
+        user_role="admin",
+        user_groups=["admin"],
+    )
+    yield event, context
+
+
+@pytest.fixture()
+def export_site_visits_request(api_gateway_event):
+    event, context = api_gateway_event(
+        path="/protected/site/visits/export",
+        method="POST",
+        query_params={"export_format": "ndjson", "site_id": TEST_SITE_ID},
+        user_role="admin",
+        user_groups=["admin"],
+    )
+    yield event, context
+
+
+@pytest.fixture()
+def continue_missing_visit_export_request(api_gateway_event):
+    event, context = api_gateway_event(
+        path="/protected/site/visits/export/missing",
+        method="POST",
+        path_params={"export_id": "missing"},
+        user_role="admin",
+        user_groups=["admin"],
+    )
+    yield event, context
+
+
 @pytest.fixture()
 def list_site_visits_request_bad_role(api_gateway_event):
     event, context = api_gateway_event(
@@ -394,6 +564,17 @@ def get_files_request(api_gateway_event):
     yield event, context
 
 
+@pytest.fixture()
+def get_files_with_fields_request(api_gateway_event):
+    event, context = api_gateway_event(
+        path=f"/protected/documents/{TEST_SITE_ID}/{TEST_PARENT_FOLDER_ID}/get_files",
+        method="GET",
+        path_params={"site_id": TEST_S3_FILE_KEY, "folder": TEST_PARENT_FOLDER_ID},
+        query_params={"fields": "document_id,document_name"},
+    )
+    yield event, context
+
+
 @pytest.fixture()
 def delete_files_request(api_gateway_event):
     event, context = api_gateway_event(
@@ -474,6 +655,18 @@ def list_expiring_documents_request(api_gateway_event):
     yield event, context
 
 
+@pytest.fixture()
+def list_expiring_documents_with_fields_request(api_gateway_event):
+    event, context = api_gateway_event(
+        path=f"/protected/documents/expiring_documents",
+        method="GET",
+        query_params={"fields": "document_id,document_expiry"},
+        user_role="admin",
+        user_groups=["admin"],
+    )
+    yield event, context
+
+
 @pytest.fixture()
 def list_expiring_documents_bad_role_request(api_gateway_event):
     event, context = api_gateway_event(
@@ -621,6 +814,18 @@ def list_sites_request(api_gateway_event):
     yield event, context
 
 
+@pytest.fixture()
+def list_sites_with_fields_request(api_gateway_event):
+    event, context = api_gateway_event(
+        path=f"/protected/site-management",
+        method="GET",
+        query_params={"fields": "site_id"},
+        user_role="admin",
+        user_groups=["admin"],
+    )
+    yield event, context
+
+
 @pytest.fixture()
 def list_sites_request_paginated(api_gateway_event):
     event, context = api_gateway_event(
@@ -644,6 +849,18 @@ def list_sites_request_bad_role(api_gateway_event):
     yield event, context
 
 
+@pytest.fixture()
+def list_nearby_sites_request(api_gateway_event):
+    event, context = api_gateway_event(
+        path=f"/protected/site-management/nearby",
+        method="GET",
+        user_role="employee",
+        query_params={"latitude": "43.2595", "longitude": "-79.9210"},
+        user_groups=["employee"],
+    )
+    yield event, context
+
+
 @pytest.fixture()
 def create_user_request_request(api_gateway_event):
     event, context = api_gateway_event(
@@ -1,5 +1,13 @@
 import pytest
-from backend.service.util import create_client_with_role, create_resource_with_role
+from backend.service.database.db_table_pool import table_pool
+from backend.service.file_storage.s3_bucket import clear_url_cache
+from backend.service.location_verification.site_index import clear_site_index
+from backend.service.site_management.site_management import clear_site_cache
+from backend.service.util import (
+    create_client_with_role,
+    create_resource_with_role,
+    get_role_session,
+)
 
 
 @pytest.fixture(autouse=True)
@@ -8,3 +16,8 @@ def clear_cache():
     # Clear the cache for any function decorated with a cache after a test has run
     create_resource_with_role.cache.clear()
     create_client_with_role.cache.clear()
+    get_role_session.cache.clear()
+    table_pool.clear()
+    clear_url_cache()
+    clear_site_cache()
+    clear_site_index()
@@ -11,6 +11,9 @@ TABLE_SPEC = dict(
         {"AttributeName": "type", "AttributeType": "S"},
         {"AttributeName": "last_modified_time", "AttributeType": "S"},
         {"AttributeName": "expiry_date", "AttributeType": "S"},
+        {"AttributeName": "entry_time", "AttributeType": "S"},
+        {"AttributeName": "visit_site_id", "AttributeType": "S"},
+        {"AttributeName": "visit_user_id", "AttributeType": "S"},
     ],
     KeySchema=[
         {"AttributeName": "pk", "KeyType": "HASH"},
@@ -33,6 +36,30 @@ TABLE_SPEC = dict(
             ],
             "Projection": {"ProjectionType": "ALL"},
         },
+        {
+            "IndexName": "GSI3",
+            "KeySchema": [
+                {"AttributeName": "visit_site_id", "KeyType": "HASH"},
+                {"AttributeName": "entry_time", "KeyType": "RANGE"},
+            ],
+            "Projection": {"ProjectionType": "ALL"},
+        },
+        {
+            "IndexName": "GSI4",
+            "KeySchema": [
+                {"AttributeName": "visit_user_id", "KeyType": "HASH"},
+                {"AttributeName": "entry_time", "KeyType": "RANGE"},
+            ],
+            "Projection": {"ProjectionType": "ALL"},
+        },
+        {
+            "IndexName": "GSI5",
+            "KeySchema": [
+                {"AttributeName": "type", "KeyType": "HASH"},
+                {"AttributeName": "entry_time", "KeyType": "RANGE"},
+            ],
+            "Projection": {"ProjectionType": "ALL"},
+        },
     ],
     BillingMode="PAY_PER_REQUEST",
 )
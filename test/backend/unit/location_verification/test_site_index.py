@@ -0,0 +1,189 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+from backend.service.database.db_table import DBTable
+from backend.service.location_verification import site_index
+from backend.service.location_verification.geofence import haversine, haversine_many
+from backend.service.location_verification.site_index import SiteIndex, get_site_index
+from backend.service.models.db.document import DBDocument
+from backend.service.models.db.site import DBSite
+from backend.service.site_management.site_management import create_site, delete_site, update_site
+from backend.service.util import AWSAccessLevel
+
+from ..constants import (
+    CURRENT_DATE_TIME,
+    FUTURE_DATE_TIME,
+    TEST_SITE_ID,
+    TEST_SITE_ID_ALT,
+    TEST_SITE_LATITUDE,
+    TEST_SITE_LATITUDE_ALT,
+    TEST_SITE_LONGITUDE,
+    TEST_SITE_RANGE,
+    TEST_USER_ID,
+)
+
+
+def test_site_index_near(db_site, db_site_new):
+    index = SiteIndex([db_site, db_site_new])
+
+    sites = index.near(43.2595, -79.9210, 1000)
+
+    assert [site for site, _ in sites] == [db_site]
+    assert sites[0][1] == pytest.approx(
+        haversine(43.2595, -79.9210, float(db_site.latitude), float(db_site.longitude))
+    )
+
+
+def test_site_index_near_across_antimeridian(db_site):
+    site = db_site.model_copy(update={"longitude": Decimal("179.999")})
+    index = SiteIndex([site])
+
+    assert [site for site, _ in index.near(float(site.latitude), -179.999, 1000)] == [site]
+
+
+def test_site_index_within_range(db_site, db_site_new):
+    index = SiteIndex([db_site, db_site_new])
+
+    assert index.within_range(43.2595, -79.9210, 0) == [db_site]
+    assert index.within_range(43.2598, -79.9210, 5) == [db_site]
+    assert index.within_range(43.2700, -79.9300, 0) == []
+
+
+def test_site_index_nearest(db_site, db_site_new):
+    index = SiteIndex([db_site, db_site_new])
+
+    site, _ = index.nearest(45.0, -79.9210)
+    assert site == db_site_new
+
+    index.remove(db_site_new.site_id)
+    site, _ = index.nearest(45.0, -79.9210)
+    assert site == db_site
+
+    index.remove(db_site.site_id)
+    assert index.nearest(45.0, -79.9210) is None
+
+
+def _random_sites(count: int) -> list[DBSite]:
+    rng = random.Random(0)
+    return [
+        DBSite(
+            last_modified_by=TEST_USER_ID,
+            last_modified_time=CURRENT_DATE_TIME,
+            site_id=f"S{i:05d}",
+            latitude=Decimal(str(rng.uniform(42, 45))),
+            longitude=Decimal(str(rng.uniform(-81, -78))),
+            acceptable_range=Decimal(str(round(rng.uniform(50, 500), 1))),
+        )
+        for i in range(count)
+    ]
+
+
+def test_haversine_many():
+    positions = [(43.2595, -79.9210), (-33.8688, 151.2093)]
+    centres = [(45.2595, -79.9210), (43.2595, -79.9210), (51.5074, -0.1278)]
+
+    distances = haversine_many(positions, centres)
+
+    assert distances == [
+        [pytest.approx(haversine(*position, *centre)) for centre in centres]
+        for position in positions
+    ]
+
+
+def test_site_index_batches(db_site, db_site_new):
+    index = SiteIndex([db_site, db_site_new])
+    positions = [(43.2595, -79.9210, 0), (43.2598, -79.9210, 5), (43.2700, -79.9300, 0)]
+
+    assert index.within_range_many(positions) == [
+        index.within_range(*position) for position in positions
+    ]
+    assert index.nearest_many(position[:2] for position in positions) == [
+        index.nearest(*position[:2]) for position in positions
+    ]
+    assert SiteIndex().nearest_many([(45.0, -79.9210)]) == [None]
+
+
+def test_site_index_batch_benchmark_against_scalar():
+    """
+    Compares the batch queries with checking every one of 10k sites using the scalar
+    haversine, by the results and by the number of distances calculated rather than by
+    timing, so that it does not depend on the speed of the machine running it
+    """
+    sites = _random_sites(10000)
+    rng = random.Random(1)
+    positions = [
+        (rng.uniform(42, 45), rng.uniform(-81, -78), rng.uniform(0, 50)) for _ in range(20)
+    ]
+    index = SiteIndex(sites)
+
+    scalar_distances = [
+        [haversine(lat, lon, float(site.latitude), float(site.longitude)) for site in sites]
+        for lat, lon, _ in positions
+    ]
+    expected_in_range = [
+        {
+            site.site_id
+            for site, distance in zip(sites, distances)
+            if distance <= float(site.acceptable_range) + accuracy
+        }
+        for (_, _, accuracy), distances in zip(positions, scalar_distances)
+    ]
+    expected_nearest = [
+        min(zip(sites, distances), key=lambda site: site[1])[0] for distances in scalar_distances
+    ]
+    scalar_count = len(sites) * len(positions)
+
+    with (
+        patch.object(site_index, "haversine", wraps=haversine) as scalar,
+        patch.object(site_index, "haversine_many", wraps=haversine_many) as batch,
+    ):
+        in_range = index.within_range_many(positions)
+        nearest = index.nearest_many((lat, lon) for lat, lon, _ in positions)
+    batch_count = scalar.call_count + sum(
+        len(call.args[0]) * len(call.args[1]) for call in batch.call_args_list
+    )
+
+    assert [{site.site_id for site in sites} for sites in in_range] == expected_in_range
+    assert [site for site, _ in nearest] == expected_nearest
+    # Both queries together calculate under a tenth of the distances of a single scalar pass
+    assert batch_count < scalar_count / 10
+
+
+def test_site_index_updated_by_site_management(database_with_site):
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSite)
+    index = get_site_index(table)
+    assert len(index) == 1
+
+    create_site(
+        table=table,
+        site_id=TEST_SITE_ID_ALT,
+        longitude=TEST_SITE_LONGITUDE,
+        latitude=TEST_SITE_LATITUDE_ALT,
+        acceptable_range=TEST_SITE_RANGE,
+        timestamp=CURRENT_DATE_TIME,
+        user_id=TEST_USER_ID,
+    )
+    assert [site.site_id for site, _ in index.near(45.2595, -79.9210, 1000)] == [TEST_SITE_ID_ALT]
+
+    # Moving a site moves it between cells of the index
+    update_site(
+        table=table,
+        timestamp=FUTURE_DATE_TIME,
+        user_id=TEST_USER_ID,
+        site_id=TEST_SITE_ID,
+        latitude=TEST_SITE_LATITUDE_ALT,
+    )
+    assert index.near(float(TEST_SITE_LATITUDE), float(TEST_SITE_LONGITUDE), 1000) == []
+    assert len(index.near(45.2595, -79.9210, 1000)) == 2
+
+    delete_site(
+        site_table=table,
+        document_table=DBTable(access=AWSAccessLevel.READ, item_schema=DBDocument),
+        site_id=TEST_SITE_ID,
+        timestamp=FUTURE_DATE_TIME + timedelta(seconds=1),
+    )
+    assert [site.site_id for site, _ in index.near(45.2595, -79.9210, 1000)] == [TEST_SITE_ID_ALT]
+    assert get_site_index(table) is index
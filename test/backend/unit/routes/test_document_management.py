@@ -3,10 +3,19 @@ from datetime import datetime
 from http import HTTPStatus
 
 from backend.service.database.db_table import DBTable, KeySchema
+from backend.service.document_management.document_management import index_document_tree
 from backend.service.handler import lambda_handler
-from backend.service.models.api.document import APIDocumentResponse, APIExpiringDocumentResponse
+from backend.service.models.api.document import (
+    APIDocumentResponse,
+    APIDocumentTreeIndexResponse,
+    APIDocumentTreeNode,
+    APIDocumentTreeResponse,
+    APIExpiringDocumentResponse,
+)
+from backend.service.models.db.document import DBDocument, DBDocumentTreeNode
+from backend.service.util import AWSAccessLevel
 
-from ..constants import TEST_DOCUMENT_ID, TEST_PARENT_FOLDER_ID
+from ..constants import TEST_DOCUMENT_ID, TEST_DOCUMENT_NAME, TEST_PARENT_FOLDER_ID, TEST_SITE_ID
 
 
 def test_get_presigned_url_handler(s3_bucket_with_item, get_presigned_url_request):
@@ -28,6 +37,23 @@ def test_upload_handler(empty_database, s3_bucket_with_item, upload_document_req
 def test_upload_with_conflict_handler(
     database_with_document, s3_bucket_with_item, upload_document_request
 ):
+    _, document = database_with_document
+    index_document_tree(
+        DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocument),
+        DBTable(access=AWSAccessLevel.WRITE, item_schema=DBDocumentTreeNode),
+        document.site_id,
+        document.parent_folder_id,
+    )
+    response = lambda_handler(event=upload_document_request[0], context=upload_document_request[1])
+
+    assert response["statusCode"] == HTTPStatus.CONFLICT
+    assert response["multiValueHeaders"]["Content-Type"] == ["application/json"]
+
+
+def test_upload_with_conflict_before_indexing_handler(
+    database_with_document, s3_bucket_with_item, upload_document_request
+):
+    # The document was uploaded before the document tree was kept, so has no tree nodes
     response = lambda_handler(event=upload_document_request[0], context=upload_document_request[1])
 
     assert response["statusCode"] == HTTPStatus.CONFLICT
@@ -44,6 +70,18 @@ def test_get_files_handler(database_with_document, s3_bucket_with_item, get_file
     assert first_document.parent_folder_id == TEST_PARENT_FOLDER_ID
 
 
+def test_get_files_handler_with_fields(
+    database_with_document, s3_bucket_with_item, get_files_with_fields_request
+):
+    response = lambda_handler(
+        event=get_files_with_fields_request[0], context=get_files_with_fields_request[1]
+    )
+    assert response["statusCode"] == HTTPStatus.OK
+    assert json.loads(response["body"]) == [
+        {"document_id": TEST_DOCUMENT_ID, "document_name": TEST_DOCUMENT_NAME}
+    ]
+
+
 def test_delete_files_handler(database_with_document, s3_bucket_with_item, delete_files_request):
     response = lambda_handler(event=delete_files_request[0], context=delete_files_request[1])
     assert response["statusCode"] == HTTPStatus.NO_CONTENT
@@ -68,6 +106,19 @@ def test_list_expiring_documents_handler_from_now(
     assert response["multiValueHeaders"]["Content-Type"] == ["application/json"]
 
 
+def test_list_expiring_documents_handler_with_fields(
+    database_with_document, list_expiring_documents_with_fields_request
+):
+    response = lambda_handler(
+        event=list_expiring_documents_with_fields_request[0],
+        context=list_expiring_documents_with_fields_request[1],
+    )
+    assert response["statusCode"] == HTTPStatus.OK
+    documents = json.loads(response["body"])["documents"]
+    assert [document.keys() for document in documents] == [{"document_id", "document_expiry"}]
+    assert documents[0]["document_id"] == TEST_DOCUMENT_ID
+
+
 def test_list_expiring_documents_handler_bad_role(
     database_with_document, list_expiring_documents_bad_role_request
 ):
@@ -124,3 +175,57 @@ def test_list_expiring_documents_handler_paginated(
     ]
     assert response_body.last_key is None
     assert response["multiValueHeaders"]["Content-Type"] == ["application/json"]
+
+
+def test_document_tree_handlers(
+    empty_database, s3_bucket_with_item, upload_document_request, api_gateway_event
+):
+    response = lambda_handler(event=upload_document_request[0], context=upload_document_request[1])
+    document = APIDocumentResponse.model_validate_json(response["body"])
+
+    event, context = api_gateway_event(
+        path=f"/protected/documents/{TEST_SITE_ID}/{TEST_PARENT_FOLDER_ID}/tree",
+        method="GET",
+        path_params={"site_id": TEST_SITE_ID, "folder": TEST_PARENT_FOLDER_ID},
+    )
+    response = lambda_handler(event=event, context=context)
+    assert response["statusCode"] == HTTPStatus.OK
+    tree = APIDocumentTreeResponse.model_validate_json(response["body"])
+    assert (tree.file_count, tree.folder_count) == (1, 0)
+    assert tree.documents[0].document_id == document.document_id
+
+    path = [TEST_PARENT_FOLDER_ID, document.document_name]
+    event, context = api_gateway_event(
+        path=f"/protected/documents/{TEST_SITE_ID}/resolve",
+        method="GET",
+        path_params={"site_id": TEST_SITE_ID},
+        query_params={"path": path[-1]},
+    )
+    event["multiValueQueryStringParameters"] = {"path": path}
+    response = lambda_handler(event=event, context=context)
+    assert response["statusCode"] == HTTPStatus.OK
+    assert APIDocumentTreeNode.model_validate_json(response["body"]).document_id == (
+        document.document_id
+    )
+
+
+def test_index_document_tree_handler(database_with_documents_and_folders, api_gateway_event):
+    event, context = api_gateway_event(
+        path=f"/protected/documents/{TEST_SITE_ID}/{TEST_PARENT_FOLDER_ID}/tree/index",
+        method="POST",
+        path_params={"site_id": TEST_SITE_ID, "folder": TEST_PARENT_FOLDER_ID},
+        user_role="admin",
+        user_groups=["admin"],
+    )
+    response = lambda_handler(event=event, context=context)
+    assert response["statusCode"] == HTTPStatus.OK
+    indexed = APIDocumentTreeIndexResponse.model_validate_json(response["body"])
+    assert indexed.indexed_documents == len(database_with_documents_and_folders[1])
+
+    event, context = api_gateway_event(
+        path=f"/protected/documents/{TEST_SITE_ID}/{TEST_PARENT_FOLDER_ID}/tree/index",
+        method="POST",
+        path_params={"site_id": TEST_SITE_ID, "folder": TEST_PARENT_FOLDER_ID},
+    )
+    response = lambda_handler(event=event, context=context)
+    assert response["statusCode"] == HTTPStatus.FORBIDDEN
@@ -1,13 +1,16 @@
+import json
 from http import HTTPStatus
 
 import pytest
 from backend.service.database.db_table import DBTable, KeySchema
 from backend.service.exceptions import ResourceNotFound
 from backend.service.handler import lambda_handler
-from backend.service.models.api.site import APIListSitesResponse, APISite
+from backend.service.models.api.site import APIListSitesResponse, APINearbySitesResponse, APISite
 from backend.service.models.db.site import DBSite
 from backend.service.util import AWSAccessLevel
 
+from ..constants import TEST_SITE_ID
+
 
 def test_list_sites_handler(database_with_two_sites, list_sites_request):
     _, set_of_db_entries = database_with_two_sites
@@ -21,6 +24,20 @@ def test_list_sites_handler(database_with_two_sites, list_sites_request):
     assert response["multiValueHeaders"]["Content-Type"] == ["application/json"]
 
 
+def test_list_sites_handler_with_fields(database_with_two_sites, list_sites_with_fields_request):
+    _, set_of_db_entries = database_with_two_sites
+
+    response = lambda_handler(
+        event=list_sites_with_fields_request[0], context=list_sites_with_fields_request[1]
+    )
+
+    assert response["statusCode"] == HTTPStatus.OK
+    sites = json.loads(response["body"])["sites"]
+    assert sorted(sites, key=lambda site: site["site_id"]) == [
+        {"site_id": site_id} for site_id in sorted(site.site_id for site in set_of_db_entries)
+    ]
+
+
 def test_list_sites_handler_paginated(
     database_with_two_sites, list_sites_request_paginated, api_gateway_event
 ):
@@ -169,3 +186,17 @@ def test_get_site_handler_bad_role(database_with_site, get_site_request_bad_role
 
     assert response["statusCode"] == HTTPStatus.FORBIDDEN
     assert response["multiValueHeaders"]["Content-Type"] == ["application/json"]
+
+
+def test_list_nearby_sites_handler(database_with_two_sites, list_nearby_sites_request):
+    _, set_of_db_entries = database_with_two_sites
+
+    response = lambda_handler(
+        event=list_nearby_sites_request[0], context=list_nearby_sites_request[1]
+    )
+
+    assert response["statusCode"] == HTTPStatus.OK
+    response_body = APINearbySitesResponse.model_validate_json(response["body"])
+    assert [site.site_id for site in response_body.sites] == [TEST_SITE_ID]
+    assert response_body.sites[0].distance < 100
+    assert response["multiValueHeaders"]["Content-Type"] == ["application/json"]
@@ -1,12 +1,21 @@
+import json
 from http import HTTPStatus
+from unittest.mock import patch
 
 from backend.service.database.db_table import DBTable, KeySchema
 from backend.service.environment import DOCUMENT_STORAGE_BUCKET_NAME
 from backend.service.file_storage.s3_bucket import S3Bucket
 from backend.service.handler import lambda_handler
-from backend.service.models.api.site_visit import APIListSiteVisitResponse, APISiteVisit
+from backend.service.models.api.site_visit import (
+    APILatestSiteVisit,
+    APIListSiteOccupantsResponse,
+    APIListSiteVisitResponse,
+    APISiteVisit,
+    APISiteVisitStatsResponse,
+    APIVisitExport,
+)
 from backend.service.models.db.site_visit import DBSiteVisit
-from backend.service.util import AWSAccessLevel, ItemType
+from backend.service.util import AWSAccessLevel, ExportStatus, ItemType
 
 from ..constants import (
     CURRENT_DATE_TIME,
@@ -75,6 +84,172 @@ def test_list_sites_visits_handler_paginated(
     assert response["multiValueHeaders"]["Content-Type"] == ["application/json"]
 
 
+def test_list_site_visits_by_entry_time_handler(
+    database_with_two_site_visits, list_site_visits_by_entry_time_request, db_site_visit_only_entry
+):
+    response = lambda_handler(
+        event=list_site_visits_by_entry_time_request[0],
+        context=list_site_visits_by_entry_time_request[1],
+    )
+
+    bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.READ)
+
+    assert response["statusCode"] == HTTPStatus.OK
+    assert APIListSiteVisitResponse.model_validate_json(response["body"]).visits == [
+        db_site_visit_only_entry.to_api_model(bucket=bucket)
+    ]
+
+
+def test_list_site_visits_by_entry_time_handler_before_index(
+    database_with_two_site_visits, list_site_visits_by_entry_time_request
+):
+    with patch("backend.service.database.db_table.DATABASE_INDEX_STAGE", 4):
+        response = lambda_handler(
+            event=list_site_visits_by_entry_time_request[0],
+            context=list_site_visits_by_entry_time_request[1],
+        )
+
+    assert response["statusCode"] == HTTPStatus.SERVICE_UNAVAILABLE
+    assert "GSI5" in json.loads(response["body"])["error"]
+
+
+def test_list_site_visits_handler_without_urls(
+    database_with_two_site_visits, list_site_visits_without_urls_request
+):
+    response = lambda_handler(
+        event=list_site_visits_without_urls_request[0],
+        context=list_site_visits_without_urls_request[1],
+    )
+
+    assert response["statusCode"] == HTTPStatus.OK
+    visits = APIListSiteVisitResponse.model_validate_json(response["body"]).visits
+    attachments = [attachment for visit in visits for attachment in visit.attachments]
+    assert [(attachment.name, attachment.url) for attachment in attachments] == [
+        (TEST_ATTACHMENT_NAME, None)
+    ]
+
+
+def test_list_site_visits_handler_with_fields(
+    database_with_two_site_visits, list_site_visits_with_fields_request
+):
+    _, db_entries = database_with_two_site_visits
+
+    response = lambda_handler(
+        event=list_site_visits_with_fields_request[0],
+        context=list_site_visits_with_fields_request[1],
+    )
+
+    assert response["statusCode"] == HTTPStatus.OK
+    visits = json.loads(response["body"])["visits"]
+    assert [visit.keys() for visit in visits] == [{"site_id", "entry_time"}] * len(db_entries)
+    assert sorted(visit["site_id"] for visit in visits) == sorted(
+        entry.site_id for entry in db_entries
+    )
+
+
+def test_list_site_visits_handler_unknown_field(
+    database_with_two_site_visits, list_site_visits_unknown_field_request
+):
+    response = lambda_handler(
+        event=list_site_visits_unknown_field_request[0],
+        context=list_site_visits_unknown_field_request[1],
+    )
+
+    assert response["statusCode"] == HTTPStatus.BAD_REQUEST
+
+
+def test_list_site_visits_for_site_handler(
+    database_with_two_site_visits, list_site_visits_for_site_request, db_site_visit_only_entry
+):
+    response = lambda_handler(
+        event=list_site_visits_for_site_request[0], context=list_site_visits_for_site_request[1]
+    )
+
+    bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.READ)
+
+    assert response["statusCode"] == HTTPStatus.OK
+    assert APIListSiteVisitResponse.model_validate_json(response["body"]).visits == [
+        db_site_visit_only_entry.to_api_model(bucket=bucket)
+    ]
+
+
+def test_list_site_visits_for_site_and_user_handler(
+    database_with_two_site_visits, list_site_visits_for_site_and_user_request
+):
+    response = lambda_handler(
+        event=list_site_visits_for_site_and_user_request[0],
+        context=list_site_visits_for_site_and_user_request[1],
+    )
+
+    assert response["statusCode"] == HTTPStatus.BAD_REQUEST
+    assert response["multiValueHeaders"]["Content-Type"] == ["application/json"]
+
+
+def test_get_site_visit_stats_handler(database_with_two_site_visits, get_site_visit_stats_request):
+    response = lambda_handler(
+        event=get_site_visit_stats_request[0], context=get_site_visit_stats_request[1]
+    )
+
+    assert response["statusCode"] == HTTPStatus.OK
+    stats = APISiteVisitStatsResponse.model_validate_json(response["body"]).stats
+    assert [(group.site_id, group.visits) for group in stats] == [(TEST_SITE_ID, 1)]
+    assert response["multiValueHeaders"]["Content-Type"] == ["application/json"]
+
+
+def test_get_site_visit_stats_without_range_handler(
+    database_with_two_site_visits, get_site_visit_stats_without_range_request
+):
+    response = lambda_handler(
+        event=get_site_visit_stats_without_range_request[0],
+        context=get_site_visit_stats_without_range_request[1],
+    )
+
+    assert response["statusCode"] == HTTPStatus.BAD_REQUEST
+    assert response["multiValueHeaders"]["Content-Type"] == ["application/json"]
+
+
+def test_list_site_visit_rollups_handler(
+    empty_database, enter_site_request, list_site_visit_rollups_request
+):
+    lambda_handler(event=enter_site_request[0], context=enter_site_request[1])
+
+    response = lambda_handler(
+        event=list_site_visit_rollups_request[0], context=list_site_visit_rollups_request[1]
+    )
+
+    assert response["statusCode"] == HTTPStatus.OK
+    [stats] = APISiteVisitStatsResponse.model_validate_json(response["body"]).stats
+    assert (stats.site_id, stats.visits, stats.ack_rate) == (TEST_SITE_ID, 1, 1.0)
+    assert response["multiValueHeaders"]["Content-Type"] == ["application/json"]
+
+
+def test_export_site_visits_handler(
+    database_with_two_site_visits, empty_s3_bucket, export_site_visits_request
+):
+    response = lambda_handler(
+        event=export_site_visits_request[0], context=export_site_visits_request[1]
+    )
+
+    assert response["statusCode"] == HTTPStatus.OK
+    export = APIVisitExport.model_validate_json(response["body"])
+    assert export.status == ExportStatus.COMPLETE.value
+    assert export.visits_exported == 2
+    assert export.url is not None
+    assert response["multiValueHeaders"]["Content-Type"] == ["application/json"]
+
+
+def test_continue_missing_visit_export_handler(
+    empty_database, empty_s3_bucket, continue_missing_visit_export_request
+):
+    response = lambda_handler(
+        event=continue_missing_visit_export_request[0],
+        context=continue_missing_visit_export_request[1],
+    )
+
+    assert response["statusCode"] == HTTPStatus.NOT_FOUND
+    assert response["multiValueHeaders"]["Content-Type"] == ["application/json"]
+
+
 def test_list_site_visits_handler_bad_role(
     database_with_two_site_visits, list_site_visits_request_bad_role
 ):
@@ -117,6 +292,29 @@ def test_get_visit_handler(database_with_complete_site_visit, get_site_visit_req
     assert response["multiValueHeaders"]["Content-Type"] == ["application/json"]
 
 
+def test_get_latest_visit_handler(
+    empty_database, enter_site_request, get_latest_site_visit_request
+):
+    response = lambda_handler(
+        event=get_latest_site_visit_request[0], context=get_latest_site_visit_request[1]
+    )
+    assert response["statusCode"] == HTTPStatus.NOT_FOUND
+
+    lambda_handler(event=enter_site_request[0], context=enter_site_request[1])
+    response = lambda_handler(
+        event=get_latest_site_visit_request[0], context=get_latest_site_visit_request[1]
+    )
+
+    assert response["statusCode"] == HTTPStatus.OK
+    latest = APILatestSiteVisit.model_validate_json(response["body"])
+    assert (latest.site_id, latest.entry_time, latest.exit_time) == (
+        TEST_SITE_ID,
+        CURRENT_DATE_TIME,
+        None,
+    )
+    assert response["multiValueHeaders"]["Content-Type"] == ["application/json"]
+
+
 def test_enter_site_handler(empty_database, enter_site_request, db_site_visit_only_entry):
     response = lambda_handler(event=enter_site_request[0], context=enter_site_request[1])
 
@@ -209,3 +407,18 @@ def test_remove_file_attachment_handler(
         attachment.name for attachment in validated_response_body.attachments
     ]
     assert response["multiValueHeaders"]["Content-Type"] == ["application/json"]
+
+
+def test_list_site_occupants_handler(
+    empty_database, enter_site_request, list_site_occupants_request
+):
+    lambda_handler(event=enter_site_request[0], context=enter_site_request[1])
+
+    response = lambda_handler(
+        event=list_site_occupants_request[0], context=list_site_occupants_request[1]
+    )
+
+    assert response["statusCode"] == HTTPStatus.OK
+    occupants = APIListSiteOccupantsResponse.model_validate_json(response["body"]).occupants
+    assert [occupant.site_id for occupant in occupants] == [TEST_SITE_ID]
+    assert response["multiValueHeaders"]["Content-Type"] == ["application/json"]
@@ -11,6 +11,7 @@ from backend.service.models.db.site import DBSite
 from backend.service.site_management.site_management import (
     create_site,
     delete_site,
+    get_cached_site,
     get_site,
     list_sites,
     update_site,
@@ -155,6 +156,49 @@ def test_get_site_not_found(empty_database):
         get_site(table=table, site_id=TEST_SITE_ID)
 
 
+def test_get_cached_site(database_with_site):
+    resource, site = database_with_site
+    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBSite)
+    assert site == get_cached_site(table=table, site_id=site.site_id)
+
+    # Later reads are served from the cache, without reading the database
+    resource.delete_item(Key=KeySchema(pk=site.pk, sk=site.sk))
+    assert site == get_cached_site(table=table, site_id=site.site_id)
+
+
+def test_get_cached_site_after_update(database_with_site):
+    resource, old_site = database_with_site
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSite)
+    assert old_site == get_cached_site(table=table, site_id=TEST_SITE_ID)
+
+    new_site = update_site(
+        table=table,
+        timestamp=FUTURE_DATE_TIME,
+        user_id=TEST_USER_ID,
+        site_id=TEST_SITE_ID,
+        latitude=TEST_SITE_LATITUDE_ALT,
+    )
+
+    assert new_site == get_cached_site(table=table, site_id=TEST_SITE_ID)
+
+
+def test_get_cached_site_after_delete(database_with_site):
+    resource, old_site = database_with_site
+    site_table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSite)
+    document_table = DBTable(access=AWSAccessLevel.READ, item_schema=DBDocument)
+    assert old_site == get_cached_site(table=site_table, site_id=TEST_SITE_ID)
+
+    delete_site(
+        site_table=site_table,
+        document_table=document_table,
+        site_id=TEST_SITE_ID,
+        timestamp=FUTURE_DATE_TIME,
+    )
+
+    with pytest.raises(ResourceNotFound):
+        get_cached_site(table=site_table, site_id=TEST_SITE_ID)
+
+
 def test_list_sites(database_with_two_sites):
     resource, sites = database_with_two_sites
     table = DBTable(access=AWSAccessLevel.READ, item_schema=DBSite)
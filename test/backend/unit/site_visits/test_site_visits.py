@@ -1,5 +1,6 @@
 from datetime import timedelta
 from http import HTTPStatus
+from unittest.mock import DEFAULT, patch
 
 import pytest
 from backend.service.database.db_table import DBTable, KeySchema
@@ -13,17 +14,27 @@ from backend.service.exceptions import (
 )
 from backend.service.file_storage.s3_bucket import S3Bucket
 from backend.service.models.api.site_visit import EditableSiteVisitDetails
-from backend.service.models.db.site_visit import DBSiteVisit
+from backend.service.models.db.site_visit import (
+    DBLatestSiteVisit,
+    DBSiteOccupant,
+    DBSiteVisit,
+    DBSiteVisitRollup,
+)
 from backend.service.site_visits.site_visits import (
     add_exit_time,
     create_file_attachment,
     create_site_entry,
     delete_file_attachment,
+    get_latest_site_visit,
     get_site_visit,
+    list_site_occupants,
+    list_site_visit_rollups,
     list_site_visits,
+    list_visits_for_site,
+    list_visits_for_user,
     update_visit_details,
 )
-from backend.service.util import AWSAccessLevel, ItemType
+from backend.service.util import AWSAccessLevel, ItemType, VisitTimeRange
 from botocore.exceptions import ClientError
 
 from ..constants import (
@@ -33,8 +44,10 @@ from ..constants import (
     TEST_ATTACHMENT_NAME,
     TEST_S3_FILE_KEY,
     TEST_SITE_ID,
+    TEST_SITE_ID_ALT,
     TEST_USER_EMAIL,
     TEST_USER_ID,
+    TEST_USER_ID_ALT,
     TEST_VISIT_DESCRIPTION,
     TEST_WORK_ORDER,
 )
@@ -56,6 +69,11 @@ def test_create_site_entry(empty_database):
 
     assert table.get(key=KeySchema(pk=visit.pk, sk=visit.sk)) == visit
 
+    occupant_table = DBTable(access=AWSAccessLevel.READ, item_schema=DBSiteOccupant)
+    assert list_site_occupants(table=occupant_table, site_id=TEST_SITE_ID) == [
+        DBSiteOccupant.from_visit(visit)
+    ]
+
 
 def test_create_site_entry_with_resource_conflict(database_with_complete_site_visit):
     _, site_visit = database_with_complete_site_visit
@@ -88,6 +106,173 @@ def test_add_exit_time(database_with_two_site_visits):
     assert table.get(key=KeySchema(pk=updated_visit.pk, sk=updated_visit.sk)) == updated_visit
 
 
+def test_add_exit_time_removes_occupant(empty_database):
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisit)
+    occupant_table = DBTable(access=AWSAccessLevel.READ, item_schema=DBSiteOccupant)
+
+    for user_id in [TEST_USER_ID, TEST_USER_ID_ALT]:
+        create_site_entry(
+            table=table,
+            site_id=TEST_SITE_ID,
+            user_id=user_id,
+            user_email=TEST_USER_EMAIL,
+            timestamp=CURRENT_DATE_TIME,
+            loc_tracking=True,
+            ack_status=True,
+            on_site=True,
+        )
+    assert len(list_site_occupants(table=occupant_table, site_id=TEST_SITE_ID)) == 2
+
+    add_exit_time(
+        table=table,
+        site_id=TEST_SITE_ID,
+        user_id=TEST_USER_ID,
+        timestamp=FUTURE_DATE_TIME,
+        entry_time=CURRENT_DATE_TIME,
+    )
+
+    occupants = list_site_occupants(table=occupant_table, site_id=TEST_SITE_ID)
+    assert [occupant.user_id for occupant in occupants] == [TEST_USER_ID_ALT]
+
+
+def test_site_visit_rollups(empty_database):
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisit)
+    rollup_table = DBTable(access=AWSAccessLevel.READ, item_schema=DBSiteVisitRollup)
+
+    for user_id, on_site in [(TEST_USER_ID, True), (TEST_USER_ID_ALT, None)]:
+        create_site_entry(
+            table=table,
+            site_id=TEST_SITE_ID,
+            user_id=user_id,
+            user_email=TEST_USER_EMAIL,
+            timestamp=CURRENT_DATE_TIME,
+            loc_tracking=on_site is not None,
+            ack_status=on_site is not None,
+            on_site=on_site,
+        )
+    add_exit_time(
+        table=table,
+        site_id=TEST_SITE_ID,
+        user_id=TEST_USER_ID,
+        timestamp=CURRENT_DATE_TIME + timedelta(minutes=10),
+        entry_time=CURRENT_DATE_TIME,
+    )
+
+    [rollup] = list_site_visit_rollups(table=rollup_table, site_id=TEST_SITE_ID)
+    assert rollup.entry_date == CURRENT_DATE_TIME.date()
+    assert rollup.visits == 2
+    assert rollup.acknowledged_visits == 1
+    assert rollup.tracked_visits == 1
+    assert rollup.on_site_visits == 1
+    assert rollup.exited_visits == 1
+    assert rollup.dwell_seconds == 600
+
+    # Exiting again only changes the dwell time
+    add_exit_time(
+        table=table,
+        site_id=TEST_SITE_ID,
+        user_id=TEST_USER_ID,
+        timestamp=CURRENT_DATE_TIME + timedelta(minutes=15),
+        entry_time=CURRENT_DATE_TIME,
+    )
+    [rollup] = list_site_visit_rollups(table=rollup_table, site_id=TEST_SITE_ID)
+    assert rollup.exited_visits == 1
+    assert rollup.dwell_seconds == 900
+
+    assert list_site_visit_rollups(
+        table=rollup_table, site_id=TEST_SITE_ID, to_date=PREV_DATE_TIME.date()
+    ) == []
+
+
+def test_site_visit_rollups_with_conflicting_entry(empty_database):
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisit)
+    rollup_table = DBTable(access=AWSAccessLevel.READ, item_schema=DBSiteVisitRollup)
+    client = table._resource.meta.client
+
+    # Another entry writing the same totals of the day cancels the first attempt
+    conflict = ClientError(
+        error_response={
+            "Error": {"Code": "TransactionCanceledException", "Message": "Transaction cancelled"},
+            "CancellationReasons": [{"Code": "None"}] * 3 + [{"Code": "TransactionConflict"}],
+        },
+        operation_name="TransactWriteItems",
+    )
+    attempts = [(TEST_USER_ID, [DEFAULT]), (TEST_USER_ID_ALT, [conflict, DEFAULT])]
+    for user_id, side_effect in attempts:
+        with (
+            patch.object(
+                client,
+                "transact_write_items",
+                wraps=client.transact_write_items,
+                side_effect=side_effect,
+            ),
+            patch("backend.service.database.db_table.time.sleep") as sleep,
+        ):
+            create_site_entry(
+                table=table,
+                site_id=TEST_SITE_ID,
+                user_id=user_id,
+                user_email=TEST_USER_EMAIL,
+                timestamp=CURRENT_DATE_TIME,
+                loc_tracking=True,
+                ack_status=True,
+                on_site=True,
+            )
+        assert sleep.call_count == len(side_effect) - 1
+
+    [rollup] = list_site_visit_rollups(table=rollup_table, site_id=TEST_SITE_ID)
+    assert rollup.visits == 2
+
+
+def test_latest_site_visit(empty_database):
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisit)
+    latest_table = DBTable(access=AWSAccessLevel.READ, item_schema=DBLatestSiteVisit)
+    occupant_table = DBTable(access=AWSAccessLevel.READ, item_schema=DBSiteOccupant)
+
+    with pytest.raises(ResourceNotFound):
+        get_latest_site_visit(table=latest_table, user_id=TEST_USER_ID)
+
+    visits = [(TEST_SITE_ID, PREV_DATE_TIME), (TEST_SITE_ID_ALT, CURRENT_DATE_TIME)]
+    for site_id, entry_time in visits:
+        create_site_entry(
+            table=table,
+            site_id=site_id,
+            user_id=TEST_USER_ID,
+            user_email=TEST_USER_EMAIL,
+            timestamp=entry_time,
+            loc_tracking=False,
+            ack_status=True,
+        )
+    latest = get_latest_site_visit(table=latest_table, user_id=TEST_USER_ID)
+    assert (latest.site_id, latest.entry_time, latest.exit_time) == (
+        TEST_SITE_ID_ALT,
+        CURRENT_DATE_TIME,
+        None,
+    )
+
+    # Exiting an earlier visit leaves the latest visit as it was
+    add_exit_time(
+        table=table,
+        site_id=TEST_SITE_ID,
+        user_id=TEST_USER_ID,
+        timestamp=FUTURE_DATE_TIME,
+        entry_time=PREV_DATE_TIME,
+    )
+    assert get_latest_site_visit(table=latest_table, user_id=TEST_USER_ID) == latest
+    assert list_site_occupants(table=occupant_table, site_id=TEST_SITE_ID) == []
+
+    add_exit_time(
+        table=table,
+        site_id=TEST_SITE_ID_ALT,
+        user_id=TEST_USER_ID,
+        timestamp=FUTURE_DATE_TIME,
+        entry_time=CURRENT_DATE_TIME,
+    )
+    latest = get_latest_site_visit(table=latest_table, user_id=TEST_USER_ID)
+    assert (latest.site_id, latest.exit_time) == (TEST_SITE_ID_ALT, FUTURE_DATE_TIME)
+    assert list_site_occupants(table=occupant_table, site_id=TEST_SITE_ID_ALT) == []
+
+
 def test_add_exit_time_with_resource_not_found(empty_database):
     table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisit)
 
@@ -168,6 +353,81 @@ def test_list_site_entries_paginated(database_with_two_site_visits):
     assert last_eval is None
 
 
+def test_list_site_entries_by_entry_time(database_with_two_site_visits):
+    database, [complete_visit, entry_only_visit] = database_with_two_site_visits
+    edited_visit = complete_visit.model_copy(update={"last_modified_time": FUTURE_DATE_TIME})
+    database.put_item(Item=edited_visit.model_dump())
+    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBSiteVisit)
+
+    # The edit moves the old visit into the range of last modified times
+    visits, _ = list_site_visits(table=table, from_time=CURRENT_DATE_TIME)
+    assert len(visits) == 2
+
+    visits, _ = list_site_visits(
+        table=table, from_time=CURRENT_DATE_TIME, time_range=VisitTimeRange.ENTRY
+    )
+    assert visits == [entry_only_visit]
+
+    visits, _ = list_site_visits(
+        table=table,
+        from_time=PREV_DATE_TIME,
+        to_time=PREV_DATE_TIME,
+        time_range=VisitTimeRange.ENTRY,
+    )
+    assert visits == [edited_visit]
+
+
+def test_list_visits_for_site(database_with_two_site_visits):
+    database, [complete_visit, entry_only_visit] = database_with_two_site_visits
+    other_visit = complete_visit.model_copy(update={"site_id": TEST_SITE_ID_ALT})
+    database.put_item(Item=other_visit.model_dump())
+    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBSiteVisit)
+
+    visits, _ = list_visits_for_site(table=table, site_id=TEST_SITE_ID)
+    assert visits == [entry_only_visit, complete_visit]
+
+    visits, _ = list_visits_for_site(table=table, site_id=TEST_SITE_ID, from_time=CURRENT_DATE_TIME)
+    assert visits == [entry_only_visit]
+
+    visits, _ = list_visits_for_site(table=table, site_id=TEST_SITE_ID_ALT)
+    assert visits == [other_visit]
+
+
+def test_list_visits_for_user(database_with_two_site_visits):
+    database, [complete_visit, entry_only_visit] = database_with_two_site_visits
+    other_visit = complete_visit.model_copy(update={"user_id": TEST_USER_ID_ALT})
+    database.put_item(Item=other_visit.model_dump())
+    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBSiteVisit)
+
+    visits, _ = list_visits_for_user(table=table, user_id=TEST_USER_ID)
+    assert visits == [entry_only_visit, complete_visit]
+
+    visits, _ = list_visits_for_user(table=table, user_id=TEST_USER_ID, to_time=PREV_DATE_TIME)
+    assert visits == [complete_visit]
+
+    visits, last_eval = list_visits_for_user(table=table, user_id=TEST_USER_ID, limit=1)
+    assert visits == [entry_only_visit]
+    visits, last_eval = list_visits_for_user(
+        table=table, user_id=TEST_USER_ID, limit=1, start_key=last_eval
+    )
+    assert visits == [complete_visit]
+
+
+def test_site_visits_to_api_models(db_site_visit_complete, db_site_visit_only_entry):
+    bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.READ)
+    visits = [db_site_visit_complete, db_site_visit_only_entry, db_site_visit_complete]
+
+    # The attachments of every visit are signed together
+    with patch.object(S3Bucket, "create_get_urls", wraps=bucket.create_get_urls) as sign:
+        api_visits = DBSiteVisit.to_api_models(visits, bucket=bucket)
+    sign.assert_called_once()
+    assert api_visits == [visit.to_api_model(bucket=bucket) for visit in visits]
+
+    api_visits = DBSiteVisit.to_api_models(visits, bucket=None)
+    assert [attachment.url for attachment in api_visits[0].attachments] == [None]
+    assert api_visits[1].attachments == []
+
+
 def test_add_file_attachment(database_with_two_site_visits):
     table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisit)
     create_file_attachment(
@@ -241,6 +501,30 @@ def test_add_file_attachment_exceeds_limit(database_with_two_site_visits):
         )
 
 
+def test_add_file_attachment_errors(database_with_two_site_visits):
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisit)
+    with pytest.raises(ResourceNotFound):
+        create_file_attachment(
+            table=table,
+            site_id=TEST_SITE_ID_ALT,
+            user_id=TEST_USER_ID,
+            entry_time=CURRENT_DATE_TIME,
+            timestamp=FUTURE_DATE_TIME,
+            name=TEST_ATTACHMENT_NAME,
+            s3_key=TEST_S3_FILE_KEY,
+        )
+    with pytest.raises(TimeConsistencyException):
+        create_file_attachment(
+            table=table,
+            site_id=TEST_SITE_ID,
+            user_id=TEST_USER_ID,
+            entry_time=CURRENT_DATE_TIME,
+            timestamp=PREV_DATE_TIME,
+            name=TEST_ATTACHMENT_NAME,
+            s3_key=TEST_S3_FILE_KEY,
+        )
+
+
 def test_delete_file_attachment(database_with_two_site_visits, s3_bucket_with_item):
     client, _ = s3_bucket_with_item
     table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisit)
@@ -0,0 +1,172 @@
+import csv
+import gzip
+import io
+import json
+from datetime import timedelta
+
+import pytest
+from backend.service.database.db_table import DBTable
+from backend.service.environment import DOCUMENT_STORAGE_BUCKET_NAME
+from backend.service.exceptions import ResourceConflict
+from backend.service.file_storage.s3_bucket import S3Bucket
+from backend.service.models.db.site_visit import DBSiteVisit, DBVisitExport
+from backend.service.site_visits.visit_export import (
+    EXPORT_COLUMNS,
+    continue_visit_export,
+    get_visit_export,
+    start_visit_export,
+)
+from backend.service.util import AWSAccessLevel, ExportFormat, ExportStatus
+
+from ..constants import (
+    CURRENT_DATE_TIME,
+    FUTURE_DATE_TIME,
+    PREV_DATE_TIME,
+    TEST_SITE_ID,
+    TEST_USER_EMAIL,
+    TEST_USER_ID,
+)
+
+
+def _download(client, export: DBVisitExport) -> str:
+    response = client.get_object(Bucket=DOCUMENT_STORAGE_BUCKET_NAME, Key=export.s3_key)
+    return gzip.decompress(response["Body"].read()).decode("utf-8")
+
+
+def test_export_site_visits_csv(database_with_two_site_visits, empty_s3_bucket):
+    visit_table = DBTable(access=AWSAccessLevel.READ, item_schema=DBSiteVisit)
+    export_table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBVisitExport)
+    bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.WRITE)
+
+    export = start_visit_export(
+        export_table=export_table,
+        bucket=bucket,
+        export_format=ExportFormat.CSV,
+        timestamp=FUTURE_DATE_TIME,
+        user_id=TEST_USER_ID,
+    )
+    assert export.status == ExportStatus.IN_PROGRESS.value
+    assert get_visit_export(export_table, export.export_id) == export
+
+    export = continue_visit_export(
+        visit_table, export_table, bucket, export, FUTURE_DATE_TIME, time_remaining=lambda: 60
+    )
+    assert export.status == ExportStatus.COMPLETE.value
+    assert export.visits_exported == 2
+    assert get_visit_export(export_table, export.export_id) == export
+
+    reader = csv.DictReader(io.StringIO(_download(empty_s3_bucket, export)))
+    assert tuple(reader.fieldnames) == EXPORT_COLUMNS
+    rows = list(reader)
+    assert [row["entry_time"] for row in rows] == [
+        PREV_DATE_TIME.isoformat(),
+        CURRENT_DATE_TIME.isoformat(),
+    ]
+    assert rows[0]["exit_time"] == CURRENT_DATE_TIME.isoformat()
+    assert rows[1]["exit_time"] == ""
+    assert {row["user_email"] for row in rows} == {TEST_USER_EMAIL}
+
+
+def test_export_site_visits_continued(database_with_two_site_visits, empty_s3_bucket):
+    visit_table = DBTable(access=AWSAccessLevel.READ, item_schema=DBSiteVisit)
+    export_table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBVisitExport)
+    bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.WRITE)
+
+    export = start_visit_export(
+        export_table=export_table,
+        bucket=bucket,
+        export_format=ExportFormat.NDJSON,
+        timestamp=CURRENT_DATE_TIME,
+        user_id=TEST_USER_ID,
+        site_id=TEST_SITE_ID,
+    )
+
+    # Every invocation runs out of time after a single visit
+    for expected_visits in [1, 2]:
+        export = continue_visit_export(
+            visit_table,
+            export_table,
+            bucket,
+            get_visit_export(export_table, export.export_id),
+            FUTURE_DATE_TIME,
+            time_remaining=lambda: 0,
+        )
+        assert export.status == ExportStatus.IN_PROGRESS.value
+        assert export.visits_exported == expected_visits
+        assert export.pending_size > 0
+        assert export.parts == []
+
+    export = continue_visit_export(
+        visit_table, export_table, bucket, export, FUTURE_DATE_TIME, time_remaining=lambda: 0
+    )
+    assert export.status == ExportStatus.COMPLETE.value
+    assert export.visits_exported == 2
+    assert len(export.parts) == 1
+
+    lines = [json.loads(line) for line in _download(empty_s3_bucket, export).splitlines()]
+    assert [line["entry_time"] for line in lines] == [
+        PREV_DATE_TIME.isoformat(),
+        CURRENT_DATE_TIME.isoformat(),
+    ]
+    assert all(line["site_id"] == TEST_SITE_ID for line in lines)
+    assert lines[1]["attachments"] == []
+
+
+def test_continue_visit_export_conflict(database_with_two_site_visits, empty_s3_bucket):
+    visit_table = DBTable(access=AWSAccessLevel.READ, item_schema=DBSiteVisit)
+    export_table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBVisitExport)
+    bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.WRITE)
+
+    export = start_visit_export(
+        export_table=export_table,
+        bucket=bucket,
+        export_format=ExportFormat.CSV,
+        timestamp=CURRENT_DATE_TIME,
+        user_id=TEST_USER_ID,
+    )
+    continue_visit_export(
+        visit_table, export_table, bucket, export, FUTURE_DATE_TIME, time_remaining=lambda: 0
+    )
+
+    # The export was saved after it was read
+    with pytest.raises(ResourceConflict):
+        continue_visit_export(
+            visit_table, export_table, bucket, export, FUTURE_DATE_TIME, time_remaining=lambda: 0
+        )
+
+
+def test_continue_visit_export_claimed(database_with_two_site_visits, empty_s3_bucket):
+    visit_table = DBTable(access=AWSAccessLevel.READ, item_schema=DBSiteVisit)
+    export_table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBVisitExport)
+    bucket = S3Bucket(bucket_name=DOCUMENT_STORAGE_BUCKET_NAME, access=AWSAccessLevel.WRITE)
+
+    export = start_visit_export(
+        export_table=export_table,
+        bucket=bucket,
+        export_format=ExportFormat.CSV,
+        timestamp=CURRENT_DATE_TIME,
+        user_id=TEST_USER_ID,
+    )
+    # Another invocation is still continuing the export
+    export = export_table.put(
+        export.model_copy(update={"claimed_until": FUTURE_DATE_TIME + timedelta(minutes=1)})
+    )
+
+    with pytest.raises(ResourceConflict):
+        continue_visit_export(
+            visit_table, export_table, bucket, export, FUTURE_DATE_TIME, time_remaining=lambda: 0
+        )
+    assert "Contents" not in empty_s3_bucket.list_objects_v2(Bucket=DOCUMENT_STORAGE_BUCKET_NAME)
+    assert get_visit_export(export_table, export.export_id) == export
+
+    # The claim has expired
+    export = continue_visit_export(
+        visit_table,
+        export_table,
+        bucket,
+        export,
+        FUTURE_DATE_TIME + timedelta(minutes=2),
+        time_remaining=lambda: 60,
+    )
+    assert export.status == ExportStatus.COMPLETE.value
+    assert export.claimed_until is None
@@ -0,0 +1,247 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from backend.service.database.db_table import DBTable
+from backend.service.exceptions import BadRequestException
+from backend.service.models.db.site_visit import DBSiteVisit, DBSiteVisitRollup, DBSiteVisitSummary
+from backend.service.site_visits import visit_stats
+from backend.service.site_visits.site_visits import create_site_entry, list_site_visit_rollups
+from backend.service.site_visits.visit_stats import (
+    ROLLUP_REBUILD_MAX_DAYS,
+    STATS_MAX_DAYS,
+    DwellHistogram,
+    get_site_visit_stats,
+    rebuild_site_visit_rollups,
+    summarize_visits,
+)
+from backend.service.util import AWSAccessLevel
+
+from ..constants import (
+    CURRENT_DATE_TIME,
+    FUTURE_DATE_TIME,
+    PREV_DATE_TIME,
+    TEST_SITE_ID,
+    TEST_SITE_ID_ALT,
+    TEST_USER_EMAIL_ALT,
+    TEST_USER_ID,
+    TEST_USER_ID_ALT,
+)
+
+
+def test_dwell_histogram_percentiles():
+    histogram = DwellHistogram()
+    assert histogram.percentile(0.5) is None
+    assert histogram.mean() is None
+
+    for seconds in range(1, 1001):
+        histogram.add(seconds)
+
+    assert histogram.count == 1000
+    assert histogram.mean() == pytest.approx(500.5)
+    assert histogram.percentile(0.5) == pytest.approx(500, rel=0.02)
+    assert histogram.percentile(0.9) == pytest.approx(900, rel=0.02)
+    assert histogram.percentile(0.99) == pytest.approx(990, rel=0.02)
+
+
+def test_summarize_visits():
+    visits = [
+        DBSiteVisitSummary(
+            site_id=TEST_SITE_ID,
+            entry_time=CURRENT_DATE_TIME,
+            exit_time=CURRENT_DATE_TIME + timedelta(minutes=10),
+            ack_status=True,
+            on_site=True,
+        ),
+        DBSiteVisitSummary(
+            site_id=TEST_SITE_ID,
+            entry_time=CURRENT_DATE_TIME + timedelta(minutes=1),
+            exit_time=CURRENT_DATE_TIME + timedelta(minutes=31),
+            ack_status=False,
+            on_site=False,
+        ),
+        DBSiteVisitSummary(
+            site_id=TEST_SITE_ID,
+            entry_time=CURRENT_DATE_TIME + timedelta(minutes=2),
+            ack_status=True,
+        ),
+        DBSiteVisitSummary(
+            site_id=TEST_SITE_ID_ALT,
+            entry_time=PREV_DATE_TIME,
+            ack_status=True,
+        ),
+    ]
+
+    stats = summarize_visits(iter(visits))
+
+    assert [(group.site_id, group.day) for group in stats] == [
+        (TEST_SITE_ID, CURRENT_DATE_TIME.date()),
+        (TEST_SITE_ID_ALT, PREV_DATE_TIME.date()),
+    ]
+    group = stats[0]
+    assert group.visits == 3
+    assert group.exited_visits == 2
+    assert group.ack_rate == pytest.approx(2 / 3)
+    assert group.on_site_rate == pytest.approx(0.5)
+    assert group.mean_dwell_seconds == pytest.approx(1200)
+    assert group.p50_dwell_seconds == pytest.approx(600, rel=0.02)
+    assert group.p99_dwell_seconds == pytest.approx(1800, rel=0.02)
+
+    group = stats[1]
+    assert group.visits == 1
+    assert group.exited_visits == 0
+    assert group.on_site_rate is None
+    assert group.mean_dwell_seconds is None
+    assert group.p50_dwell_seconds is None
+
+
+def test_get_site_visit_stats(database_with_two_site_visits):
+    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBSiteVisit)
+
+    stats = get_site_visit_stats(
+        table=table, from_time=PREV_DATE_TIME, to_time=PREV_DATE_TIME + timedelta(days=1)
+    )
+    assert [group.day for group in stats] == [PREV_DATE_TIME.date()]
+    assert stats[0].mean_dwell_seconds == pytest.approx(
+        (CURRENT_DATE_TIME - PREV_DATE_TIME).total_seconds()
+    )
+
+    stats = get_site_visit_stats(
+        table=table, from_time=CURRENT_DATE_TIME, to_time=FUTURE_DATE_TIME, site_id=TEST_SITE_ID
+    )
+    assert len(stats) == 1
+    assert stats[0].visits == 1
+    assert stats[0].exited_visits == 0
+
+    stats = get_site_visit_stats(
+        table=table,
+        from_time=CURRENT_DATE_TIME,
+        to_time=FUTURE_DATE_TIME,
+        site_id=TEST_SITE_ID_ALT,
+    )
+    assert stats == []
+
+
+def test_get_site_visit_stats_invalid_range(empty_database):
+    table = DBTable(access=AWSAccessLevel.READ, item_schema=DBSiteVisit)
+
+    with pytest.raises(BadRequestException):
+        get_site_visit_stats(table=table, from_time=None, to_time=FUTURE_DATE_TIME)
+    with pytest.raises(BadRequestException):
+        get_site_visit_stats(table=table, from_time=FUTURE_DATE_TIME, to_time=CURRENT_DATE_TIME)
+    with pytest.raises(BadRequestException):
+        get_site_visit_stats(
+            table=table,
+            from_time=CURRENT_DATE_TIME,
+            to_time=CURRENT_DATE_TIME + timedelta(days=STATS_MAX_DAYS + 1),
+        )
+
+
+def test_rebuild_site_visit_rollups(database_with_two_site_visits):
+    _, [complete_visit, entry_only_visit] = database_with_two_site_visits
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisitRollup)
+
+    rollups = rebuild_site_visit_rollups(
+        table=table,
+        from_date=CURRENT_DATE_TIME.date() - timedelta(days=1),
+        to_date=CURRENT_DATE_TIME.date(),
+        timestamp=FUTURE_DATE_TIME,
+        user_id=TEST_USER_ID,
+    )
+
+    assert list_site_visit_rollups(table=table, site_id=TEST_SITE_ID) == rollups
+    [rollup] = rollups
+    assert rollup.entry_date == entry_only_visit.entry_time.date()
+    assert rollup.visits == 1
+    assert rollup.exited_visits == 0
+
+    rollups = rebuild_site_visit_rollups(
+        table=table,
+        from_date=PREV_DATE_TIME.date(),
+        to_date=PREV_DATE_TIME.date(),
+        timestamp=FUTURE_DATE_TIME,
+        user_id=TEST_USER_ID,
+        site_id=TEST_SITE_ID,
+    )
+    assert rollups[0].dwell_seconds == round(
+        (complete_visit.exit_time - complete_visit.entry_time).total_seconds()
+    )
+    assert len(list_site_visit_rollups(table=table, site_id=TEST_SITE_ID)) == 2
+
+
+def test_rebuild_site_visit_rollups_resets_days_without_visits(database_with_two_site_visits):
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisitRollup)
+    empty_day = CURRENT_DATE_TIME.date() - timedelta(days=1)
+    table.put(
+        DBSiteVisitRollup(
+            last_modified_by=TEST_USER_ID,
+            last_modified_time=PREV_DATE_TIME,
+            site_id=TEST_SITE_ID,
+            entry_date=empty_day,
+            visits=5,
+        )
+    )
+
+    rollups = rebuild_site_visit_rollups(
+        table=table,
+        from_date=empty_day,
+        to_date=CURRENT_DATE_TIME.date(),
+        timestamp=FUTURE_DATE_TIME,
+        user_id=TEST_USER_ID,
+        site_id=TEST_SITE_ID,
+    )
+
+    assert [(rollup.entry_date, rollup.visits) for rollup in rollups] == [
+        (empty_day, 0),
+        (CURRENT_DATE_TIME.date(), 1),
+    ]
+    assert list_site_visit_rollups(table=table, site_id=TEST_SITE_ID) == rollups
+
+
+def test_rebuild_site_visit_rollups_entry_while_rebuilding(database_with_two_site_visits):
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisitRollup)
+    visit_table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisit)
+    iter_visit_summaries = visit_stats._iter_visit_summaries
+
+    def enter_while_counting(*args, **kwargs):
+        visits = list(iter_visit_summaries(*args, **kwargs))
+        if counting.call_count == 1:
+            create_site_entry(
+                table=visit_table,
+                site_id=TEST_SITE_ID,
+                user_id=TEST_USER_ID_ALT,
+                user_email=TEST_USER_EMAIL_ALT,
+                loc_tracking=False,
+                ack_status=True,
+                timestamp=CURRENT_DATE_TIME + timedelta(hours=1),
+            )
+        return iter(visits)
+
+    with patch.object(
+        visit_stats, "_iter_visit_summaries", side_effect=enter_while_counting
+    ) as counting:
+        [rollup] = rebuild_site_visit_rollups(
+            table=table,
+            from_date=CURRENT_DATE_TIME.date(),
+            to_date=CURRENT_DATE_TIME.date(),
+            timestamp=FUTURE_DATE_TIME,
+            user_id=TEST_USER_ID,
+            site_id=TEST_SITE_ID,
+        )
+
+    assert counting.call_count == 2
+    assert rollup.visits == 2
+    assert list_site_visit_rollups(table=table, site_id=TEST_SITE_ID) == [rollup]
+
+
+def test_rebuild_site_visit_rollups_range_too_long(empty_database):
+    table = DBTable(access=AWSAccessLevel.WRITE, item_schema=DBSiteVisitRollup)
+
+    with pytest.raises(BadRequestException):
+        rebuild_site_visit_rollups(
+            table=table,
+            from_date=CURRENT_DATE_TIME.date(),
+            to_date=CURRENT_DATE_TIME.date() + timedelta(days=ROLLUP_REBUILD_MAX_DAYS),
+            timestamp=FUTURE_DATE_TIME,
+            user_id=TEST_USER_ID,
+        )
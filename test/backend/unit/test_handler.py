@@ -0,0 +1,50 @@
+from http import HTTPStatus
+from unittest.mock import patch
+
+from backend.service.handler import (
+    ROUTERS,
+    STARTUP_REPORT,
+    SWAGGER_PATH,
+    lambda_handler,
+    load_routers,
+)
+
+
+def test_load_routers_only_for_matching_prefix():
+    with patch("backend.service.handler.app") as app, patch.dict(STARTUP_REPORT, clear=True):
+        load_routers("/protected/site-management/HC059")
+
+        assert list(STARTUP_REPORT) == [".routes.protected.site"]
+        assert app.include_router.call_count == 1
+        assert app.include_router.call_args.kwargs["prefix"] == "/protected/site-management"
+
+        # routers are only included the first time a prefix is requested
+        load_routers("/protected/site-management/HC059")
+        assert app.include_router.call_count == 1
+
+
+def test_load_routers_unknown_path():
+    with patch("backend.service.handler.app") as app, patch.dict(STARTUP_REPORT, clear=True):
+        load_routers("/does-not-exist")
+
+        assert not STARTUP_REPORT
+        app.include_router.assert_not_called()
+
+
+def test_load_routers_for_swagger():
+    with patch("backend.service.handler.app") as app, patch.dict(STARTUP_REPORT, clear=True):
+        load_routers(SWAGGER_PATH)
+
+        assert set(STARTUP_REPORT) == set(ROUTERS.values()) | {SWAGGER_PATH}
+        assert app.include_router.call_count == len(ROUTERS)
+        app.enable_swagger.assert_called_once()
+
+
+def test_swagger_handler(api_gateway_event):
+    event, context = api_gateway_event(path=SWAGGER_PATH, method="GET")
+
+    response = lambda_handler(event=event, context=context)
+
+    assert response["statusCode"] == HTTPStatus.OK
+    for prefix in ROUTERS:
+        assert prefix in response["body"]
@@ -1,3 +1,5 @@
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
 from unittest.mock import patch
 
 import boto3
@@ -6,8 +8,19 @@ from backend.service.environment import (
     DOCUMENT_STORAGE_BUCKET_READ_ROLE,
     DOCUMENT_STORAGE_BUCKET_WRITE_ROLE,
 )
-from backend.service.exceptions import ExternalServiceException, PermissionException
-from backend.service.util import create_client_with_role, create_resource_with_role
+from backend.service.exceptions import (
+    BadRequestException,
+    ExternalServiceException,
+    PermissionException,
+)
+from backend.service.models.api.site import APISite
+from backend.service.util import (
+    RoleCredentialRefresher,
+    create_client_with_role,
+    create_resource_with_role,
+    get_role_session,
+    parse_fields,
+)
 from botocore.stub import Stubber
 from moto import mock_aws
 
@@ -57,3 +70,78 @@ def test_create_resource_with_role_errors(aws_error_code, expected_error_class):
         patcher = patch("boto3.client", return_value=client)
         with patcher, stubber, pytest.raises(expected_error_class):
             create_resource_with_role("s3", DOCUMENT_STORAGE_BUCKET_READ_ROLE)
+
+
+def test_client_and_resource_share_role_session():
+    with mock_aws():
+        client = create_client_with_role("s3", DOCUMENT_STORAGE_BUCKET_READ_ROLE)
+        resource = create_resource_with_role("dynamodb", DOCUMENT_STORAGE_BUCKET_READ_ROLE)
+        session = get_role_session(DOCUMENT_STORAGE_BUCKET_READ_ROLE)
+
+        credentials = session.get_credentials()
+        assert client._request_signer._credentials is credentials
+        assert resource.meta.client._request_signer._credentials is credentials
+
+
+def test_role_credentials_refreshed_in_background():
+    with mock_aws():
+        refresher = RoleCredentialRefresher(DOCUMENT_STORAGE_BUCKET_READ_ROLE)
+        current = refresher._current
+        refreshed = {**current, "access_key": "refreshed"}
+
+        pending: Future[dict] = Future()
+        with patch("backend.service.util._refresh_executor.submit", return_value=pending) as submit:
+            # credentials are still valid, so keep using them while the refresh is running
+            assert refresher.refresh() == current
+            assert refresher.refresh() == current
+            assert submit.call_count == 1
+
+            pending.set_result(refreshed)
+            assert refresher.refresh() == refreshed
+
+
+def test_role_credentials_refresh_blocks_near_expiry():
+    with mock_aws():
+        refresher = RoleCredentialRefresher(DOCUMENT_STORAGE_BUCKET_READ_ROLE)
+        refresher.credentials._expiry_time = datetime.now(timezone.utc) + timedelta(minutes=1)
+
+        refreshed = refresher.refresh()
+        assert refreshed is refresher._current
+        assert refresher._pending is None
+
+
+def test_role_credentials_refresh_failure():
+    with mock_aws():
+        refresher = RoleCredentialRefresher(DOCUMENT_STORAGE_BUCKET_READ_ROLE)
+        current = refresher._current
+
+        pending: Future[dict] = Future()
+        pending.set_exception(ExternalServiceException("Unknown Error from AWS"))
+        with patch("backend.service.util._refresh_executor.submit", return_value=pending):
+            with pytest.raises(ExternalServiceException):
+                refresher.refresh()
+
+        # the failed refresh is discarded, so the next refresh tries again
+        assert refresher._pending is None
+        assert refresher._current == current
+
+
+def test_parse_fields():
+    assert parse_fields(None, APISite) is None
+    assert parse_fields("site_id, latitude,,longitude", APISite) == {
+        "site_id",
+        "latitude",
+        "longitude",
+    }
+
+
+@pytest.mark.parametrize(
+    "fields",
+    [
+        pytest.param("", id="No fields"),
+        pytest.param("site_id,radius", id="Unknown field"),
+    ],
+)
+def test_parse_fields_errors(fields):
+    with pytest.raises(BadRequestException):
+        parse_fields(fields, APISite)